@@ -0,0 +1,159 @@
+from collections import defaultdict
+
+
+class RoomLayout:
+    """
+    Vị trí vật lý của phòng suy ra từ số phòng: 1205 -> tầng 12, vị trí 5 trên hành lang.
+    - rooms_per_floor: số phòng mỗi tầng theo quy ước đánh số (mặc định 100).
+    - wing_size: nếu có, mỗi tầng chia thành các cánh (hành lang) gồm wing_size vị trí liên tiếp.
+    - overrides: {SoPhong: (tầng, cánh, vị trí)} cho các phòng đánh số không theo quy ước.
+    """
+    def __init__(self, rooms_per_floor=100, wing_size=None, overrides=None):
+        self.rooms_per_floor = rooms_per_floor
+        self.wing_size = wing_size
+        self.overrides = overrides or {}
+
+    def locate(self, room_id):
+        """Trả về (tầng, cánh, vị trí trong hành lang)"""
+        if room_id in self.overrides:
+            return self.overrides[room_id]
+        floor, pos = divmod(room_id, self.rooms_per_floor)
+        if self.wing_size:
+            wing, pos = divmod(pos, self.wing_size)
+            return floor, wing, pos
+        return floor, 0, pos
+
+
+class RoomAllocator:
+    """
+    Xếp K phòng cho khách đoàn (có thể nhiều loại phòng trong 1 yêu cầu):
+    ưu tiên ít tầng nhất, rồi ít hành lang nhất, rồi khoảng cách trên hành lang ngắn nhất.
+    - Bước 1: trong từng hành lang, Sliding Window 2 con trỏ tìm đoạn ngắn nhất đủ số lượng mọi loại.
+    - Bước 2: nếu không hành lang nào đủ, Sliding Window trên danh sách hành lang (xếp theo tầng)
+      tìm dải ít tầng nhất đủ phòng, rồi chọn phòng gần vị trí trung vị nhất.
+    Mỗi bước O(N) sau khi gom nhóm -> chạy tốt với hàng chục nghìn phòng.
+    """
+    def __init__(self, layout=None):
+        self.layout = layout or RoomLayout()
+
+    def allocate(self, candidates, need):
+        """
+        candidates: [(SoPhong, MaLP), ...] các phòng trống.
+        need: {MaLP: số lượng}.
+        Trả về {"rooms": [...], "floors": số tầng, "corridors": số hành lang, "span": độ dài đoạn hành lang}
+        hoặc None nếu không đủ phòng.
+        """
+        need = {t: q for t, q in need.items() if q > 0}
+        if not need:
+            return None
+
+        # Gom phòng theo hành lang (tầng, cánh), bỏ các loại không được yêu cầu
+        sections = defaultdict(list)
+        totals = defaultdict(int)
+        for room_id, type_id in candidates:
+            if type_id in need:
+                floor, wing, pos = self.layout.locate(room_id)
+                sections[(floor, wing)].append((pos, room_id, type_id))
+                totals[type_id] += 1
+        if any(totals[t] < q for t, q in need.items()):
+            return None
+
+        best = None
+        for key, rooms in sections.items():
+            rooms.sort()
+            window = self._min_window(rooms, need)
+            if window is not None and (best is None or window[0] < best[0]):
+                best = (window[0], key, window[1])
+        if best is not None:
+            span, _, picked = best
+            return {"rooms": sorted(picked), "floors": 1, "corridors": 1, "span": span}
+
+        return self._allocate_across(sections, need)
+
+    @staticmethod
+    def _min_window(rooms, need):
+        """Đoạn [l, r] ngắn nhất (theo vị trí) trên 1 hành lang chứa đủ số lượng mọi loại"""
+        missing = len(need)
+        counts = defaultdict(int)
+        best = None
+        left = 0
+        for right, (pos, _, t) in enumerate(rooms):
+            if t not in need:
+                continue
+            counts[t] += 1
+            if counts[t] == need[t]:
+                missing -= 1
+            while missing == 0:
+                span = pos - rooms[left][0]
+                if best is None or span < best[0]:
+                    best = (span, left, right)
+                lt = rooms[left][2]
+                counts[lt] -= 1
+                if counts[lt] < need[lt]:
+                    missing += 1
+                left += 1
+        if best is None:
+            return None
+
+        span, lo, hi = best
+        remaining = dict(need)
+        picked = []
+        for _, room_id, t in rooms[lo:hi + 1]:
+            if remaining.get(t, 0) > 0:
+                picked.append(room_id)
+                remaining[t] -= 1
+        return span, picked
+
+    def _allocate_across(self, sections, need):
+        keys = sorted(sections)
+        section_counts = []
+        for key in keys:
+            c = defaultdict(int)
+            for _, _, t in sections[key]:
+                c[t] += 1
+            section_counts.append(c)
+
+        # Sliding Window trên các hành lang: dải ít tầng nhất, rồi ít hành lang nhất
+        missing = len(need)
+        counts = defaultdict(int)
+        best = None
+        left = 0
+        for right, c in enumerate(section_counts):
+            for t, n in c.items():
+                before = counts[t]
+                counts[t] += n
+                if before < need[t] <= counts[t]:
+                    missing -= 1
+            while missing == 0:
+                cost = (keys[right][0] - keys[left][0] + 1, right - left + 1)
+                if best is None or cost < best[0]:
+                    best = (cost, left, right)
+                for t, n in section_counts[left].items():
+                    before = counts[t]
+                    counts[t] -= n
+                    if counts[t] < need[t] <= before:
+                        missing += 1
+                left += 1
+
+        _, lo, hi = best
+        pool = [room + (key,) for key in keys[lo:hi + 1] for room in sections[key]]
+
+        # Chọn phòng gần vị trí trung vị của dải để các phòng thẳng hàng nhau giữa các tầng
+        positions = sorted(r[0] for r in pool)
+        anchor = positions[len(positions) // 2]
+        pool.sort(key=lambda r: (abs(r[0] - anchor), r[1]))
+
+        remaining = dict(need)
+        picked = []
+        for pos, room_id, t, key in pool:
+            if remaining[t] > 0:
+                picked.append((pos, room_id, key))
+                remaining[t] -= 1
+
+        used = {key for _, _, key in picked}
+        return {
+            "rooms": sorted(r for _, r, _ in picked),
+            "floors": len({floor for floor, _ in used}),
+            "corridors": len(used),
+            "span": max(p for p, _, _ in picked) - min(p for p, _, _ in picked)
+        }
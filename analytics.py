@@ -0,0 +1,429 @@
+import time
+import argparse
+from array import array
+from datetime import date, datetime, timedelta
+
+from availability import to_ordinal
+from migrations import is_sqlserver
+from streaming import iter_rows
+
+
+def stay_contributions(check_in, nights, room_price, surcharge=0, service_total=0, check_out=None):
+    """
+    Phần đóng góp của 1 lượt lưu trú vào các ngày: {ngày: [đêm, tiền phòng, phụ thu, dịch vụ, lượt trả]}.
+    Tiền phòng chia đều cho từng đêm kể từ ngày nhận phòng; dịch vụ, phụ thu và lượt trả
+    tính vào ngày trả phòng (mặc định = ngày nhận + số đêm).
+    """
+    start = check_in.date() if isinstance(check_in, datetime) else check_in
+    nights = max(1, int(nights))
+    out_day = check_out.date() if isinstance(check_out, datetime) else (check_out or start + timedelta(days=nights))
+
+    rows = {}
+    for i in range(nights):
+        row = rows.setdefault(start + timedelta(days=i), [0, 0.0, 0.0, 0.0, 0])
+        row[0] += 1
+        row[1] += float(room_price)
+    row = rows.setdefault(out_day, [0, 0.0, 0.0, 0.0, 0])
+    row[2] += float(surcharge)
+    row[3] += float(service_total)
+    row[4] += 1
+    return rows
+
+
+class RevenueRollup:
+    """
+    Ghi vào các bảng tổng hợp DoanhThuNgay (ngày x loại phòng) và DoanhThuDichVuNgay
+    (ngày x dịch vụ x loại phòng). Chạy trên cursor của giao dịch checkout -> cùng commit.
+    Loại phòng và số phòng của loại được đọc lại mỗi lần (2 lần Index Seek trên Phong) -> luôn đúng
+    với dữ liệu hiện tại kể cả khi phòng được thêm / bớt / đổi loại ngoài ứng dụng.
+    """
+    # 6 tham số / đêm + 2 tham số chung, tối đa 2100 tham số và 1000 dòng VALUES / câu lệnh
+    DAILY_CHUNK = 300
+    DAILY_MERGE = """
+        MERGE DoanhThuNgay WITH (HOLDLOCK) AS t
+        USING (
+            SELECT v.Ngay, CAST(? AS INT) AS MaLP, CAST(? AS INT) AS SoPhong,
+                   v.Dem, v.TienPhong, v.PhuThu, v.DoanhThuDV, v.SoLuotTra
+            FROM (VALUES {values}) AS v(Ngay, Dem, TienPhong, PhuThu, DoanhThuDV, SoLuotTra)
+        ) AS src
+        ON t.Ngay = src.Ngay AND t.MaLP = src.MaLP
+        WHEN MATCHED THEN UPDATE SET
+            DemDaBan = t.DemDaBan + src.Dem, TienPhong = t.TienPhong + src.TienPhong,
+            PhuThu = t.PhuThu + src.PhuThu, DoanhThuDV = t.DoanhThuDV + src.DoanhThuDV,
+            SoLuotTra = t.SoLuotTra + src.SoLuotTra
+        WHEN NOT MATCHED THEN INSERT (Ngay, MaLP, SoPhong, DemDaBan, TienPhong, PhuThu, DoanhThuDV, SoLuotTra)
+            VALUES (src.Ngay, src.MaLP, src.SoPhong, src.Dem, src.TienPhong, src.PhuThu, src.DoanhThuDV, src.SoLuotTra);
+    """
+    SERVICE_MERGE = """
+        MERGE DoanhThuDichVuNgay WITH (HOLDLOCK) AS t
+        USING (
+            SELECT CAST(? AS DATE) AS Ngay, ct.MaDV, CAST(? AS INT) AS MaLP,
+                   SUM(ct.SoLuong) AS SoLuong, SUM(ct.SoLuong * dv.Gia) AS DoanhThu
+            FROM ChiTietSD ct
+            JOIN DichVu dv ON ct.MaDV = dv.MaDV
+            WHERE ct.MaPD = ?
+            GROUP BY ct.MaDV
+        ) AS src
+        ON t.Ngay = src.Ngay AND t.MaDV = src.MaDV AND t.MaLP = src.MaLP
+        WHEN MATCHED THEN UPDATE SET SoLuong = t.SoLuong + src.SoLuong, DoanhThu = t.DoanhThu + src.DoanhThu
+        WHEN NOT MATCHED THEN INSERT (Ngay, MaDV, MaLP, SoLuong, DoanhThu)
+            VALUES (src.Ngay, src.MaDV, src.MaLP, src.SoLuong, src.DoanhThu);
+    """
+    # Cùng phép cộng dồn cho kết nối không phải SQL Server (SQLite stand-in): INSERT ... ON CONFLICT
+    DAILY_UPSERT = """
+        INSERT INTO DoanhThuNgay (Ngay, MaLP, SoPhong, DemDaBan, TienPhong, PhuThu, DoanhThuDV, SoLuotTra)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (Ngay, MaLP) DO UPDATE SET
+            DemDaBan = DemDaBan + excluded.DemDaBan, TienPhong = TienPhong + excluded.TienPhong,
+            PhuThu = PhuThu + excluded.PhuThu, DoanhThuDV = DoanhThuDV + excluded.DoanhThuDV,
+            SoLuotTra = SoLuotTra + excluded.SoLuotTra
+    """
+    SERVICE_UPSERT = """
+        INSERT INTO DoanhThuDichVuNgay (Ngay, MaDV, MaLP, SoLuong, DoanhThu)
+        SELECT ?, ct.MaDV, ?, SUM(ct.SoLuong), SUM(ct.SoLuong * dv.Gia)
+        FROM ChiTietSD ct
+        JOIN DichVu dv ON ct.MaDV = dv.MaDV
+        WHERE ct.MaPD = ?
+        GROUP BY ct.MaDV
+        ON CONFLICT (Ngay, MaDV, MaLP) DO UPDATE SET
+            SoLuong = SoLuong + excluded.SoLuong, DoanhThu = DoanhThu + excluded.DoanhThu
+    """
+
+    @staticmethod
+    def _room_type(cursor, room_id):
+        """(MaLP, số phòng của loại đó): khóa chính SoPhong + IX_Phong_MaLP, cùng giao dịch checkout"""
+        cursor.execute("SELECT MaLP FROM Phong WHERE SoPhong = ?", (room_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None, 0
+        cursor.execute("SELECT COUNT(*) FROM Phong WHERE MaLP = ?", (row[0],))
+        return row[0], cursor.fetchone()[0]
+
+    @classmethod
+    def record_checkout(cls, cursor, room_id, bill_detail, surcharge=0):
+        """Cộng 1 lượt checkout vào bảng tổng hợp (MERGE theo lô DAILY_CHUNK đêm; SQLite: ON CONFLICT), không commit"""
+        type_id, inventory = cls._room_type(cursor, room_id)
+        if type_id is None:
+            raise ValueError(f"Phòng {room_id} không tồn tại")
+        rows = stay_contributions(bill_detail.check_in, bill_detail.days_used, bill_detail.room_price,
+                                  surcharge, bill_detail.service_total, bill_detail.check_out)
+        rows = sorted(rows.items())
+        if not is_sqlserver(cursor):
+            cursor.executemany(cls.DAILY_UPSERT, [(day, type_id, inventory, *row) for day, row in rows])
+            cursor.execute(cls.SERVICE_UPSERT, (bill_detail.check_out.date(), type_id, bill_detail.ma_pd))
+            return
+        for i in range(0, len(rows), cls.DAILY_CHUNK):
+            chunk = rows[i:i + cls.DAILY_CHUNK]
+            values = ", ".join(["(CAST(? AS DATE), ?, ?, ?, ?, ?)"] * len(chunk))
+            params = [type_id, inventory] + [v for day, row in chunk for v in (day, *row)]
+            cursor.execute(cls.DAILY_MERGE.format(values=values), params)
+        cursor.execute(cls.SERVICE_MERGE, (bill_detail.check_out.date(), type_id, bill_detail.ma_pd))
+
+
+class RollupColumns:
+    """
+    Bảng tổng hợp của 1 khoảng ngày, lưu theo cột (array) - mỗi chỉ số i = 1 dòng (ngày, loại phòng).
+    Dịch vụ: các cột svc_* (ngày, dịch vụ, loại phòng).
+    """
+    def __init__(self, start, end):
+        self.start, self.end = start, end
+        self.day = array('q')
+        self.type_id = array('q')
+        self.inventory = array('q')
+        self.nights = array('q')
+        self.room_revenue = array('d')
+        self.surcharge = array('d')
+        self.service_revenue = array('d')
+        self.checkouts = array('q')
+        self.svc_day = array('q')
+        self.svc_id = array('q')
+        self.svc_type_id = array('q')
+        self.svc_qty = array('q')
+        self.svc_revenue = array('d')
+
+    def __len__(self):
+        return len(self.day)
+
+
+class AnalyticsRepository:
+    """Đọc / dựng lại bảng tổng hợp doanh thu. Báo cáo chỉ đọc DoanhThuNgay*, không quét bảng nghiệp vụ."""
+    def __init__(self, pool):
+        self.pool = pool
+
+    def load_rollups(self, start, end):
+        """Các dòng tổng hợp trong [start, end] (tính cả 2 đầu) -> RollupColumns"""
+        cols = RollupColumns(start, end)
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT Ngay, MaLP, SoPhong, DemDaBan, TienPhong, PhuThu, DoanhThuDV, SoLuotTra
+                FROM DoanhThuNgay WHERE Ngay BETWEEN ? AND ? ORDER BY Ngay, MaLP
+            """, (start, end))
+            for r in cursor.fetchall():
+                cols.day.append(to_ordinal(r[0]))
+                cols.type_id.append(r[1])
+                cols.inventory.append(r[2])
+                cols.nights.append(r[3])
+                cols.room_revenue.append(float(r[4]))
+                cols.surcharge.append(float(r[5]))
+                cols.service_revenue.append(float(r[6]))
+                cols.checkouts.append(r[7])
+
+            cursor.execute("""
+                SELECT Ngay, MaDV, MaLP, SoLuong, DoanhThu
+                FROM DoanhThuDichVuNgay WHERE Ngay BETWEEN ? AND ?
+            """, (start, end))
+            for r in cursor.fetchall():
+                cols.svc_day.append(to_ordinal(r[0]))
+                cols.svc_id.append(r[1])
+                cols.svc_type_id.append(r[2])
+                cols.svc_qty.append(r[3])
+                cols.svc_revenue.append(float(r[4]))
+        return cols
+
+    def get_dimensions(self):
+        """Tên loại phòng, số phòng hiện có mỗi loại, tên dịch vụ (bảng nhỏ)"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT lp.MaLP, lp.TenLP, COUNT(p.SoPhong)
+                FROM LoaiPhong lp LEFT JOIN Phong p ON p.MaLP = lp.MaLP
+                GROUP BY lp.MaLP, lp.TenLP
+            """)
+            types = {r[0]: (r[1], r[2]) for r in cursor.fetchall()}
+            cursor.execute("SELECT MaDV, TenDV FROM DichVu")
+            services = {r[0]: r[1] for r in cursor.fetchall()}
+        return types, services
+
+    def rebuild(self):
+        """
+        Dựng lại toàn bộ bảng tổng hợp từ các hóa đơn đã thanh toán (dữ liệu cũ / nạp hàng loạt).
+        Số đêm = (TongTien - PhuThu - dịch vụ) / giá phòng; ngày trả = ngày nhận + số đêm.
+        Trả về (True, {"stays", "daily_rows", "service_rows", "elapsed_ms"}).
+        """
+        start = time.perf_counter()
+        daily, by_pd, service_rows = {}, {}, {}
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT MaLP, COUNT(*) FROM Phong GROUP BY MaLP")
+                inventory = {r[0]: r[1] for r in cursor.fetchall()}
+
+                cursor.execute("""
+                    SELECT hd.MaPD, p.MaLP, hd.NgayTao, hd.TongTien, hd.PhuThu, lp.GiaTheoNgay, COALESCE(sv.Tien, 0)
+                    FROM HoaDon hd
+                    JOIN PhieuDatPhong pd ON hd.MaPD = pd.MaPD
+                    JOIN Phong p ON pd.SoPhong = p.SoPhong
+                    JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+                    LEFT JOIN (
+                        SELECT ct.MaPD, SUM(ct.SoLuong * dv.Gia) AS Tien
+                        FROM ChiTietSD ct JOIN DichVu dv ON ct.MaDV = dv.MaDV
+                        GROUP BY ct.MaPD
+                    ) sv ON sv.MaPD = hd.MaPD
+                    WHERE hd.TrangThaiHD = N'Đã thanh toán'
+                """)
+                # Toàn bộ lịch sử hóa đơn: đọc theo lô và cộng dồn ngay, không giữ danh sách dòng
+                for ma_pd, type_id, check_in, total, surcharge, price, svc in \
+                        iter_rows(cursor, name="AnalyticsRepository.rebuild"):
+                    price, svc, surcharge = float(price), float(svc), float(surcharge or 0)
+                    room_revenue = float(total or 0) - surcharge - svc
+                    nights = max(1, round(room_revenue / price)) if price else 1
+                    rows = stay_contributions(check_in, nights, room_revenue / nights, surcharge, svc)
+                    for day, row in rows.items():
+                        acc = daily.setdefault((day, type_id), [0, 0.0, 0.0, 0.0, 0])
+                        for k in range(5):
+                            acc[k] += row[k]
+                    by_pd[ma_pd] = (max(rows), type_id)
+
+                cursor.execute("""
+                    SELECT ct.MaPD, ct.MaDV, SUM(ct.SoLuong), SUM(ct.SoLuong * dv.Gia)
+                    FROM ChiTietSD ct
+                    JOIN DichVu dv ON ct.MaDV = dv.MaDV
+                    JOIN HoaDon hd ON hd.MaPD = ct.MaPD
+                    WHERE hd.TrangThaiHD = N'Đã thanh toán'
+                    GROUP BY ct.MaPD, ct.MaDV
+                """)
+                for ma_pd, service_id, qty, revenue in iter_rows(cursor, name="AnalyticsRepository.rebuild"):
+                    if ma_pd not in by_pd:
+                        continue
+                    day, type_id = by_pd[ma_pd]
+                    acc = service_rows.setdefault((day, service_id, type_id), [0, 0.0])
+                    acc[0] += qty
+                    acc[1] += float(revenue)
+
+                cursor.execute("DELETE FROM DoanhThuDichVuNgay")
+                cursor.execute("DELETE FROM DoanhThuNgay")
+                cursor.executemany("""
+                    INSERT INTO DoanhThuNgay (Ngay, MaLP, SoPhong, DemDaBan, TienPhong, PhuThu, DoanhThuDV, SoLuotTra)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [(day, t, inventory.get(t, 0), *row) for (day, t), row in sorted(daily.items())])
+                cursor.executemany("""
+                    INSERT INTO DoanhThuDichVuNgay (Ngay, MaDV, MaLP, SoLuong, DoanhThu) VALUES (?, ?, ?, ?, ?)
+                """, [(day, s, t, *row) for (day, s, t), row in sorted(service_rows.items())])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                return False, f"Lỗi dựng lại bảng tổng hợp: {str(e)}"
+
+        return True, {
+            "stays": len(by_pd),
+            "daily_rows": len(daily),
+            "service_rows": len(service_rows),
+            "elapsed_ms": (time.perf_counter() - start) * 1000
+        }
+
+
+class RevenueReport:
+    """
+    Báo cáo doanh thu / công suất trên RollupColumns bằng cộng dồn theo cột:
+    - Công suất (occupancy) = đêm đã bán / đêm phòng sẵn có
+    - ADR = tiền phòng / đêm đã bán; RevPAR = tiền phòng / đêm phòng sẵn có
+    Ngày không có dòng tổng hợp dùng số phòng hiện tại của từng loại (types).
+    """
+    def __init__(self, cols, types, services=None):
+        self.cols = cols
+        self.types = types              # MaLP -> (TenLP, số phòng hiện có)
+        self.services = services or {}  # MaDV -> TenDV
+        self.days = to_ordinal(cols.end) - to_ordinal(cols.start) + 1
+
+    @staticmethod
+    def _kpis(nights, available, room_revenue):
+        return {
+            "occupancy": nights / available if available else 0.0,
+            "adr": room_revenue / nights if nights else 0.0,
+            "revpar": room_revenue / available if available else 0.0,
+        }
+
+    def _available(self):
+        """Đêm phòng sẵn có theo loại: số phòng của dòng tổng hợp, ngày thiếu dòng lấy số hiện tại"""
+        cols = self.cols
+        slot = {t: i for i, t in enumerate(self.types)}
+        listed = array('q', bytes(8 * len(slot)))
+        seen = array('q', bytes(8 * len(slot)))
+        for t, inv in zip(cols.type_id, cols.inventory):
+            i = slot.get(t)
+            if i is not None:
+                listed[i] += inv
+                seen[i] += 1
+        return {t: listed[i] + (self.days - seen[i]) * self.types[t][1] for t, i in slot.items()}
+
+    def summary(self):
+        cols = self.cols
+        available = self._available()
+        nights, room_revenue = sum(cols.nights), sum(cols.room_revenue)
+        total_available = sum(available.values())
+        result = {
+            "start": cols.start, "end": cols.end, "days": self.days,
+            "room_nights_available": total_available, "room_nights_sold": nights,
+            "room_revenue": room_revenue, "surcharge": sum(cols.surcharge),
+            "service_revenue": sum(cols.service_revenue), "checkouts": sum(cols.checkouts),
+        }
+        result.update(self._kpis(nights, total_available, room_revenue))
+        result["total_revenue"] = room_revenue + result["surcharge"] + result["service_revenue"]
+        return result
+
+    def by_room_type(self):
+        cols = self.cols
+        available = self._available()
+        slot = {t: i for i, t in enumerate(self.types)}
+        n = len(slot)
+        nights, revenue, svc = array('q', bytes(8 * n)), array('d', bytes(8 * n)), array('d', bytes(8 * n))
+        for t, k, r in zip(cols.type_id, cols.nights, cols.room_revenue):
+            i = slot.get(t)
+            if i is not None:
+                nights[i] += k
+                revenue[i] += r
+        for t, r in zip(cols.svc_type_id, cols.svc_revenue):
+            i = slot.get(t)
+            if i is not None:
+                svc[i] += r
+
+        report = []
+        for t, i in slot.items():
+            row = {"type_id": t, "type_name": self.types[t][0], "room_nights_sold": nights[i],
+                   "room_revenue": revenue[i], "service_revenue": svc[i]}
+            row.update(self._kpis(nights[i], available[t], revenue[i]))
+            report.append(row)
+        return report
+
+    def by_service(self):
+        cols = self.cols
+        totals = {}
+        for s, q, r in zip(cols.svc_id, cols.svc_qty, cols.svc_revenue):
+            acc = totals.setdefault(s, [0, 0.0])
+            acc[0] += q
+            acc[1] += r
+        return sorted(({"service_id": s, "name": self.services.get(s, str(s)), "qty": q, "revenue": r}
+                       for s, (q, r) in totals.items()), key=lambda x: -x["revenue"])
+
+    def daily(self):
+        """Chuỗi theo ngày: công suất, ADR, RevPAR, tổng doanh thu"""
+        cols = self.cols
+        first = to_ordinal(cols.start)
+        d = self.days
+        nights, revenue, other = array('q', bytes(8 * d)), array('d', bytes(8 * d)), array('d', bytes(8 * d))
+        # listed: số phòng ghi trên các dòng của ngày; covered: số phòng hiện có của các loại đã có dòng
+        listed, covered = array('q', bytes(8 * d)), array('q', bytes(8 * d))
+        for day, t, k, r, s, v, inv in zip(cols.day, cols.type_id, cols.nights, cols.room_revenue,
+                                           cols.surcharge, cols.service_revenue, cols.inventory):
+            i = day - first
+            nights[i] += k
+            revenue[i] += r
+            other[i] += s + v
+            listed[i] += inv
+            covered[i] += self.types.get(t, ("", 0))[1]
+
+        current = sum(inv for _, inv in self.types.values())
+        report = []
+        for i in range(d):
+            available = listed[i] + current - covered[i]
+            row = {"day": date.fromordinal(first + i), "room_nights_sold": nights[i],
+                   "total_revenue": revenue[i] + other[i]}
+            row.update(self._kpis(nights[i], available, revenue[i]))
+            report.append(row)
+        return report
+
+
+def format_report(report):
+    s = report.summary()
+    lines = [
+        f"Khoảng: {s['start']} -> {s['end']} ({s['days']} ngày)",
+        f"Công suất: {s['occupancy']:.1%} ({s['room_nights_sold']:,}/{s['room_nights_available']:,} đêm phòng)",
+        f"ADR: {s['adr']:,.0f}   RevPAR: {s['revpar']:,.0f}",
+        f"Tiền phòng: {s['room_revenue']:,.0f}   Dịch vụ: {s['service_revenue']:,.0f}   Phụ thu: {s['surcharge']:,.0f}",
+        f"TỔNG DOANH THU: {s['total_revenue']:,.0f} VND ({s['checkouts']:,} lượt trả phòng)",
+        "",
+        "Theo loại phòng:",
+    ]
+    for r in report.by_room_type():
+        lines.append(f"  {r['type_name']:<10} CS {r['occupancy']:>6.1%}  ADR {r['adr']:>12,.0f}  "
+                     f"RevPAR {r['revpar']:>12,.0f}  DV {r['service_revenue']:>14,.0f}")
+    lines += ["", "Doanh thu dịch vụ:"]
+    for r in report.by_service()[:10]:
+        lines.append(f"  {r['name']:<20} x{r['qty']:<8,} {r['revenue']:>14,.0f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Báo cáo doanh thu & công suất từ bảng tổng hợp theo ngày")
+    parser.add_argument("--from", dest="start", help="Từ ngày YYYY-MM-DD (mặc định 30 ngày trước)")
+    parser.add_argument("--to", dest="end", help="Đến ngày YYYY-MM-DD (mặc định hôm nay)")
+    parser.add_argument("--rebuild", action="store_true", help="Dựng lại bảng tổng hợp từ hóa đơn đã thanh toán")
+    args = parser.parse_args(argv)
+
+    end = date.fromisoformat(args.end) if args.end else date.today()
+    start = date.fromisoformat(args.start) if args.start else end - timedelta(days=29)
+
+    from database import DatabaseManager
+    repo = AnalyticsRepository(DatabaseManager().get_pool())
+    if args.rebuild:
+        ok, res = repo.rebuild()
+        print(res)
+        if not ok:
+            return
+    types, services = repo.get_dimensions()
+    print(format_report(RevenueReport(repo.load_rollups(start, end), types, services)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import bisect
+import threading
+from collections import Counter
+from datetime import date, datetime
+
+
+if hasattr(int, "bit_count"):
+    def popcount(x):
+        """Số bit 1 của x (int.bit_count từ Python 3.10)"""
+        return x.bit_count()
+else:
+    def popcount(x):
+        return bin(x).count("1")
+
+
+def to_ordinal(value):
+    """Chuẩn hóa ngày (str 'YYYY-MM-DD' / date / datetime) về số ordinal"""
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value).strip()).toordinal()
+
+
+class AvailabilityIndex:
+    """
+    Chỉ mục khoảng thời gian [NgayDen, NgayDi) của các phiếu đặt phòng còn hiệu lực
+    (Đã cọc / Đã xác nhận / Đang ở), nạp 1 lần từ DB và cập nhật theo từng giao dịch.
+
+    Các khoảng được giữ trong 1 mảng sắp xếp theo ngày đến. Vì mỗi khoảng dài tối đa
+    `max_len` ngày, mọi khoảng giao với [s, e) phải có ngày đến nằm trong
+    (s - max_len, e) -> chỉ cần 2 lần Binary Search rồi duyệt đoạn ứng viên: O(log N + K).
+    """
+
+    def __init__(self):
+        self._entries = []          # (start, end, room_id, ma_pd) - sắp xếp theo start
+        self._by_pd = {}            # ma_pd -> entry
+        self._lengths = Counter()   # độ dài lưu trú -> số phiếu (để cập nhật max_len khi xóa)
+        self._max_len = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, bookings):
+        """Nạp toàn bộ từ danh sách (MaPD, SoPhong, NgayDen, NgayDi)"""
+        entries = []
+        lengths = Counter()
+        for ma_pd, room_id, s_date, e_date in bookings:
+            start, end = to_ordinal(s_date), to_ordinal(e_date)
+            if end <= start:
+                continue
+            entries.append((start, end, room_id, ma_pd))
+            lengths[end - start] += 1
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._by_pd = {e[3]: e for e in entries}
+            self._lengths = lengths
+            self._max_len = max(lengths) if lengths else 0
+
+    def add(self, ma_pd, room_id, s_date, e_date):
+        start, end = to_ordinal(s_date), to_ordinal(e_date)
+        if end <= start:
+            return
+        with self._lock:
+            if ma_pd in self._by_pd:
+                self._remove_locked(ma_pd)
+            entry = (start, end, room_id, ma_pd)
+            bisect.insort(self._entries, entry)
+            self._by_pd[ma_pd] = entry
+            self._lengths[end - start] += 1
+            self._max_len = max(self._max_len, end - start)
+
+    def remove(self, ma_pd):
+        """Gỡ phiếu khỏi chỉ mục (Checkout / Hủy). Trả về False nếu không có"""
+        with self._lock:
+            return self._remove_locked(ma_pd)
+
+    def _remove_locked(self, ma_pd):
+        entry = self._by_pd.pop(ma_pd, None)
+        if entry is None:
+            return False
+
+        i = bisect.bisect_left(self._entries, entry)
+        del self._entries[i]
+
+        length = entry[1] - entry[0]
+        self._lengths[length] -= 1
+        if not self._lengths[length]:
+            del self._lengths[length]
+            if length == self._max_len:
+                self._max_len = max(self._lengths) if self._lengths else 0
+        return True
+
+    def conflict_ids(self, s_date, e_date):
+        """Tập số phòng bận trong [s_date, e_date) - tương đương RoomRepository.get_conflict_ids"""
+        s, e = to_ordinal(s_date), to_ordinal(e_date)
+        busy = set()
+        with self._lock:
+            entries = self._entries
+            lo = bisect.bisect_left(entries, (s - self._max_len + 1,))
+            hi = bisect.bisect_left(entries, (e,))
+            for i in range(lo, hi):
+                if entries[i][1] > s:
+                    busy.add(entries[i][2])
+        return busy
+
+    def is_free(self, room_id, s_date, e_date):
+        return room_id not in self.conflict_ids(s_date, e_date)
+
+
+class OccupancyMatrix:
+    """
+    Ma trận phòng × đêm dạng bitset: mỗi đêm d là 1 số nguyên, bit j = 1 nghĩa là phòng thứ j bận.
+    Phép AND/OR/popcount trên số nguyên lớn xử lý cả nghìn phòng trong 1 lệnh
+    -> đếm phòng trống theo loại, mask "trống mọi đêm", % công suất cho khoảng ngày bất kỳ.
+    Cập nhật tăng dần theo từng phiếu (add/remove) giống AvailabilityIndex.
+    Ma trận có kích thước cố định; đêm nằm ngoài [start, end) được dựng tạm từ danh sách phiếu
+    khi truy vấn. Khoảng truy vấn bị giới hạn bởi MAX_SPAN_DAYS / HORIZON_DAYS.
+    """
+    MAX_SPAN_DAYS = 366         # Số đêm tối đa của 1 truy vấn
+    HORIZON_DAYS = 5 * 365      # Truy vấn không được lệch quá mức này so với ma trận (gõ nhầm năm...)
+
+    def __init__(self, rooms, start_date=None, days=90):
+        """rooms: danh sách (SoPhong, MaLP)"""
+        rooms = sorted(rooms)
+        self.room_ids = [r[0] for r in rooms]
+        self._room_idx = {rid: j for j, rid in enumerate(self.room_ids)}
+
+        self.all_mask = (1 << len(rooms)) - 1
+        self.type_masks = {}
+        for j, (_, type_id) in enumerate(rooms):
+            self.type_masks[type_id] = self.type_masks.get(type_id, 0) | (1 << j)
+        self.out_of_service = 0     # Phòng Bảo trì: không bán dù không có phiếu
+
+        self.start = to_ordinal(start_date or date.today())
+        self._nights = [0] * days
+        self._bookings = {}         # ma_pd -> (room_idx, start, end)
+        self._by_room = {}          # room_idx -> {ma_pd}
+        self._lock = threading.RLock()
+
+    @property
+    def end(self):
+        return self.start + len(self._nights)
+
+    def load(self, bookings):
+        """Nạp từ danh sách (MaPD, SoPhong, NgayDen, NgayDi)"""
+        with self._lock:
+            self._nights = [0] * len(self._nights)
+            self._bookings.clear()
+            self._by_room.clear()
+            for ma_pd, room_id, s_date, e_date in bookings:
+                self._add_locked(ma_pd, room_id, to_ordinal(s_date), to_ordinal(e_date))
+
+    def add(self, ma_pd, room_id, s_date, e_date):
+        with self._lock:
+            if ma_pd in self._bookings:
+                self._remove_locked(ma_pd)
+            self._add_locked(ma_pd, room_id, to_ordinal(s_date), to_ordinal(e_date))
+
+    def remove(self, ma_pd):
+        with self._lock:
+            return self._remove_locked(ma_pd)
+
+    def set_out_of_service(self, room_ids):
+        mask = 0
+        for rid in room_ids:
+            j = self._room_idx.get(rid)
+            if j is not None:
+                mask |= 1 << j
+        with self._lock:
+            self.out_of_service = mask
+
+    def _add_locked(self, ma_pd, room_id, start, end):
+        j = self._room_idx.get(room_id)
+        if j is None or end <= start:
+            return
+        self._bookings[ma_pd] = (j, start, end)
+        self._by_room.setdefault(j, set()).add(ma_pd)
+        self._set_bits(j, start, end)
+
+    def _remove_locked(self, ma_pd):
+        entry = self._bookings.pop(ma_pd, None)
+        if entry is None:
+            return False
+        j, start, end = entry
+        self._by_room[j].discard(ma_pd)
+
+        bit = 1 << j
+        lo, hi = max(start, self.start) - self.start, min(end, self.end) - self.start
+        for d in range(lo, hi):
+            self._nights[d] &= ~bit
+        # Các phiếu khác của cùng phòng có thể chồng lên khoảng vừa xóa -> bật lại bit
+        for other in self._by_room[j]:
+            _, s2, e2 = self._bookings[other]
+            if s2 < end and e2 > start:
+                self._set_bits(j, max(s2, start), min(e2, end))
+        return True
+
+    def _set_bits(self, j, start, end):
+        bit = 1 << j
+        lo, hi = max(start, self.start) - self.start, min(end, self.end) - self.start
+        for d in range(lo, hi):
+            self._nights[d] |= bit
+
+    def _window(self, s_date, e_date):
+        """Bitset bận của từng đêm trong [s_date, e_date) - không thay đổi ma trận"""
+        return self._nights_between(to_ordinal(s_date), to_ordinal(e_date))
+
+    def _nights_between(self, s, e):
+        if e <= s:
+            raise ValueError("Ngày đi phải sau ngày đến.")
+        if e - s > self.MAX_SPAN_DAYS:
+            raise ValueError(f"Khoảng ngày tối đa {self.MAX_SPAN_DAYS} đêm.")
+        if s < self.start - self.HORIZON_DAYS or e > self.end + self.HORIZON_DAYS:
+            raise ValueError("Ngày nằm ngoài phạm vi tra cứu.")
+        if self.start <= s and e <= self.end:
+            return self._nights[s - self.start:e - self.start]
+
+        nights = [0] * (e - s)
+        lo, hi = max(s, self.start), min(e, self.end)
+        if lo < hi:
+            nights[lo - s:hi - s] = self._nights[lo - self.start:hi - self.start]
+        # Phần ngoài ma trận (trước start / sau end): dựng từ các phiếu giao với nó
+        outside = [(s, min(e, self.start)), (max(s, self.end), e)]
+        for j, bs, be in self._bookings.values():
+            bit = 1 << j
+            for a, b in outside:
+                for d in range(max(a, bs), min(b, be)):
+                    nights[d - s] |= bit
+        return nights
+
+    def _type_mask(self, type_id):
+        if type_id is None:
+            return self.all_mask
+        return self.type_masks.get(type_id, 0)
+
+    def free_counts(self, s_date, e_date, type_id=None):
+        """Số phòng trống từng đêm trong [s_date, e_date)"""
+        with self._lock:
+            sellable = self._type_mask(type_id) & ~self.out_of_service
+            return [popcount(sellable & ~busy) for busy in self._window(s_date, e_date)]
+
+    def free_counts_by_type(self, s_date, e_date):
+        """{MaLP: [số phòng trống đêm 1, đêm 2, ...]}"""
+        return {tid: self.free_counts(s_date, e_date, tid) for tid in self.type_masks}
+
+    def free_mask(self, s_date, e_date, type_id=None):
+        """Bitmask các phòng trống MỌI đêm trong [s_date, e_date)"""
+        with self._lock:
+            busy_any = 0
+            for busy in self._window(s_date, e_date):
+                busy_any |= busy
+            return self._type_mask(type_id) & ~self.out_of_service & ~busy_any
+
+    def free_rooms(self, s_date, e_date, type_id=None):
+        mask = self.free_mask(s_date, e_date, type_id)
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(self.room_ids[low.bit_length() - 1])
+            mask ^= low
+        return result
+
+    def occupancy(self, s_date, e_date, type_id=None):
+        """% công suất từng đêm (phòng có phiếu / tổng phòng của loại)"""
+        with self._lock:
+            nights = self._window(s_date, e_date)
+            mask = self._type_mask(type_id)
+            total = popcount(mask)
+            if not total:
+                return [0.0] * len(nights)
+            return [popcount(busy & mask) * 100.0 / total for busy in nights]
+
+    def nearest_windows(self, s_date, nights, quantity, type_id=None, radius=14, limit=5, earliest=None):
+        """
+        Gợi ý ngày thay thế: các khoảng [start, start + nights) có >= quantity phòng (loại type_id)
+        trống mọi đêm, với start lệch tối đa ±radius ngày so với s_date, gần nhất trước.
+        Duyệt trên bitset theo thứ tự lệch 0, -1, +1, -2, +2... và dừng khi đủ `limit` kết quả.
+        Trả về [(ngày đến, ngày đi, số phòng trống), ...].
+        """
+        if nights <= 0 or quantity <= 0:
+            raise ValueError("Số đêm và số lượng phòng phải lớn hơn 0.")
+        s = to_ordinal(s_date)
+        floor = to_ordinal(earliest or date.today())
+
+        with self._lock:
+            base = max(s - radius, floor)
+            nights_bits = self._nights_between(base, max(s + radius, floor) + nights)
+            sellable = self._type_mask(type_id) & ~self.out_of_service
+
+            results = []
+            for offset in sorted(range(-radius, radius + 1), key=lambda o: (abs(o), o)):
+                start = s + offset
+                if start < floor:
+                    continue
+                d = start - base
+                busy_any = 0
+                for busy in nights_bits[d:d + nights]:
+                    busy_any |= busy
+                free = popcount(sellable & ~busy_any)
+                if free >= quantity:
+                    results.append((date.fromordinal(start), date.fromordinal(start + nights), free))
+                    if len(results) >= limit:
+                        break
+        return results
@@ -1,6 +1,16 @@
 import time
 import random
 import sys
+import gc
+import json
+import sqlite3
+import platform
+import argparse
+from datetime import date, datetime, timedelta
+
+from models import Service
+from services import HotelAlgorithms
+from sqlite_standin import SQLiteStandIn
 
 sys.setrecursionlimit(20000)
 
@@ -75,6 +85,33 @@ class BenchmarkLab:
         return best_window
 
 
+    @staticmethod
+    def backtracking_combos(prices, max_budget):
+        """Bản sao cách gợi ý combo cũ: liệt kê mọi tập con <= ngân sách rồi mới sắp xếp"""
+        results = []
+        def backtrack(start_idx, current_total):
+            if current_total > 0:
+                results.append(current_total)
+            for i in range(start_idx, len(prices)):
+                if current_total + prices[i] <= max_budget:
+                    backtrack(i + 1, current_total + prices[i])
+        backtrack(0, 0)
+        results.sort(reverse=True)
+        return results[:5]
+
+    @staticmethod
+    def row_by_row_booking(cursor, guest_info, room_ids, s_date, e_date):
+        """Bản sao cách đặt phòng cũ: 1 INSERT + 1 round trip cho mỗi phòng"""
+        name, cccd, phone = guest_info
+        cursor.execute("INSERT INTO KhachHang(TenKH, CCCD, SDT) VALUES(?, ?, ?)", (name, cccd, phone))
+        cursor.execute("SELECT @@IDENTITY")
+        makh = cursor.fetchone()[0]
+        for rid in room_ids:
+            cursor.execute("""
+                INSERT INTO PhieuDatPhong(MaKH, SoPhong, NgayDen, NgayDi, TrangThaiDat)
+                VALUES(?, ?, ?, ?, N'Đã xác nhận')
+            """, (makh, rid, s_date, e_date))
+
     @staticmethod
     def measure(func, *args):
         start = time.perf_counter()
@@ -130,5 +167,231 @@ def run_tests():
         
         print(f"{n:<15} | {t_nested:<20.4f} | {t_sliding:<20.4f}")
 
+    print("\nKịch bản 4: COMBO DỊCH VỤ: Backtracking (O(2^N)) vs Quy hoạch động Top-k (O(N*W*k))")
+    print("-" * 65)
+    print(f"{'Số món (N)':<15} | {'Backtracking (ms)':<20} | {'DP Top-5 (ms)':<20}")
+    print("-" * 65)
+
+    budget = 500000
+    for n in [10, 16, 20, 60, 200]:
+        prices = [random.randint(10, 200) * 1000 for _ in range(n)]
+        menu = [Service(i, f"Món {i}", p) for i, p in enumerate(prices)]
+
+        t_dp = BenchmarkLab.measure(HotelAlgorithms.suggest_service_combos, menu, budget)
+        if n <= 20:
+            t_bt = f"{BenchmarkLab.measure(BenchmarkLab.backtracking_combos, prices, budget):.4f}"
+        else:
+            t_bt = "(bỏ qua)"
+
+        print(f"{n:<15} | {t_bt:<20} | {t_dp:<20.4f}")
+
+def run_booking_benchmark():
+    """Kịch bản 5 (cần SQL Server): Đặt phòng đoàn từng dòng vs theo lô. Mọi thay đổi đều được rollback."""
+    from database import DatabaseManager
+    from repositories import OperationRepository
+
+    pool = DatabaseManager().get_pool()
+    s_date, e_date = "2099-01-01", "2099-01-03"
+
+    print("\nKịch bản 5: ĐẶT PHÒNG ĐOÀN: Từng dòng (N round trip) vs Theo lô (MERGE + INSERT...SELECT)")
+    print("-" * 80)
+    print(f"{'Số phòng':<10} | {'Từng dòng (ms)':<16} | {'ms/phòng':<10} | {'Theo lô (ms)':<16} | {'ms/phòng':<10}")
+    print("-" * 80)
+
+    for n in [10, 100, 1000]:
+        room_ids = list(range(101, 101 + n))
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            guest = ("Benchmark", f"BENCH-{n}-A", "0000000000")
+            t_row = BenchmarkLab.measure(BenchmarkLab.row_by_row_booking, cursor, guest, room_ids, s_date, e_date)
+            conn.rollback()
+
+            guest = ("Benchmark", f"BENCH-{n}-B", "0000000000")
+            t_bulk = BenchmarkLab.measure(OperationRepository.insert_group_bookings,
+                                          cursor, [(guest, room_ids)], s_date, e_date)
+            conn.rollback()
+
+        print(f"{n:<10} | {t_row:<16.2f} | {t_row / n:<10.4f} | {t_bulk:<16.2f} | {t_bulk / n:<10.4f}")
+
+
+def summarize(samples):
+    """min / trung bình / p50 / p90 / p99 / max (ms) - phân vị nội suy tuyến tính"""
+    data = sorted(samples)
+    n = len(data)
+
+    def pct(p):
+        if n == 1:
+            return data[0]
+        k = (n - 1) * p / 100
+        lo = int(k)
+        hi = min(lo + 1, n - 1)
+        return data[lo] + (data[hi] - data[lo]) * (k - lo)
+
+    return {"runs": n, "min_ms": data[0], "mean_ms": sum(data) / n, "p50_ms": pct(50),
+            "p90_ms": pct(90), "p99_ms": pct(99), "max_ms": data[-1]}
+
+
+class BenchmarkSuite:
+    """
+    Đo các đường chạy thật (HotelAlgorithms + Repository) trên SQLiteStandIn ở nhiều quy mô.
+    - cold: trước mỗi lần đo xóa cache (lru_cache của combo, kết nối SQLite mới) và gc.collect().
+    - warm: chạy làm nóng 1 lần rồi đo lặp lại với cache giữ nguyên.
+    Kết quả ghi ra JSON để so sánh giữa các phiên bản (xem compare_results).
+    """
+    def __init__(self, sizes=(2000, 20000, 200000), cold_runs=5, warm_runs=20, seed=42):
+        self.sizes = sizes
+        self.cold_runs = cold_runs
+        self.warm_runs = warm_runs
+        self.seed = seed
+        self.results = []
+
+    def measure(self, name, size, func, reset=None, db=None):
+        for phase, runs in (("cold", self.cold_runs), ("warm", self.warm_runs)):
+            if db is not None:
+                db.cold = phase == "cold"
+            if phase == "warm":
+                func()
+            samples = []
+            for _ in range(runs):
+                if phase == "cold":
+                    if reset:
+                        reset()
+                    gc.collect()
+                start = time.perf_counter()
+                func()
+                samples.append((time.perf_counter() - start) * 1000)
+            record = {"name": name, "size": size, "phase": phase}
+            record.update(summarize(samples))
+            self.results.append(record)
+            print(f"{name:<42} | {size:>7} | {phase:<4} | p50 {record['p50_ms']:>10.3f} | "
+                  f"p90 {record['p90_ms']:>10.3f} | p99 {record['p99_ms']:>10.3f} ms")
+        if db is not None:
+            db.cold = False
+
+    def run_size(self, size):
+        from repositories import RoomRepository, OperationRepository, ServiceRepository
+
+        db = SQLiteStandIn()
+        try:
+            start = time.perf_counter()
+            counts = db.seed(size, seed=self.seed)
+            print(f"\n[{size} phòng] Seed SQLite: {counts} ({(time.perf_counter() - start):.1f}s)")
+
+            room_repo = RoomRepository(db)
+            op_repo = OperationRepository(db)
+            svc_repo = ServiceRepository(db)
+            rng = random.Random(self.seed)
+            today = date.today()
+            s_date, e_date = today + timedelta(days=10), today + timedelta(days=13)
+
+            # --- Repository (SQL) ---
+            all_rooms = room_repo.get_all()
+            occupied = [r.id for r in all_rooms if r.status == 'Đang ở']
+            self.measure("RoomRepository.get_all", size, room_repo.get_all, db=db)
+            self.measure("RoomRepository.query_rooms(page)", size,
+                         lambda: room_repo.query_rooms(status='Trống', order_by="price", limit=400), db=db)
+            self.measure("RoomRepository.get_conflict_ids", size,
+                         lambda: room_repo.get_conflict_ids(s_date, e_date), db=db)
+            self.measure("RoomRepository.get_active_bookings", size, room_repo.get_active_bookings, db=db)
+            self.measure("OperationRepository.get_bill_raw_data", size,
+                         lambda: op_repo.get_bill_raw_data(rng.choice(occupied)), db=db)
+            self.measure("OperationRepository.get_folio", size,
+                         lambda: op_repo.get_folio(rng.choice(occupied)), db=db)
+            self.measure("OperationRepository.get_open_folios_raw", size, op_repo.get_open_folios_raw, db=db)
+
+            # --- Giải thuật (thuần Python) ---
+            conflicts = room_repo.get_conflict_ids(s_date, e_date)
+            self.measure("HotelAlgorithms.analyze_availability", size,
+                         lambda: HotelAlgorithms.analyze_availability(all_rooms, conflicts))
+
+            stats = HotelAlgorithms.analyze_availability(all_rooms, conflicts)
+            free_ids = sorted(rid for st in stats for rid in st["room_ids"])
+            self.measure("HotelAlgorithms.find_closest_rooms(k=20)", size,
+                         lambda: HotelAlgorithms.find_closest_rooms(free_ids, 20))
+
+            menu = svc_repo.get_all()
+            self.measure("HotelAlgorithms.suggest_service_combos", size,
+                         lambda: HotelAlgorithms.suggest_service_combos(menu, 1000000, k=5, max_qty=2),
+                         reset=HotelAlgorithms._top_k_combos.cache_clear)
+
+            raws = [op_repo.get_bill_raw_data(rid)[0] for rid in rng.sample(occupied, min(50, len(occupied)))]
+            self.measure("HotelAlgorithms.calculate_bill", size,
+                         lambda: HotelAlgorithms.calculate_bill(rng.choice(raws)))
+
+            folios, services = op_repo.get_open_folios_raw()
+            self.measure("HotelAlgorithms.calculate_bills(audit)", size,
+                         lambda: HotelAlgorithms.calculate_bills(folios, services))
+        finally:
+            db.close()
+
+    def run(self):
+        print("\nBỘ ĐO HIỆU NĂNG ĐƯỜNG CHẠY THẬT (SQLite stand-in)")
+        print("-" * 110)
+        for size in self.sizes:
+            self.run_size(size)
+        return {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "sqlite": sqlite3.sqlite_version,
+                "sizes": list(self.sizes), "cold_runs": self.cold_runs,
+                "warm_runs": self.warm_runs, "seed": self.seed,
+            },
+            "results": self.results,
+        }
+
+
+def compare_results(baseline, current, metric="p50_ms", threshold=0.10):
+    """In chênh lệch so với baseline; trả về danh sách các phép đo chậm đi quá threshold"""
+    old = {(r["name"], r["size"], r["phase"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nSO SÁNH VỚI BASELINE ({metric}, ngưỡng +{threshold:.0%})")
+    print("-" * 100)
+    for r in current["results"]:
+        key = (r["name"], r["size"], r["phase"])
+        if key not in old:
+            continue
+        before, after = old[key][metric], r[metric]
+        change = (after - before) / before if before else 0.0
+        flag = "CHẬM HƠN" if change > threshold else ""
+        if flag:
+            regressions.append({"name": key[0], "size": key[1], "phase": key[2],
+                                "before_ms": before, "after_ms": after, "change": change})
+        print(f"{key[0]:<42} | {key[1]:>7} | {key[2]:<4} | {before:>10.3f} -> {after:>10.3f} ms | {change:>+7.1%} {flag}")
+    return regressions
+
+
+def run_suite(args):
+    suite = BenchmarkSuite(sizes=args.sizes, cold_runs=args.cold_runs, warm_runs=args.warm_runs, seed=args.seed)
+    report = suite.run()
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã ghi kết quả: {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_results(baseline, report, threshold=args.threshold):
+            sys.exit(1)
+
+
 if __name__ == "__main__":
-    run_tests()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Đo hiệu năng giải thuật & truy vấn")
+    parser.add_argument("--db", action="store_true", help="Thêm kịch bản đặt phòng đoàn trên SQL Server (rollback)")
+    parser.add_argument("--suite", action="store_true", help="Chạy bộ đo đường chạy thật trên SQLite")
+    parser.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")], default=[2000, 20000, 200000])
+    parser.add_argument("--cold-runs", type=int, default=5)
+    parser.add_argument("--warm-runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="File JSON baseline để so sánh (thoát mã 1 nếu có phép đo chậm đi)")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.suite:
+        run_suite(args)
+    else:
+        run_tests()
+        if args.db:
+            run_booking_benchmark()
@@ -0,0 +1,266 @@
+import bisect
+import threading
+import unicodedata
+
+from models import RoomTable
+
+
+class NGramIndex:
+    """
+    Chỉ mục chuỗi con / tiền tố cho các chuỗi ngắn (số phòng, tên phòng, tên khách...).
+    - Mọi chuỗi con độ dài <= n được đưa vào posting list: truy vấn ngắn = 1 lần tra dict.
+    - Truy vấn dài hơn n: giao posting list của các n-gram rồi kiểm tra lại ứng viên.
+    - Tiền tố: mảng (chuỗi, khóa) sắp xếp + Binary Search.
+    So khớp không phân biệt hoa thường và dấu tiếng Việt ("nguyen" khớp "Nguyễn").
+    """
+    def __init__(self, n=3):
+        self.n = n
+        self._postings = {}     # gram -> set(khóa)
+        self._texts = {}        # khóa -> chuỗi đã chuẩn hóa
+        self._sorted = []       # [(chuỗi, khóa)] cho tìm tiền tố
+
+    @staticmethod
+    def normalize(text):
+        text = unicodedata.normalize("NFD", str(text).lower()).replace("đ", "d")
+        return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+    def _grams(self, text):
+        grams = set()
+        for size in range(1, self.n + 1):
+            for i in range(len(text) - size + 1):
+                grams.add(text[i:i + size])
+        return grams
+
+    def add(self, key, text):
+        if key in self._texts:
+            self.remove(key)
+        text = self.normalize(text)
+        self._texts[key] = text
+        for gram in self._grams(text):
+            self._postings.setdefault(gram, set()).add(key)
+        bisect.insort(self._sorted, (text, key))
+
+    def remove(self, key):
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self._grams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self._postings[gram]
+        i = bisect.bisect_left(self._sorted, (text, key))
+        del self._sorted[i]
+
+    def search(self, query):
+        """Tập khóa có chuỗi chứa query"""
+        query = self.normalize(query)
+        if not query:
+            return set(self._texts)
+        if len(query) <= self.n:
+            return set(self._postings.get(query, ()))
+
+        postings = sorted((self._postings.get(query[i:i + self.n], set())
+                           for i in range(len(query) - self.n + 1)), key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return {k for k in candidates if query in self._texts[k]}
+
+    def prefix(self, query):
+        """Tập khóa có chuỗi bắt đầu bằng query"""
+        query = self.normalize(query)
+        lo = bisect.bisect_left(self._sorted, (query,))
+        hi = bisect.bisect_left(self._sorted, (query + "\U0010ffff",))
+        return {key for _, key in self._sorted[lo:hi]}
+
+
+class RoomCatalog:
+    """
+    Danh mục phòng trong bộ nhớ với các chỉ mục được duy trì liên tục:
+    - Thứ tự sắp xếp sẵn theo số phòng, giá, sức chứa (mảng sắp xếp + Binary Search để chèn/xóa).
+    - Hash index theo trạng thái và loại phòng: {giá trị: set(số phòng)}.
+    Lọc = giao các tập chỉ mục (tập nhỏ nhất trước), rồi lấy thứ tự từ mảng đã sắp xếp
+    -> không phải quét toàn bộ + Merge Sort lại mỗi lần refresh.
+    Dữ liệu phòng nằm trong 1 RoomTable (dạng cột); kết quả truy vấn là các RoomRow trỏ vào bảng đó.
+    """
+    ORDERS = {
+        "id": lambda r: (r.id,),
+        "price": lambda r: (r.price, r.id),
+        "capacity": lambda r: (r.capacity, r.id),
+    }
+    # Trường được đánh chỉ mục chuỗi con (thêm tên phòng / tên khách vào đây khi lưới hiển thị)
+    TEXT_FIELDS = {
+        "id": lambda r: str(r.id),
+    }
+
+    def __init__(self, rooms=()):
+        self._table = RoomTable()
+        self._orders = {name: [] for name in self.ORDERS}
+        self._by_status = {}
+        self._by_type = {}
+        self._text = {name: NGramIndex() for name in self.TEXT_FIELDS}
+        self._lock = threading.RLock()
+        self.sync(rooms)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, room_id):
+        return room_id in self._table
+
+    def get(self, room_id):
+        return self._table.get(room_id)
+
+    def rooms(self, order_by="id"):
+        """Toàn bộ phòng theo thứ tự đã duy trì sẵn"""
+        with self._lock:
+            return [self._table.get(k[-1]) for k in self._orders[order_by]]
+
+    def to_table(self, order_by="id"):
+        """Bản sao RoomTable theo thứ tự order_by (chỉ sao chép cột) - dùng được ngoài khóa, vd trên luồng nền"""
+        with self._lock:
+            return self._table.take([k[-1] for k in self._orders[order_by]])
+
+    # --- Cập nhật chỉ mục ---
+    def _index(self, room):
+        for name, key in self.ORDERS.items():
+            bisect.insort(self._orders[name], key(room))
+        self._by_status.setdefault(room.status, set()).add(room.id)
+        self._by_type.setdefault(room.type_name, set()).add(room.id)
+        for name, field in self.TEXT_FIELDS.items():
+            self._text[name].add(room.id, field(room))
+
+    def _unindex(self, room):
+        for name, key in self.ORDERS.items():
+            order = self._orders[name]
+            i = bisect.bisect_left(order, key(room))
+            del order[i]
+        self._by_status[room.status].discard(room.id)
+        self._by_type[room.type_name].discard(room.id)
+        for index in self._text.values():
+            index.remove(room.id)
+
+    def upsert(self, room):
+        with self._lock:
+            old = self._table.get(room.id)
+            if old is not None:
+                self._unindex(old)
+            self._table.put(room)
+            self._index(self._table.get(room.id))
+
+    def remove(self, room_id):
+        with self._lock:
+            room = self._table.get(room_id)
+            if room is not None:
+                self._unindex(room)
+                self._table.remove(room_id)
+            return room is not None
+
+    def update_status(self, room_id, status):
+        """Đổi trạng thái 1 phòng: chỉ chạm vào hash index trạng thái - O(1)"""
+        with self._lock:
+            room = self._table.get(room_id)
+            if room is None or room.status == status:
+                return False
+            self._by_status[room.status].discard(room_id)
+            room.status = status
+            self._by_status.setdefault(status, set()).add(room_id)
+            return True
+
+    def update_note(self, room_id, note):
+        with self._lock:
+            room = self._table.get(room_id)
+            if room is not None:
+                room.note = note
+
+    def sync(self, rooms, partial=False):
+        """
+        Đồng bộ với danh sách mới lấy từ DB: chỉ cập nhật chỉ mục của phòng thực sự thay đổi.
+        partial=True: rooms chỉ là 1 phần (vd 1 trang dashboard) -> không xóa các phòng vắng mặt.
+        Trả về số phòng thay đổi (thêm / sửa / xóa).
+        """
+        changed = 0
+        with self._lock:
+            seen = set()
+            for room in rooms:
+                seen.add(room.id)
+                old = self._table.get(room.id)
+                if old is None:
+                    self._table.put(room)
+                    self._index(self._table.get(room.id))
+                    changed += 1
+                elif (old.type_id, old.type_name, old.price, old.capacity) != \
+                        (room.type_id, room.type_name, room.price, room.capacity):
+                    self.upsert(room)
+                    changed += 1
+                elif old.status != room.status or old.note != room.note:
+                    # Sửa tại chỗ trong bảng: các RoomRow đang hiển thị thấy ngay thay đổi
+                    self.update_status(room.id, room.status)
+                    old.note = room.note
+                    changed += 1
+            if partial:
+                return changed
+            for room_id in [rid for rid in self._table.id if rid not in seen]:
+                self.remove(room_id)
+                changed += 1
+        return changed
+
+    # --- Truy vấn ---
+    def search(self, text, field="id", prefix=False):
+        """Tập số phòng có trường `field` chứa (hoặc bắt đầu bằng) text"""
+        with self._lock:
+            index = self._text[field]
+            return index.prefix(text) if prefix else index.search(text)
+
+    def query(self, type_name=None, status=None, text=None, order_by="id", reverse=False,
+              after=None, limit=None):
+        """
+        Lọc theo loại/trạng thái/chuỗi con số phòng (None = tất cả) và trả về theo thứ tự order_by.
+        after / limit: Keyset Pagination - chỉ lấy tối đa limit phòng đứng sau khóa `after`.
+        """
+        with self._lock:
+            order = self._orders[order_by]
+            sets = []
+            if text:
+                sets.append(self._text["id"].search(text))
+            if type_name is not None:
+                sets.append(self._by_type.get(type_name, set()))
+            if status is not None:
+                sets.append(self._by_status.get(status, set()))
+
+            candidates = None
+            keys = order
+            if sets:
+                sets.sort(key=len)
+                candidates = sets[0].intersection(*sets[1:])
+                if len(candidates) * 8 < len(order):
+                    # Ít ứng viên: sắp xếp riêng tập nhỏ rẻ hơn duyệt cả mảng thứ tự
+                    key = self.ORDERS[order_by]
+                    keys = sorted(key(self._table.get(i)) for i in candidates)
+                    candidates = None
+
+            # Vị trí bắt đầu sau con trỏ: Binary Search trên mảng khóa đã sắp xếp
+            if reverse:
+                hi = bisect.bisect_left(keys, after) if after is not None else len(keys)
+                positions = range(hi - 1, -1, -1)
+            else:
+                lo = bisect.bisect_right(keys, after) if after is not None else 0
+                positions = range(lo, len(keys))
+
+            ids = []
+            for i in positions:
+                room_id = keys[i][-1]
+                if candidates is not None and room_id not in candidates:
+                    continue
+                ids.append(room_id)
+                if limit is not None and len(ids) >= limit:
+                    break
+            return [self._table.get(i) for i in ids]
+
+    def page(self, limit, after=None, **filters):
+        """1 trang của query(): trả về (rooms, next_cursor) giống RoomRepository.query_rooms"""
+        rooms = self.query(after=after, limit=limit + 1, **filters)
+        if len(rooms) <= limit:
+            return rooms, None
+        rooms = rooms[:limit]
+        return rooms, self.ORDERS[filters.get("order_by", "id")](rooms[-1])
@@ -1,5 +1,17 @@
-import pyodbc
+try:
+    import pyodbc
+except ImportError:     # ConnectionPool vẫn dùng được với sqlite3 / stub (kiểm thử), DatabaseManager thì không
+    pyodbc = None
+import logging
 import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from migrations import LATEST_VERSION, apply_migrations
+
+log = logging.getLogger(__name__)
 
 class DatabaseConfig:
     # LƯU Ý: Sửa lại tên SERVER nếu cần thiết
@@ -7,17 +19,220 @@ class DatabaseConfig:
     DATABASE = 'HotelManagementDB'
     DRIVER = '{ODBC Driver 17 for SQL Server}'
     CONN_STR = f'DRIVER={DRIVER};SERVER={SERVER};DATABASE={DATABASE};Trusted_Connection=yes;'
+    POOL_SIZE = 5           # Số kết nối tối đa
+    POOL_TIMEOUT = 10.0     # Thời gian chờ tối đa khi pool cạn (giây)
+    HEALTH_INTERVAL = 30.0  # Kết nối rảnh lâu hơn mức này sẽ được kiểm tra lại trước khi dùng
+    SCHEMA_VERSION = LATEST_VERSION  # Phiên bản mới nhất trong migrations.py -> lần khởi động sau sẽ cập nhật
+
+
+class ConnectionPool:
+    """
+    Pool kết nối có giới hạn, an toàn đa luồng.
+    - `connect`: hàm không tham số trả về 1 kết nối DB-API mới (pyodbc, sqlite3, stub...).
+    - Mỗi thao tác mượn 1 kết nối qua `with pool.connection() as conn:` rồi trả lại ngay.
+    - Mỗi lần trả về pool đều rollback -> người mượn sau không nhận giao dịch dở / khóa còn giữ.
+    - Kết nối rảnh quá HEALTH_INTERVAL được kiểm tra bằng `health_query`, hỏng thì thay mới.
+      Kết nối bị máy chủ ngắt trong khoảng đó vẫn có thể được giao ra: thao tác đầu tiên lỗi,
+      sau đó pool kiểm tra lại kết nối và loại bỏ nó (không tự chạy lại thao tác).
+    """
+    def __init__(self, connect, max_size=DatabaseConfig.POOL_SIZE, timeout=DatabaseConfig.POOL_TIMEOUT,
+                 health_interval=DatabaseConfig.HEALTH_INTERVAL, health_query="SELECT 1"):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.health_query = health_query
+
+        self._idle = deque()            # (conn, thời điểm trả về pool)
+        self._size = 0                  # Số kết nối đang tồn tại (rảnh + đang mượn)
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0, "created": 0, "waits": 0, "timeouts": 0,
+            "health_failures": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0
+        }
+
+    def acquire(self):
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        conn = None
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Pool kết nối đã đóng.")
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise TimeoutError(f"Hết kết nối trong pool sau {self.timeout}s (tối đa {self.max_size}).")
+                waited = True
+                self._cond.wait(remaining)
+
+        if conn is not None and time.monotonic() - released_at > self.health_interval:
+            if not self._is_healthy(conn):
+                self._close_quietly(conn)
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["total_wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+            if waited:
+                self._stats["waits"] += 1
+        return conn
+
+    def release(self, conn, broken=False):
+        with self._cond:
+            if broken or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if broken or self._closed:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Mượn 1 kết nối cho 1 thao tác. Luôn rollback trước khi trả lại pool (phần chưa commit bị hủy);
+        thao tác lỗi thì kiểm tra thêm health_query, kết nối hỏng bị đóng thay vì quay lại pool.
+        """
+        conn = self.acquire()
+        failed = False
+        try:
+            yield conn
+        except Exception:
+            failed = True
+            raise
+        finally:
+            try:
+                conn.rollback()
+                broken = failed and not self._is_healthy(conn)
+            except Exception:
+                broken = True
+            self.release(conn, broken=broken)
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.health_query)
+            cursor.fetchall()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["health_failures"] += 1
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def metrics(self):
+        """Số liệu pool: kích thước, đang mượn, thời gian chờ..."""
+        with self._cond:
+            m = dict(self._stats)
+            m["size"] = self._size
+            m["idle"] = len(self._idle)
+            m["in_use"] = self._size - len(self._idle)
+            m["max_size"] = self.max_size
+            m["avg_wait_ms"] = m["total_wait_ms"] / m["checkouts"] if m["checkouts"] else 0.0
+        return m
+
 
 class DatabaseManager:
-    def __init__(self):
-        self._ensure_db_exists()
-        self.conn = pyodbc.connect(DatabaseConfig.CONN_STR)
-        self.cursor = self.conn.cursor()
-        self._init_tables()
-        self.seed_data()
+    """
+    Khởi động nhanh: kết nối thẳng vào DATABASE (chỉ dùng master khi DB chưa tồn tại) và đọc
+    SchemaVersion - nếu đã đúng phiên bản thì chỉ tốn đúng 1 truy vấn, bỏ qua DDL và seed.
+    Thời gian từng bước được ghi vào self.timings (ms).
+    auto_migrate=False: chỉ kết nối, không tự nâng cấp (dùng cho công cụ migrations.py).
+    """
+    def __init__(self, auto_migrate=True):
+        if pyodbc is None:
+            raise RuntimeError("Chưa cài pyodbc (pip install pyodbc).")
+        self.timings = {}
+        self.pool = ConnectionPool(lambda: pyodbc.connect(DatabaseConfig.CONN_STR))
+
+        start = time.perf_counter()
+        try:
+            self.pool.release(self.pool.acquire())
+        except pyodbc.Error:
+            # Lần chạy đầu tiên: DB chưa có -> tạo qua master rồi kết nối lại
+            self._ensure_db_exists()
+            self.pool.release(self.pool.acquire())
+        self.timings["connect_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with self.pool.connection() as conn:
+            self.schema_version = self._schema_version(conn)
+            if auto_migrate and self.schema_version < DatabaseConfig.SCHEMA_VERSION:
+                self.migrate(conn)
+                self.timings["migrate_ms"] = (time.perf_counter() - start) * 1000
+        self.timings["schema_check_ms"] = (time.perf_counter() - start) * 1000
 
-    def get_connection(self):
-        return self.conn
+    def get_pool(self):
+        return self.pool
+
+    def migrate(self, conn, target=None):
+        """Đưa schema về phiên bản target (mặc định mới nhất): v1 = bảng gốc + seed, sau đó migrations.py"""
+        target = DatabaseConfig.SCHEMA_VERSION if target is None else target
+        current = self._schema_version(conn)
+        if current < 1 <= target:
+            self._init_tables(conn)
+            self.seed_data(conn)
+            self._set_schema_version(conn, 1)
+            current = 1
+        apply_migrations(conn, current, target)
+        self.schema_version = self._schema_version(conn)
+
+    @staticmethod
+    def _schema_version(conn):
+        """Phiên bản schema hiện tại (0 nếu chưa có bảng SchemaVersion)"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT MAX(Version) FROM SchemaVersion")
+            row = cursor.fetchone()
+        except pyodbc.Error:
+            conn.rollback()
+            return 0
+        return (row[0] or 0) if row else 0
+
+    @staticmethod
+    def _set_schema_version(conn, version):
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO SchemaVersion (Version) VALUES (?)", (version,))
+        conn.commit()
 
     def _ensure_db_exists(self):
         try:
@@ -27,15 +242,20 @@ class DatabaseManager:
             crsr = cnxn.cursor()
             crsr.execute(f"SELECT name FROM master.dbo.sysdatabases WHERE name = '{DatabaseConfig.DATABASE}'")
             if not crsr.fetchone():
-                print(f"[SYSTEM] Creating Database '{DatabaseConfig.DATABASE}'...")
+                log.info("Creating database '%s'...", DatabaseConfig.DATABASE)
                 crsr.execute(f"CREATE DATABASE {DatabaseConfig.DATABASE}")
             cnxn.close()
         except Exception as e:
-            print(f"[FATAL] Connection Error: {e}")
-            exit()
+            log.critical("Connection error: %s", e)
+            raise ConnectionError(f"Không thể kết nối SQL Server: {e}") from e
 
-    def _init_tables(self):
-        self.cursor.execute("""
+    def _init_tables(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='SchemaVersion' AND xtype='U')
+            CREATE TABLE SchemaVersion (Version INT NOT NULL, AppliedAt DATETIME DEFAULT GETDATE())
+        """)
+        cursor.execute("""
             IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='KhachHang' AND xtype='U')
             CREATE TABLE KhachHang (
                 MaKH INT IDENTITY(1,1) PRIMARY KEY, 
@@ -45,43 +265,44 @@ class DatabaseManager:
             )
         """)
         
-        self.cursor.execute("""
+        cursor.execute("""
             IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='LoaiPhong' AND xtype='U')
             CREATE TABLE LoaiPhong (MaLP INT PRIMARY KEY, TenLP NVARCHAR(50), GiaTheoNgay DECIMAL(18, 0), SucChua INT DEFAULT 2)
         """)
-        self.cursor.execute("""
+        cursor.execute("""
             IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Phong' AND xtype='U')
             CREATE TABLE Phong (SoPhong INT PRIMARY KEY, TrangThai NVARCHAR(50), MaLP INT, GhiChu NVARCHAR(500) DEFAULT N'', FOREIGN KEY(MaLP) REFERENCES LoaiPhong(MaLP))
         """)
-        self.cursor.execute("""
+        cursor.execute("""
             IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='PhieuDatPhong' AND xtype='U')
             CREATE TABLE PhieuDatPhong (MaPD INT IDENTITY(1,1) PRIMARY KEY, MaKH INT, SoPhong INT, NgayDen DATE, NgayDi DATE, TrangThaiDat NVARCHAR(50), FOREIGN KEY(MaKH) REFERENCES KhachHang(MaKH), FOREIGN KEY(SoPhong) REFERENCES Phong(SoPhong))
         """)
-        self.cursor.execute("""
+        cursor.execute("""
             IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='HoaDon' AND xtype='U')
             CREATE TABLE HoaDon (MaHD INT IDENTITY(1,1) PRIMARY KEY, NgayTao DATETIME DEFAULT GETDATE(), MaPD INT, TongTien DECIMAL(18, 0) DEFAULT 0, PhuThu DECIMAL(18, 0) DEFAULT 0, TrangThaiHD NVARCHAR(50) DEFAULT N'Chưa thanh toán', FOREIGN KEY(MaPD) REFERENCES PhieuDatPhong(MaPD))
         """)
-        self.cursor.execute("""
+        cursor.execute("""
             IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='DichVu' AND xtype='U')
             CREATE TABLE DichVu (MaDV INT PRIMARY KEY, TenDV NVARCHAR(50), Gia DECIMAL(18, 0))
         """)
-        self.cursor.execute("""
+        cursor.execute("""
             IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='ChiTietSD' AND xtype='U')
             CREATE TABLE ChiTietSD (MaSD INT IDENTITY(1,1) PRIMARY KEY, MaPD INT, MaDV INT, SoLuong INT, ThoiGian DATETIME DEFAULT GETDATE(), FOREIGN KEY(MaPD) REFERENCES PhieuDatPhong(MaPD), FOREIGN KEY(MaDV) REFERENCES DichVu(MaDV))
         """)
-        self.conn.commit()
+        conn.commit()
 
-    def seed_data(self):
+    def seed_data(self, conn):
+        cursor = conn.cursor()
         # Seed Loai Phong
         loai_phongs = [(1, 'Standard', 300000, 2), (2, 'Superior', 500000, 2), (3, 'Deluxe', 800000, 2), (4, 'Family', 1200000, 4), (5, 'President', 3000000, 4)]
         for lp in loai_phongs:
             params = (lp[0],) + lp
-            self.cursor.execute("IF NOT EXISTS (SELECT 1 FROM LoaiPhong WHERE MaLP=?) INSERT INTO LoaiPhong VALUES (?,?,?,?)", params)
+            cursor.execute("IF NOT EXISTS (SELECT 1 FROM LoaiPhong WHERE MaLP=?) INSERT INTO LoaiPhong VALUES (?,?,?,?)", params)
         
         # Seed Phong (2000 phong)
-        self.cursor.execute("SELECT COUNT(*) FROM Phong")
-        if self.cursor.fetchone()[0] == 0:
-            print("[SYSTEM] Seeding 2000 rooms...")
+        cursor.execute("SELECT COUNT(*) FROM Phong")
+        if cursor.fetchone()[0] == 0:
+            log.info("Seeding 2000 rooms...")
             batch_data = []
             statuses = ['Trống', 'Đang ở', 'Đang dọn', 'Bảo trì']
             for i in range(101, 2101):
@@ -89,12 +310,12 @@ class DatabaseManager:
 
             query = "INSERT INTO Phong (SoPhong, TrangThai, MaLP, GhiChu) VALUES (?, ?, ?, ?)"
             for i in range(0, len(batch_data), 500):
-                self.cursor.executemany(query, batch_data[i:i+500])
-            self.conn.commit()
+                cursor.executemany(query, batch_data[i:i+500])
+            conn.commit()
 
         # Seed Services
         services = [(1, 'Coca Cola', 15000), (2, 'Bia Tiger', 25000), (3, 'Mì tôm trứng', 30000), (4, 'Giặt ủi', 50000), (5, 'Massage', 200000), (6, 'Thuê xe máy', 150000)]
         for sv in services:
              params = (sv[0],) + sv
-             self.cursor.execute("IF NOT EXISTS (SELECT 1 FROM DichVu WHERE MaDV=?) INSERT INTO DichVu (MaDV, TenDV, Gia) VALUES (?, ?, ?)", params)
-        self.conn.commit()
\ No newline at end of file
+             cursor.execute("IF NOT EXISTS (SELECT 1 FROM DichVu WHERE MaDV=?) INSERT INTO DichVu (MaDV, TenDV, Gia) VALUES (?, ?, ?)", params)
+        conn.commit()
\ No newline at end of file
@@ -0,0 +1,374 @@
+import os
+import csv
+import json
+import sys
+import math
+import time
+import random
+import argparse
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from migrations import FOLIO_COLUMNS, FOLIO_REBUILD, folio_source_rows, is_sqlserver
+
+
+ROOM_TYPES = [(1, 'Standard', 300000, 2), (2, 'Superior', 500000, 2), (3, 'Deluxe', 800000, 2),
+              (4, 'Family', 1200000, 4), (5, 'President', 3000000, 4)]
+SERVICES = [(1, 'Coca Cola', 15000), (2, 'Bia Tiger', 25000), (3, 'Mì tôm trứng', 30000),
+            (4, 'Giặt ủi', 50000), (5, 'Massage', 200000), (6, 'Thuê xe máy', 150000)]
+
+HO = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ", "Hồ", "Ngô", "Dương"]
+DEM = ["Văn", "Thị", "Hữu", "Đức", "Minh", "Ngọc", "Thanh", "Quang", "Thu", "Gia", "Bảo", "Anh"]
+TEN = ["An", "Bình", "Châu", "Dũng", "Giang", "Hà", "Hải", "Hùng", "Khánh", "Lan", "Linh", "Long",
+       "Mai", "Nam", "Ngân", "Phong", "Phúc", "Quân", "Quỳnh", "Sơn", "Tâm", "Thảo", "Trang", "Tuấn", "Vy"]
+
+# Thứ tự nạp theo khóa ngoại + cột của từng bảng
+TABLES = {
+    "KhachHang": ("MaKH", "TenKH", "CCCD", "SDT"),
+    "PhieuDatPhong": ("MaPD", "MaKH", "SoPhong", "NgayDen", "NgayDi", "TrangThaiDat"),
+    "HoaDon": ("MaHD", "NgayTao", "MaPD", "TongTien", "PhuThu", "TrangThaiHD"),
+    "ChiTietSD": ("MaSD", "MaPD", "MaDV", "SoLuong", "ThoiGian"),
+}
+IDENTITY = {"KhachHang": "MaKH", "PhieuDatPhong": "MaPD", "HoaDon": "MaHD", "ChiTietSD": "MaSD"}
+# Bảng bị xóa khi --reset (con trước cha) - gồm cả read model / bảng tổng hợp dựng từ lịch sử
+RESET_TABLES = ("FolioLuuTru", "DoanhThuDichVuNgay", "DoanhThuNgay", "ChiTietSD", "HoaDon", "PhieuDatPhong", "KhachHang")
+
+
+@dataclass
+class GeneratorConfig:
+    """
+    Tham số sinh dữ liệu. Cùng seed + cùng tham số -> cùng dữ liệu từng dòng.
+    - years: số năm lịch sử tính ngược từ `today`, future_days: số ngày đặt trước phía sau.
+    - base_occupancy ± season_amplitude: công suất theo mùa (đỉnh vào ngày peak_day trong năm),
+      cộng weekend_boost cho tối thứ 6 / thứ 7.
+    - returning_ratio: tỷ lệ lượt đặt của khách cũ (quay lại).
+    - service_rate: số món dịch vụ trung bình mỗi đêm ở.
+    """
+    rooms: int = 2000
+    years: int = 3
+    future_days: int = 90
+    base_occupancy: float = 0.62
+    season_amplitude: float = 0.22
+    peak_day: int = 196             # giữa tháng 7
+    weekend_boost: float = 0.08
+    avg_stay: float = 2.6
+    max_stay: int = 14
+    returning_ratio: float = 0.3
+    service_rate: float = 0.6
+    rooms_per_floor: int = 50       # tối đa 99 để số phòng = tầng * 100 + vị trí
+    seed: int = 42
+    room_chunk: int = 200           # số phòng sinh trong 1 lô (giới hạn bộ nhớ)
+    today: date = None
+
+    # Ước lượng số dòng mỗi phòng-năm (phiếu + hóa đơn + khách mới + dịch vụ) cho for_rows()
+    ROWS_PER_ROOM_YEAR = 380
+
+    @classmethod
+    def for_rows(cls, rows, years=3, **kwargs):
+        """Chọn số phòng để tổng số dòng xấp xỉ `rows` (10^5 .. 10^7)"""
+        rooms = max(20, round(rows / (cls.ROWS_PER_ROOM_YEAR * years)))
+        return cls(rooms=rooms, years=years, **kwargs)
+
+
+class SyntheticDataGenerator:
+    """
+    Sinh lịch sử khách sạn nhiều năm theo từng lô phòng (bộ nhớ chỉ phụ thuộc room_chunk):
+    mỗi phòng là 1 chuỗi lượt ở liên tiếp, khoảng trống giữa 2 lượt ~ phân phối hình học
+    theo công suất mùa vụ của ngày đó. Lượt ở trong quá khứ -> 'Hoàn tất' + hóa đơn đã thanh toán;
+    đang diễn ra -> 'Đang ở' + hóa đơn mở; tương lai -> 'Đã xác nhận'.
+    """
+    def __init__(self, config=None, room_types=ROOM_TYPES, services=SERVICES, id_offsets=None, existing_rooms=()):
+        self.config = config or GeneratorConfig()
+        self.existing_rooms = [tuple(r) for r in existing_rooms]
+        self._rooms = None
+        self.room_types = {t[0]: t for t in room_types}
+        self.services = list(services)
+        offsets = id_offsets or {}
+        self._next = {table: offsets.get(table, 0) + 1 for table in IDENTITY}
+        self._first_customer = self._next["KhachHang"]
+        self.rng = random.Random(self.config.seed)
+        self.today = self.config.today or date.today()
+        self.start = self.today - timedelta(days=365 * self.config.years)
+        self.end = self.today + timedelta(days=self.config.future_days)
+
+    def _id(self, table):
+        value = self._next[table]
+        self._next[table] += 1
+        return value
+
+    def occupancy(self, day):
+        c = self.config
+        season = math.cos(2 * math.pi * (day.timetuple().tm_yday - c.peak_day) / 365.0)
+        occ = c.base_occupancy + c.season_amplitude * season
+        if day.weekday() in (4, 5):
+            occ += c.weekend_boost
+        return min(0.98, max(0.02, occ))
+
+    def rooms(self):
+        """
+        [(SoPhong, TrangThai, MaLP, GhiChu)]: giữ các phòng đã có (existing_rooms) rồi sinh thêm
+        cho đủ config.rooms, đánh số theo tầng (tầng f: f01, f02...) nối tiếp sau phòng lớn nhất.
+        """
+        if self._rooms is not None:
+            return self._rooms
+        rng = random.Random(self.config.seed ^ 0x5EED)
+        per_floor = min(self.config.rooms_per_floor, 99)
+        type_ids = sorted(self.room_types)
+        weights = [40, 25, 20, 10, 5][:len(type_ids)]
+
+        result = list(self.existing_rooms)
+        floor = max((r[0] for r in result), default=0) // 100
+        pos = per_floor
+        while len(result) < self.config.rooms:
+            if pos >= per_floor:
+                floor, pos = floor + 1, 0
+            pos += 1
+            result.append((floor * 100 + pos, 'Trống', rng.choices(type_ids, weights)[0], ''))
+        self._rooms = result
+        return result
+
+    def _customer(self, batch):
+        rng = self.rng
+        issued = self._next["KhachHang"] - self._first_customer
+        if issued and rng.random() < self.config.returning_ratio:
+            # Khách quen: khách cũ hơn được chọn ít hơn (phân phối lệch về khách gần đây)
+            return self._first_customer + int(issued * (1 - rng.random() ** 2))
+        makh = self._id("KhachHang")
+        name = f"{rng.choice(HO)} {rng.choice(DEM)} {rng.choice(TEN)}"
+        batch["KhachHang"].append((makh, name, f"{makh:012d}", f"09{rng.randint(0, 99999999):08d}"))
+        return makh
+
+    def batches(self):
+        """Sinh từng lô: {bảng: [dòng, ...]} theo thứ tự nạp an toàn khóa ngoại"""
+        c = self.config
+        rng = self.rng
+        rooms = self.rooms()
+        stay_p = 1.0 / c.avg_stay
+        for i in range(0, len(rooms), c.room_chunk):
+            batch = {table: [] for table in TABLES}
+            for room_id, _, type_id, _ in rooms[i:i + c.room_chunk]:
+                price = self.room_types[type_id][2]
+                day = self.start
+                while day < self.end:
+                    # Khoảng trống trước lượt ở tiếp theo: hình học với p ~ công suất ngày đó
+                    occ = self.occupancy(day)
+                    p = min(0.95, occ / (c.avg_stay * (1 - occ) + occ))
+                    gap = int(math.log(1 - rng.random()) / math.log(1 - p))
+                    day += timedelta(days=gap)
+                    if day >= self.end:
+                        break
+                    nights = min(c.max_stay, 1 + int(math.log(1 - rng.random()) / math.log(1 - stay_p)))
+                    self._stay(batch, room_id, price, day, nights)
+                    day += timedelta(days=nights)
+            yield batch
+
+    def _stay(self, batch, room_id, price, arrive, nights):
+        rng = self.rng
+        depart = arrive + timedelta(days=nights)
+        makh = self._customer(batch)
+        ma_pd = self._id("PhieuDatPhong")
+
+        if arrive > self.today:
+            batch["PhieuDatPhong"].append((ma_pd, makh, room_id, arrive, depart, 'Đã xác nhận'))
+            return
+        in_house = depart > self.today
+        batch["PhieuDatPhong"].append((ma_pd, makh, room_id, arrive, depart, 'Đang ở' if in_house else 'Hoàn tất'))
+
+        check_in = datetime.combine(arrive, datetime.min.time()) + timedelta(hours=14, minutes=rng.randint(0, 300))
+        svc_total = 0
+        used_nights = (self.today - arrive).days + 1 if in_house else nights
+        for n in range(used_nights):
+            while rng.random() < self.config.service_rate / (1 + self.config.service_rate):
+                ma_dv, _, gia = rng.choice(self.services)
+                qty = rng.randint(1, 3)
+                svc_total += qty * gia
+                batch["ChiTietSD"].append((self._id("ChiTietSD"), ma_pd, ma_dv, qty,
+                                           check_in + timedelta(days=n, hours=rng.randint(1, 9))))
+
+        if in_house:
+            batch["HoaDon"].append((self._id("HoaDon"), check_in, ma_pd, 0, 0, 'Chưa thanh toán'))
+        else:
+            batch["HoaDon"].append((self._id("HoaDon"), check_in, ma_pd, nights * price + svc_total, 0,
+                                    'Đã thanh toán'))
+
+    def export_csv(self, directory):
+        """Ghi từng bảng ra CSV (UTF-8, có header) để nạp bằng BULK INSERT / bcp"""
+        os.makedirs(directory, exist_ok=True)
+        files = {t: open(os.path.join(directory, f"{t}.csv"), "w", newline="", encoding="utf-8") for t in TABLES}
+        counts = dict.fromkeys(TABLES, 0)
+        try:
+            writers = {t: csv.writer(f) for t, f in files.items()}
+            for t, w in writers.items():
+                w.writerow(TABLES[t])
+            for batch in self.batches():
+                for t, rows in batch.items():
+                    writers[t].writerows(rows)
+                    counts[t] += len(rows)
+        finally:
+            for f in files.values():
+                f.close()
+        return counts
+
+
+class BulkLoader:
+    """
+    Nạp dữ liệu theo lô lớn vào 1 kết nối DB-API.
+    - pyodbc (SQL Server): bật cursor.fast_executemany (gửi cả lô tham số trong 1 round trip)
+      và SET IDENTITY_INSERT để giữ nguyên khóa đã sinh.
+    - Kết nối khác (SQLite stand-in...): executemany thường.
+    Commit sau mỗi lô của generator để log giao dịch không phình to.
+    Lịch sử sinh ra luôn bắt đầu từ phòng trống: CSDL đã có phiếu đặt thì phải reset() trước
+    (nếu không các lượt ở mới sẽ chồng lên lịch cũ). Cùng seed + reset -> cùng dữ liệu.
+    """
+    def __init__(self, conn, batch_size=10000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.cursor = conn.cursor()
+        self.sqlserver = is_sqlserver(self.cursor)
+        if self.sqlserver:
+            self.cursor.fast_executemany = True
+
+    def max_ids(self):
+        """MAX khóa hiện có của từng bảng -> id_offsets cho generator (nạp nối tiếp dữ liệu cũ)"""
+        offsets = {}
+        for table, key in IDENTITY.items():
+            self.cursor.execute(f"SELECT COALESCE(MAX({key}), 0) FROM {table}")
+            offsets[table] = self.cursor.fetchone()[0]
+        return offsets
+
+    def has_bookings(self):
+        self.cursor.execute("SELECT COUNT(*) FROM PhieuDatPhong")
+        return self.cursor.fetchone()[0] > 0
+
+    def reset(self):
+        """Xóa khách / phiếu / hóa đơn / dịch vụ đã dùng (+ folio, bảng tổng hợp), đưa phòng về 'Trống'"""
+        for table in RESET_TABLES:
+            self.cursor.execute(f"DELETE FROM {table}")
+        self.cursor.execute("UPDATE Phong SET TrangThai = N'Trống' WHERE TrangThai = N'Đang ở'")
+        self.conn.commit()
+
+    def rebuild_folios(self):
+        """
+        Dựng FolioLuuTru cho các lượt ở đang mở: SQL Server dùng FOLIO_REBUILD (MERGE + FOR JSON),
+        kết nối khác (SQLite) tính cùng dữ liệu bằng Python. Trả về số folio.
+        """
+        if self.sqlserver:
+            self.cursor.execute(FOLIO_REBUILD)
+            return len(self.cursor.fetchall())
+        now = datetime.now()
+        rows = [(*src[:-1], json.dumps(src[-1], ensure_ascii=False), now)
+                for src in folio_source_rows(self.cursor).values()]
+        self.cursor.execute("DELETE FROM FolioLuuTru")
+        self.insert("FolioLuuTru", FOLIO_COLUMNS + ("CapNhat",), rows)
+        return len(rows)
+
+    def existing_rooms(self):
+        self.cursor.execute("SELECT SoPhong, TrangThai, MaLP, GhiChu FROM Phong ORDER BY SoPhong")
+        return [tuple(r) for r in self.cursor.fetchall()]
+
+    def insert(self, table, columns, rows):
+        if not rows:
+            return
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+        identity = self.sqlserver and table in IDENTITY
+        if identity:
+            self.cursor.execute(f"SET IDENTITY_INSERT {table} ON")
+        try:
+            for i in range(0, len(rows), self.batch_size):
+                self.cursor.executemany(sql, rows[i:i + self.batch_size])
+        finally:
+            if identity:
+                self.cursor.execute(f"SET IDENTITY_INSERT {table} OFF")
+
+    def load(self, generator, progress=None):
+        """Nạp toàn bộ generator; trả về {bảng: số dòng} và thời gian"""
+        start = time.perf_counter()
+        counts = dict.fromkeys(TABLES, 0)
+
+        rooms = generator.rooms()
+        existing = {r[0] for r in generator.existing_rooms}
+        new_rooms = [r for r in rooms if r[0] not in existing]
+        self.insert("Phong", ("SoPhong", "TrangThai", "MaLP", "GhiChu"), new_rooms)
+        counts["Phong"] = len(new_rooms)
+        self.conn.commit()
+
+        for batch in generator.batches():
+            for table, columns in TABLES.items():
+                self.insert(table, columns, batch[table])
+                counts[table] += len(batch[table])
+            self.conn.commit()
+            if progress:
+                progress(counts)
+
+        # Phòng có lượt ở đang diễn ra -> trạng thái 'Đang ở'
+        self.cursor.execute("""
+            UPDATE Phong SET TrangThai = N'Đang ở'
+            WHERE SoPhong IN (SELECT SoPhong FROM PhieuDatPhong WHERE TrangThaiDat = N'Đang ở')
+        """)
+        # Dựng folio (read model) cho các lượt ở đang mở vừa nạp
+        counts["FolioLuuTru"] = self.rebuild_folios()
+        self.conn.commit()
+        counts["elapsed_s"] = time.perf_counter() - start
+        return counts
+
+
+def _load(loader, config, reset, progress):
+    if loader.has_bookings():
+        if not reset:
+            print("[DATAGEN] CSDL đã có phiếu đặt phòng - chạy lại với --reset để xóa lịch sử cũ rồi sinh lại.")
+            sys.exit(1)
+        loader.reset()
+    generator = SyntheticDataGenerator(config, id_offsets=loader.max_ids(), existing_rooms=loader.existing_rooms())
+    return loader.load(generator, progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu giả lập nhiều năm và nạp hàng loạt")
+    parser.add_argument("--rows", type=int, help="Tổng số dòng mong muốn (tự chọn số phòng), vd 100000 .. 10000000")
+    parser.add_argument("--rooms", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--reset", action="store_true",
+                        help="Xóa khách / phiếu / hóa đơn / dịch vụ hiện có trước khi nạp (bắt buộc nếu CSDL đã có phiếu)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--sqlite", help="Nạp vào file SQLite (schema giống SQL Server) thay vì SQL Server")
+    target.add_argument("--csv", help="Chỉ xuất CSV ra thư mục này (nạp bằng BULK INSERT / bcp)")
+    args = parser.parse_args(argv)
+
+    if args.rows:
+        config = GeneratorConfig.for_rows(args.rows, years=args.years, seed=args.seed)
+    else:
+        config = GeneratorConfig(rooms=args.rooms, years=args.years, seed=args.seed)
+    print(f"[DATAGEN] {config.rooms} phòng x {config.years} năm, seed={config.seed}")
+
+    if args.csv:
+        counts = SyntheticDataGenerator(config).export_csv(args.csv)
+        print(f"[DATAGEN] Đã ghi CSV vào {args.csv}: {counts}")
+        return
+
+    def progress(counts):
+        total = sum(v for k, v in counts.items() if k in TABLES)
+        sys.stdout.write(f"\r[DATAGEN] Đã nạp {total:,} dòng")
+        sys.stdout.flush()
+
+    if args.sqlite:
+        from sqlite_standin import SQLiteStandIn
+        db = SQLiteStandIn(args.sqlite)
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            for stmt in SQLiteStandIn.SCHEMA:
+                cursor.execute(stmt.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS"))
+            cursor.executemany("INSERT OR IGNORE INTO LoaiPhong VALUES (?, ?, ?, ?)", ROOM_TYPES)
+            cursor.executemany("INSERT OR IGNORE INTO DichVu VALUES (?, ?, ?)", SERVICES)
+            counts = _load(BulkLoader(conn, args.batch_size), config, args.reset, progress)
+    else:
+        from database import DatabaseManager
+        pool = DatabaseManager().get_pool()
+        with pool.connection() as conn:
+            counts = _load(BulkLoader(conn, args.batch_size), config, args.reset, progress)
+    print(f"\n[DATAGEN] Hoàn tất: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,42 @@
+import time
+_T0 = time.perf_counter()
+
+import logging
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from datetime import datetime
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from datetime import datetime, timedelta
 
 from database import DatabaseManager
 from repositories import RoomRepository, ServiceRepository, OperationRepository
 from services import HotelAlgorithms
+from availability import AvailabilityIndex, OccupancyMatrix
+from widgets import RoomGrid
+from tasks import TaskRunner
+from allocation import RoomAllocator, RoomLayout
+from catalog import RoomCatalog
+from instrumentation import Metrics, InstrumentedPool, instrument, StartupTimer
+from analytics import AnalyticsRepository, RevenueReport, format_report
+
+log = logging.getLogger(__name__)
 
 class HotelApp(tk.Tk):
     def __init__(self):
+        self.startup = StartupTimer(_T0)
+        self.startup.mark("import")
         super().__init__()
         self.title("Hệ thống Quản lý Khách Sạn (GUI)")
         self.geometry("1200x800")
         
-        self.init_db()
+        self.catalog = RoomCatalog()
+        self.db_ready = False
+        # Mọi câu SQL và thao tác Repository đều được đo (xem nút "Số liệu truy vấn")
+        self.metrics = Metrics(slow_ms=200, n_plus_one=10)
         
         self.setup_styles()
+        self.setup_status_bar()
+        # DB & thuật toán chạy trên luồng nền, kết quả trả về qua after()
+        self.tasks = TaskRunner(self, on_busy_change=self.set_busy)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(fill='both', expand=True, padx=5, pady=5)
@@ -24,31 +46,116 @@ class HotelApp(tk.Tk):
         self.notebook.add(self.tab_dashboard, text=" Sơ đồ & Quản lý Phòng")
         self.setup_dashboard_tab()
 
-        # --- TAB 2: ĐẶT PHÒNG  ---
+        # --- TAB 2, 3: chỉ dựng giao diện khi được mở lần đầu (sau khi DB sẵn sàng) ---
         self.tab_booking = ttk.Frame(self.notebook)
         self.notebook.add(self.tab_booking, text=" Đặt Phòng")
-        self.setup_booking_tab()
-
-        # --- TAB 3: CHECK-IN ---
         self.tab_checkin = ttk.Frame(self.notebook)
         self.notebook.add(self.tab_checkin, text=" Check-in")
-        self.setup_checkin_tab()
+        self._deferred_tabs = {
+            str(self.tab_booking): self.setup_booking_tab,
+            str(self.tab_checkin): self.setup_checkin_tab,
+        }
+        self.notebook.bind('<<NotebookTabChanged>>', self.build_selected_tab)
+
+        self.startup.mark("window")
+        self.after_idle(lambda: self.startup.mark("first_paint"))
+        # Kết nối DB + nạp dữ liệu trên luồng nền: cửa sổ hiện ngay, lưới phòng điền sau
+        self.tasks.submit(self.init_db, on_done=self._on_db_ready, on_error=self._on_db_error, key="init_db")
+        self.lbl_busy.config(text="Đang kết nối CSDL...")
 
     def init_db(self):
-        try:
+        """Chạy trên luồng nền: kết nối, kiểm tra phiên bản schema, nạp dữ liệu & dựng các chỉ mục"""
+        with self.startup.span("db_init"):
             db = DatabaseManager()
-            conn = db.get_connection()
-            self.room_repo = RoomRepository(conn.cursor())
-            self.op_repo = OperationRepository(conn)
-            self.svc_repo = ServiceRepository(conn.cursor())
-        except Exception as e:
-            messagebox.showerror("Lỗi DB", f"Không thể kết nối Database: {e}")
+        for name, ms in db.timings.items():
+            self.startup.add_span(f"  {name}", ms)
+        self.db_pool = db.get_pool()
+        pool = InstrumentedPool(self.db_pool, self.metrics)
+        self.room_repo = instrument(RoomRepository(pool), self.metrics)
+
+        # Nạp lịch đặt phòng 1 lần, sau đó OperationRepository tự đồng bộ
+        with self.startup.span("load_bookings"):
+            bookings = self.room_repo.get_active_bookings()
+        # Bảng Phong vẫn nạp đủ 1 lần: OccupancyMatrix, type_names và RoomCatalog (lọc/sắp xếp/tìm kiếm
+        # không cần DB) cần mọi phòng. Số phòng nhỏ và cố định so với số phiếu đặt, nạp thẳng vào cột.
+        # Sau đó dashboard chỉ đọc lại trang đang xem và các phòng vừa ghi (_apply_room_changes).
+        with self.startup.span("load_rooms"):
+            all_rooms = self.room_repo.get_all()
+
+        with self.startup.span("build_indexes"):
+            self.availability = AvailabilityIndex()
+            self.availability.load(bookings)
+            self.catalog.sync(all_rooms)
+            self.type_names = {tid: t[0] for tid, t in all_rooms.types.items()}
+            self.occupancy = OccupancyMatrix(list(zip(all_rooms.id, all_rooms.type_id)), days=90)
+            self.occupancy.load(bookings)
+            self.occupancy.set_out_of_service(all_rooms.ids_with_status('Bảo trì'))
+
+        self.op_repo = instrument(OperationRepository(pool, self.availability, self.occupancy), self.metrics)
+        self.allocator = RoomAllocator(RoomLayout(rooms_per_floor=100))
+        self.svc_repo = instrument(ServiceRepository(pool), self.metrics)
+        self.analytics_repo = instrument(AnalyticsRepository(pool), self.metrics)
+
+    def _on_db_ready(self, _):
+        self.db_ready = True
+        self.startup.mark("data_ready")
+        self.build_selected_tab()
+        self.refresh_dashboard(reload=False)
+
+        # Báo cáo chi tiết: logging + cửa sổ "Số liệu truy vấn"; thanh trạng thái chỉ hiện tóm tắt
+        log.info("%s", self.startup.report())
+        self.lbl_startup.config(text=f"Khởi động: cửa sổ {self.startup.get('window') / 1000:.2f}s · "
+                                     f"dữ liệu {self.startup.get('data_ready') / 1000:.2f}s")
+
+    def _on_db_error(self, e):
+        self.lbl_busy.config(text="Mất kết nối CSDL", foreground="red")
+        messagebox.showerror("Lỗi DB", f"Không thể kết nối Database: {e}")
+
+    def build_selected_tab(self, event=None):
+        """Dựng tab đang chọn nếu chưa dựng (chờ DB sẵn sàng vì tab cần danh mục loại phòng)"""
+        if not self.db_ready:
+            return
+        builder = self._deferred_tabs.pop(self.notebook.select(), None)
+        if builder:
+            builder()
+
+    def require_db(self):
+        if not self.db_ready:
+            messagebox.showinfo("Vui lòng chờ", "Đang kết nối cơ sở dữ liệu...")
+            return False
+        return True
 
     def setup_styles(self):
         style = ttk.Style()
         style.theme_use('clam')
-        style.configure('Room.TButton', font=('Arial', 10, 'bold'), width=10, height=4)
-        style.map('Room.TButton', background=[('active', '#e1e1e1')])
+
+    def setup_status_bar(self):
+        bar = ttk.Frame(self)
+        bar.pack(side='bottom', fill='x', padx=5, pady=(0, 5))
+        self.lbl_busy = ttk.Label(bar, text="Sẵn sàng", foreground="gray")
+        self.lbl_busy.pack(side='left')
+        self.busy_bar = ttk.Progressbar(bar, mode='indeterminate', length=120)
+        self.busy_bar.pack(side='right')
+        self.lbl_startup = ttk.Label(bar, text="", foreground="gray")
+        self.lbl_startup.pack(side='right', padx=10)
+
+    def set_busy(self, busy):
+        """Chỉ báo bận khi còn task nền chưa xong"""
+        if busy:
+            self.lbl_busy.config(text="Đang xử lý...", foreground="blue")
+            self.busy_bar.start(15)
+            self.config(cursor="watch")
+        else:
+            self.lbl_busy.config(text="Sẵn sàng", foreground="gray")
+            self.busy_bar.stop()
+            self.config(cursor="")
+
+    def show_task_error(self, e):
+        messagebox.showerror("Lỗi hệ thống", f"Chi tiết lỗi: {str(e)}")
+
+    def on_close(self):
+        self.tasks.shutdown()
+        self.destroy()
 
 
     def setup_dashboard_tab(self):
@@ -60,6 +167,8 @@ class HotelApp(tk.Tk):
         entry_id = ttk.Entry(search_frame, textvariable=self.var_search_id, width=10)
         entry_id.pack(side='left', padx=5)
         entry_id.bind('<Return>', lambda e: self.refresh_dashboard()) 
+        entry_id.bind('<KeyRelease>', self.schedule_dashboard_refresh)
+        self._refresh_after_id = None
 
         ttk.Label(search_frame, text="Loại phòng:").pack(side='left', padx=5)
         self.cb_search_type = ttk.Combobox(search_frame, state="readonly", width=15)
@@ -74,6 +183,16 @@ class HotelApp(tk.Tk):
         self.cb_search_status.current(0)
         self.cb_search_status.pack(side='left', padx=5)
 
+        ttk.Label(search_frame, text="Sắp xếp:").pack(side='left', padx=5)
+        self.cb_sort = ttk.Combobox(search_frame, state="readonly", width=12)
+        self.cb_sort['values'] = list(self.SORT_OPTIONS)
+        self.cb_sort.current(0)
+        self.cb_sort.pack(side='left', padx=5)
+
+        # Đổi bộ lọc: lọc lại trên RoomCatalog, không cần truy vấn lại DB
+        for cb in (self.cb_search_type, self.cb_search_status, self.cb_sort):
+            cb.bind('<<ComboboxSelected>>', lambda e: self.refresh_dashboard(reload=False))
+
         ttk.Button(search_frame, text="Tìm kiếm", command=self.refresh_dashboard).pack(side='left', padx=10)
         ttk.Button(search_frame, text="Xóa bộ lọc", command=self.reset_filters).pack(side='left')
 
@@ -89,83 +208,269 @@ class HotelApp(tk.Tk):
         legend(toolbar, "#F44336", "Đang ở").pack(side='right', padx=5)
         legend(toolbar, "#FF9800", "Bảo trì / Dọn").pack(side='right', padx=5)
 
+        ttk.Button(toolbar, text="Night Audit (Tạm tính toàn bộ)", command=self.run_night_audit).pack(side='left')
+        ttk.Button(toolbar, text="Báo cáo doanh thu", command=self.show_revenue_ui).pack(side='left', padx=5)
+        ttk.Button(toolbar, text="Số liệu truy vấn", command=self.show_metrics_ui).pack(side='left', padx=5)
 
+        # Phân trang Keyset: _page_starts[i] = con trỏ bắt đầu trang i (None = trang đầu)
+        self._page_starts = [None]
+        self._next_cursor = None
+        self.btn_prev_page = ttk.Button(toolbar, text="◀ Trang trước", command=self.dashboard_prev_page)
+        self.btn_prev_page.pack(side='left', padx=(20, 2))
+        self.lbl_page = ttk.Label(toolbar, text="Trang 1")
+        self.lbl_page.pack(side='left', padx=5)
+        self.btn_next_page = ttk.Button(toolbar, text="Trang sau ▶", command=self.dashboard_next_page)
+        self.btn_next_page.pack(side='left', padx=2)
 
-        container = ttk.Frame(self.tab_dashboard)
-        container.pack(fill='both', expand=True, padx=10, pady=5)
-        
-        canvas = tk.Canvas(container)
-        scrollbar = ttk.Scrollbar(container, orient="vertical", command=canvas.yview)
-        self.canvas_frame = ttk.Frame(canvas)
 
-        self.canvas_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
 
-        canvas.create_window((0, 0), window=self.canvas_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        
-        self.refresh_dashboard()
+        self.room_grid = RoomGrid(self.tab_dashboard, on_click=self.open_room_detail, columns=8)
+        self.room_grid.pack(fill='both', expand=True, padx=10, pady=5)
 
     def reset_filters(self):
         """Đặt lại bộ lọc về mặc định"""
         self.var_search_id.set("")
         self.cb_search_type.current(0)
         self.cb_search_status.current(0)
-        self.refresh_dashboard()
-
-    def refresh_dashboard(self):
-        for widget in self.canvas_frame.winfo_children():
-            widget.destroy()
-
-        all_rooms = self.room_repo.get_all()
-        
+        self.cb_sort.current(0)
+        self.refresh_dashboard(reload=False)
+
+    def schedule_dashboard_refresh(self, event=None):
+        """Gõ phím liên tục chỉ gây 1 lần refresh sau khi ngừng gõ"""
+        if self._refresh_after_id:
+            self.after_cancel(self._refresh_after_id)
+        self._refresh_after_id = self.after(self.REFRESH_DEBOUNCE_MS, lambda: self.refresh_dashboard(reload=False))
+
+    # Nhãn combobox -> (thứ tự trong RoomCatalog, đảo chiều)
+    SORT_OPTIONS = {
+        "Số phòng": ("id", False),
+        "Giá tăng dần": ("price", False),
+        "Giá giảm dần": ("price", True),
+        "Sức chứa": ("capacity", False),
+    }
+
+    PAGE_SIZE = 400
+    REFRESH_DEBOUNCE_MS = 250      # Chờ người dùng ngừng gõ bộ lọc bao lâu trước khi refresh
+
+    def refresh_dashboard(self, reload=True, keep_page=False):
+        """
+        reload=True: lấy trang hiện tại từ DB (lọc + sắp xếp + phân trang trên SQL) và cập nhật RoomCatalog;
+        False: lấy trang từ RoomCatalog trong bộ nhớ. keep_page=False: quay về trang đầu.
+        """
+        self._refresh_after_id = None
+        if not self.db_ready:
+            return
+        if not keep_page:
+            self._page_starts = [None]
+        # Đọc bộ lọc trên luồng Tk, truy vấn + lọc + sắp xếp trên luồng nền
         search_id = self.var_search_id.get().strip()
         search_type = self.cb_search_type.get()
         search_status = self.cb_search_status.get()
+        order_by, reverse = self.SORT_OPTIONS[self.cb_sort.get()]
+
+        self.tasks.submit(self._load_dashboard, reload, search_id, search_type, search_status, order_by, reverse,
+                          self._page_starts[-1],
+                          on_done=self._render_dashboard, on_error=self.show_task_error, key="dashboard")
+
+    def dashboard_next_page(self):
+        if self._next_cursor is not None:
+            self._page_starts.append(self._next_cursor)
+            self.refresh_dashboard(reload=False, keep_page=True)
+
+    def dashboard_prev_page(self):
+        if len(self._page_starts) > 1:
+            self._page_starts.pop()
+            self.refresh_dashboard(reload=False, keep_page=True)
+
+    def _load_dashboard(self, reload, search_id, search_type, search_status, order_by, reverse, after):
+        filters = dict(
+            type_name=None if search_type == "Tất cả" else search_type,
+            status=None if search_status == "Tất cả" else search_status,
+            text=search_id or None,
+            order_by=order_by, reverse=reverse
+        )
+        if reload:
+            # Chỉ kéo về đúng trang đang hiển thị thay vì toàn bộ bảng Phong
+            rooms, next_cursor = self.room_repo.query_rooms(after=after, limit=self.PAGE_SIZE, **filters)
+            # Phòng RoomCatalog còn xếp vào trang này nhưng DB không trả về đã rời bộ lọc
+            # (vd đổi trạng thái từ máy khác) -> đọc lại theo số phòng để catalog không giữ dữ liệu cũ
+            fresh = set(rooms.id)
+            stale = [r.id for r in self.catalog.query(after=after, limit=self.PAGE_SIZE, **filters)
+                     if r.id not in fresh]
+            self.catalog.sync(rooms, partial=True)
+            if stale:
+                self.catalog.sync(self.room_repo.get_by_ids(stale), partial=True)
+            return [self.catalog.get(r.id) for r in rooms], next_cursor
+
+        # Giao chỉ mục loại ∩ trạng thái ∩ chuỗi con số phòng, thứ tự lấy từ mảng đã sắp xếp sẵn
+        return self.catalog.page(self.PAGE_SIZE, after=after, **filters)
+
+    def _apply_room_changes(self, room_ids, status, note=None):
+        """Ghi thành công -> cập nhật RoomCatalog và OccupancyMatrix cho đúng các phòng vừa đổi"""
+        for rid in room_ids:
+            self.catalog.update_status(rid, status)
+            if note is not None:
+                self.catalog.update_note(rid, note)
+        self.occupancy.set_out_of_service([r.id for r in self.catalog.query(status='Bảo trì')])
+
+    def _render_dashboard(self, result):
+        rooms, self._next_cursor = result
+        self.occupancy.set_out_of_service([r.id for r in self.catalog.query(status='Bảo trì')])
+
+        self.lbl_page.config(text=f"Trang {len(self._page_starts)}")
+        self.btn_prev_page.state(['!disabled'] if len(self._page_starts) > 1 else ['disabled'])
+        self.btn_next_page.state(['!disabled'] if self._next_cursor is not None else ['disabled'])
+
+        # Lưới ảo hóa: chỉ vẽ lại các ô đang nhìn thấy và có dữ liệu thay đổi
+        self.room_grid.set_rooms(rooms)
+
+    def run_night_audit(self):
+        if not self.require_db():
+            return
+        audit_time = datetime.now()
+
+        def load():
+            # Đối soát folio (read model) với bảng gốc: chỉ phát hiện lệch, không ghi gì vào DB
+            recon = self.op_repo.reconcile_folios(repair=False)
+            folios, services = self.op_repo.get_open_folios_raw()
+            return HotelAlgorithms.calculate_bills(folios, services, audit_time), recon
+
+        def show(result):
+            batch, (recon_ok, recon) = result
+            t = batch.totals()
+            msg = (f"Mốc audit: {audit_time.strftime('%Y-%m-%d %H:%M')}\n"
+                   f"Số phòng đang ở: {t['stays']}\n"
+                   f"--------------------------------\n"
+                   f"Tiền phòng: {t['room_total']:,.0f}\n"
+                   f"Dịch vụ:    {t['service_total']:,.0f}\n"
+                   f"TỔNG TẠM TÍNH: {t['grand_total']:,.0f} VND")
+            if not recon_ok:
+                msg += f"\n\n{recon}"
+                messagebox.showinfo("Night Audit", msg)
+                return
 
-        filtered_rooms = []
-        for r in all_rooms:
-            if search_id and search_id not in str(r.id):
-                continue
-            
-            if search_type != "Tất cả" and r.type_name != search_type:
-                continue
-            
-            if search_status != "Tất cả" and r.status != search_status:
-                continue
-            
-            filtered_rooms.append(r)
+            diffs = len(recon['missing']) + len(recon['stale']) + len(recon['mismatched'])
+            msg += f"\n\nĐối soát folio: {recon['checked']} dòng, {diffs} lệch."
+            if not diffs:
+                messagebox.showinfo("Night Audit", msg)
+                return
+            for kind, label in (("missing", "Thiếu folio"), ("stale", "Folio thừa"), ("mismatched", "Folio sai")):
+                rows = recon[kind]
+                if rows:
+                    shown = ", ".join(f"P{room} (PĐ {ma_pd})" for ma_pd, room in rows[:self.AUDIT_LIST_LIMIT])
+                    more = f" ... (+{len(rows) - self.AUDIT_LIST_LIMIT})" if len(rows) > self.AUDIT_LIST_LIMIT else ""
+                    msg += f"\n- {label}: {shown}{more}"
+            msg += "\n\nDựng lại các folio lệch từ hóa đơn / dịch vụ gốc?"
+            if messagebox.askyesno("Night Audit", msg, icon='warning'):
+                self.repair_folios()
+
+        self.tasks.submit(load, on_done=show, on_error=self.show_task_error, key="night_audit")
+
+    AUDIT_LIST_LIMIT = 10      # Số phòng lệch tối đa liệt kê cho mỗi loại trong báo cáo audit
+
+    def repair_folios(self):
+        """Sửa FolioLuuTru theo bảng gốc - chỉ chạy khi người dùng xác nhận sau Night Audit"""
+        def show(result):
+            ok, res = result
+            if ok:
+                messagebox.showinfo("Đối soát folio", f"Đã dựng lại {res['repaired']} folio.")
+            else:
+                messagebox.showerror("Lỗi", res)
 
-        filtered_rooms = HotelAlgorithms.merge_sort(filtered_rooms, key=lambda r: r.id)
-        
-        color_map = {
-            'Trống': '#4CAF50',     
-            'Đang ở': '#F44336',    
-            'Bảo trì': '#FF9800',   
-            'Đang dọn': '#FFC107'   
-        }
+        self.tasks.submit(self.op_repo.reconcile_folios, True,
+                          on_done=show, on_error=self.show_task_error, key="repair_folios")
 
-        columns = 8 
-        if not filtered_rooms:
-            ttk.Label(self.canvas_frame, text="Không tìm thấy phòng nào phù hợp!", font=("Arial", 12)).pack(pady=20)
+    def show_metrics_ui(self):
+        """Top thao tác theo tổng thời gian, slow-query log, cảnh báo N+1 và xuất JSON / Prometheus"""
+        if not self.require_db():
             return
+        snap = self.metrics.snapshot()
+        popup = tk.Toplevel(self)
+        popup.title("Số liệu truy vấn")
+        popup.geometry("900x600")
 
-        for i, r in enumerate(filtered_rooms):
-            bg_color = color_map.get(r.status, '#9E9E9E')
-            
-            btn = tk.Button(
-                self.canvas_frame, 
-                text=f"P{r.id}\n{r.type_name}\n({r.status})",
-                bg=bg_color, fg='white', font=('Arial', 9, 'bold'),
-                width=12, height=4,
-                command=lambda room=r: self.open_room_detail(room)
-            )
-            btn.grid(row=i//columns, column=i%columns, padx=5, pady=5)
+        txt = tk.Text(popup, font=("Consolas", 9), wrap='none')
+        txt.pack(fill='both', expand=True, padx=10, pady=5)
+
+        lines = [f"{'Thao tác':<45} {'Gọi':>7} {'Dòng':>9} {'TB (ms)':>9} {'p95 (ms)':>9} {'Tổng (ms)':>11}"]
+        for name, s in self.metrics.top_operations(n=20):
+            lat = s["latency"]
+            lines.append(f"{name:<45} {s['calls']:>7} {s['rows']:>9} {lat['avg_ms']:>9.1f} "
+                         f"{lat['p95_ms']:>9.1f} {lat['sum_ms']:>11.1f}")
+
+        lines.append(f"\nCâu SQL chậm (>= {snap['slow_ms']:.0f} ms): {len(snap['slow_queries'])}")
+        for e in snap["slow_queries"][-10:]:
+            lines.append(f"  [{e['time']}] {e['ms']:.1f} ms | {e['operation']} | {e['sql'][:100]}")
+
+        lines.append(f"\nNghi vấn N+1: {len(snap['n_plus_one'])}")
+        for e in snap["n_plus_one"][-10:]:
+            lines.append(f"  {e['operation']}: {e['executions']} lần | {e['sql'][:100]}")
+
+        lines.append(f"\nPool kết nối: {self.db_pool.metrics()}")
+        lines.append("\n" + self.startup.report())
+
+        txt.insert(tk.END, "\n".join(lines))
+        txt.config(state='disabled')
+
+        def export(kind):
+            ext = ".json" if kind == "json" else ".prom"
+            path = filedialog.asksaveasfilename(parent=popup, defaultextension=ext,
+                                                initialfile=f"hotel_metrics{ext}")
+            if not path:
+                return
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.metrics.to_json() if kind == "json" else self.metrics.to_prometheus())
+            messagebox.showinfo("Đã xuất", f"Đã ghi {path}", parent=popup)
+
+        btn_frame = ttk.Frame(popup)
+        btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="Xuất JSON", command=lambda: export("json")).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Xuất Prometheus", command=lambda: export("prom")).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Đặt lại", command=lambda: (self.metrics.reset(), popup.destroy())).pack(side='left', padx=5)
+
+    def show_revenue_ui(self):
+        """Công suất, ADR, RevPAR, doanh thu dịch vụ theo khoảng ngày (đọc bảng tổng hợp, không quét hóa đơn)"""
+        if not self.require_db():
+            return
+        popup = tk.Toplevel(self)
+        popup.title("Báo cáo doanh thu")
+        popup.geometry("760x520")
+
+        frame_range = ttk.Frame(popup)
+        frame_range.pack(fill='x', padx=10, pady=5)
+        today = datetime.now().date()
+        ttk.Label(frame_range, text="Từ ngày:").pack(side='left')
+        entry_from = ttk.Entry(frame_range, width=12)
+        entry_from.insert(0, (today - timedelta(days=29)).isoformat())
+        entry_from.pack(side='left', padx=5)
+        ttk.Label(frame_range, text="Đến ngày:").pack(side='left')
+        entry_to = ttk.Entry(frame_range, width=12)
+        entry_to.insert(0, today.isoformat())
+        entry_to.pack(side='left', padx=5)
+
+        txt = tk.Text(popup, font=("Consolas", 9), wrap='none')
+        txt.pack(fill='both', expand=True, padx=10, pady=5)
+
+        def load(start, end):
+            types, services = self.analytics_repo.get_dimensions()
+            return format_report(RevenueReport(self.analytics_repo.load_rollups(start, end), types, services))
+
+        def show(text):
+            txt.delete("1.0", tk.END)
+            txt.insert(tk.END, text)
+
+        def run():
+            try:
+                start = datetime.strptime(entry_from.get().strip(), "%Y-%m-%d").date()
+                end = datetime.strptime(entry_to.get().strip(), "%Y-%m-%d").date()
+                if end < start: raise ValueError
+            except ValueError:
+                messagebox.showerror("Lỗi", "Ngày không hợp lệ (YYYY-MM-DD, từ <= đến)", parent=popup)
+                return
+            self.tasks.submit(load, start, end, on_done=show, on_error=self.show_task_error, key="revenue_report")
+
+        ttk.Button(frame_range, text="Xem báo cáo", command=run).pack(side='left', padx=10)
+        run()
 
     def open_room_detail(self, room):
         """Hàm xử lý khi click vào một phòng (Có Ghi chú & Phụ thu)"""
@@ -194,13 +499,20 @@ class HotelApp(tk.Tk):
         
         def save_note_action():
             new_note = txt_note.get("1.0", tk.END).strip()
-            
-            ok, msg = self.room_repo.update_note(room.id, new_note)
-            
-            if ok:
-                messagebox.showinfo("Đã lưu", "Cập nhật ghi chú thành công!", parent=popup)
-            else:
-                messagebox.showerror("Lỗi", msg, parent=popup)
+
+            def on_saved(result):
+                ok, msg = result
+                if ok:
+                    self.catalog.update_note(room.id, new_note)
+                if not popup.winfo_exists():
+                    return
+                if ok:
+                    messagebox.showinfo("Đã lưu", "Cập nhật ghi chú thành công!", parent=popup)
+                else:
+                    messagebox.showerror("Lỗi", msg, parent=popup)
+
+            self.tasks.submit(self.room_repo.update_note, room.id, new_note,
+                              on_done=on_saved, on_error=self.show_task_error)
 
         btn_save = ttk.Button(note_frame, text=" Lưu Ghi Chú", command=save_note_action)
         btn_save.pack(anchor='e', padx=5, pady=5)
@@ -209,12 +521,18 @@ class HotelApp(tk.Tk):
         action_frame.pack(fill='x', padx=10, pady=10)
 
         if room.status in ['Đang ở']:
-            raw_data, msg = self.op_repo.get_bill_raw_data(room.id)
-            if raw_data:
+            lbl_cust = ttk.Label(action_frame, text="Đang tải thông tin khách...", foreground="gray")
+            lbl_cust.pack(pady=5)
+
+            def on_folio(result):
+                raw_data, msg = result
+                if not popup.winfo_exists():
+                    return
+                if not raw_data:
+                    lbl_cust.config(text=msg, foreground="red")
+                    return
                 bill = HotelAlgorithms.calculate_bill(raw_data)
-                
-                lbl_cust = ttk.Label(action_frame, text=f"Khách: {bill.customer_name} | Vào: {bill.check_in.strftime('%d/%m %H:%M')} | Ở: {bill.days_used} ngày", foreground="blue")
-                lbl_cust.pack(pady=5)
+                lbl_cust.config(text=f"Khách: {bill.customer_name} | Vào: {bill.check_in.strftime('%d/%m %H:%M')} | Ở: {bill.days_used} ngày", foreground="blue")
                 
                 btn_frame = ttk.Frame(action_frame)
                 btn_frame.pack(pady=10)
@@ -228,6 +546,8 @@ class HotelApp(tk.Tk):
                 ttk.Button(btn_frame, text=" Check-out & Thanh Toán", 
                            command=lambda: self.checkout_ui(room.id, popup, txt_note.get("1.0", tk.END).strip())).grid(row=0, column=2, padx=5)
 
+            self.tasks.submit(self.op_repo.get_folio, room.id, on_done=on_folio, on_error=self.show_task_error)
+
         else:
             ttk.Label(action_frame, text="Cập nhật trạng thái thủ công:").pack(pady=5)
             
@@ -243,23 +563,40 @@ class HotelApp(tk.Tk):
                     ).pack(side='left', padx=5)
 
     def update_status(self, rid, new_status, popup):
-        ok, msg = self.room_repo.update_status(rid, new_status)
-        if ok:
-            messagebox.showinfo("Thành công", msg)
-            popup.destroy()
-            self.refresh_dashboard()
-        else:
-            messagebox.showerror("Lỗi", msg)
+        def on_updated(result):
+            ok, msg = result
+            if ok:
+                self._apply_room_changes([rid], new_status)
+                self.refresh_dashboard(reload=False, keep_page=True)
+                messagebox.showinfo("Thành công", msg)
+                if popup.winfo_exists():
+                    popup.destroy()
+            else:
+                messagebox.showerror("Lỗi", msg)
 
+        self.tasks.submit(self.room_repo.update_status, rid, new_status,
+                          on_done=on_updated, on_error=self.show_task_error)
 
-    def show_bill_ui(self, rid, title, parent_window=None):
-        raw, msg = self.op_repo.get_bill_raw_data(rid)
-        
-        if not raw:
-            messagebox.showerror("Lỗi", msg, parent=parent_window)
-            return None
-        bill = HotelAlgorithms.calculate_bill(raw)
-        
+
+    def show_bill_ui(self, rid, title, parent_window=None, on_bill=None):
+        """Lấy folio trên luồng nền rồi hiện hóa đơn; on_bill(bill) được gọi trên luồng Tk khi có dữ liệu"""
+        def on_folio(result):
+            raw, msg = result
+            if parent_window is not None and not parent_window.winfo_exists():
+                return
+            if not raw:
+                messagebox.showerror("Lỗi", msg, parent=parent_window)
+                return
+            bill = HotelAlgorithms.calculate_bill(raw)
+            if title == "Tạm tính":
+                messagebox.showinfo(title, self._bill_text(bill, title), parent=parent_window)
+            if on_bill:
+                on_bill(bill)
+
+        self.tasks.submit(self.op_repo.get_folio, rid, on_done=on_folio, on_error=self.show_task_error)
+
+    @staticmethod
+    def _bill_text(bill, title):
         bill_text = f"""
         === {title.upper()} ===
         Khách hàng: {bill.customer_name}
@@ -280,16 +617,13 @@ class HotelApp(tk.Tk):
             bill_text += "\n   (Không sử dụng dịch vụ)"
             
         bill_text += f"\n--------------------------------\n TỔNG CỘNG: {bill.grand_total:,.0f} VND"
-        
-        if title == "Tạm tính":
-            messagebox.showinfo(title, bill_text, parent=parent_window)
-            
-        return bill
+        return bill_text
 
     def checkout_ui(self, rid, parent_popup, current_note =""):
-        bill = self.show_bill_ui(rid, "Kiểm tra trước thanh toán", parent_popup)
-        if not bill: return
+        self.show_bill_ui(rid, "Kiểm tra trước thanh toán", parent_popup,
+                          on_bill=lambda bill: self._open_payment_window(rid, parent_popup, current_note, bill))
 
+    def _open_payment_window(self, rid, parent_popup, current_note, bill):
         pay_window = tk.Toplevel(self)
         pay_window.title(f"Thanh toán Phòng {rid}")
         pay_window.geometry("400x500")
@@ -332,15 +666,20 @@ class HotelApp(tk.Tk):
                 msg = f"Tổng bill: {bill.grand_total:,.0f}\nPhụ thu: {surcharge:,.0f}\n\nKHÁCH CẦN TRẢ: {final_total:,.0f} VND"
                 
                 if messagebox.askyesno("Chốt thanh toán", msg, parent=pay_window):
-                    ok, res_msg = self.op_repo.checkout(rid, bill, surcharge)
-                    
-                    if ok:
-                        messagebox.showinfo("Thành công", res_msg, parent=parent_popup)
-                        pay_window.destroy()
-                        parent_popup.destroy()
-                        self.refresh_dashboard() 
-                    else:
-                        messagebox.showerror("Lỗi", res_msg, parent=pay_window)
+                    def on_paid(result):
+                        ok, res_msg = result
+                        if ok:
+                            # checkout: phòng -> 'Đang dọn', ghi chú được xóa
+                            self._apply_room_changes([rid], 'Đang dọn', note='')
+                            messagebox.showinfo("Thành công", res_msg, parent=parent_popup)
+                            pay_window.destroy()
+                            parent_popup.destroy()
+                            self.refresh_dashboard() 
+                        else:
+                            messagebox.showerror("Lỗi", res_msg, parent=pay_window)
+
+                    self.tasks.submit(self.op_repo.checkout, rid, bill, surcharge,
+                                      on_done=on_paid, on_error=self.show_task_error)
             except ValueError:
                 messagebox.showerror("Lỗi", "Số tiền phụ thu không hợp lệ", parent=pay_window)
 
@@ -364,9 +703,11 @@ class HotelApp(tk.Tk):
         self.bk_entry_end = ttk.Entry(grp_search); self.bk_entry_end.grid(row=0, column=3)
         
         ttk.Button(grp_search, text=" Tìm kiếm", command=self.bk_search).grid(row=0, column=4, padx=20)
+        ttk.Button(grp_search, text=" Phòng trống 90 ngày tới", command=self.show_horizon_ui).grid(row=0, column=5)
         
-        ttk.Label(frame, text="* Double click vào dòng để chọn phòng thủ công (Merge Sort/Binary Search)", font=("Arial", 9, "italic"), foreground="gray").pack(anchor='w')
-        ttk.Label(frame, text="* Hoặc nhập số lượng bên dưới để hệ thống tự chọn phòng gần nhau (Sliding Window)", font=("Arial", 9, "italic"), foreground="gray").pack(anchor='w')
+        ttk.Label(frame, text="* Double click vào dòng để chọn phòng thủ công (Binary Search)", font=("Arial", 9, "italic"), foreground="gray").pack(anchor='w')
+        ttk.Label(frame, text="* Hoặc nhập số lượng bên dưới để hệ thống tự chọn phòng gần nhau: ít tầng nhất, cùng hành lang (Sliding Window)", font=("Arial", 9, "italic"), foreground="gray").pack(anchor='w')
+        ttk.Label(frame, text="* Đoàn nhiều loại phòng: Ctrl+click chọn nhiều dòng, số lượng nhập dạng 2,3 theo thứ tự dòng", font=("Arial", 9, "italic"), foreground="gray").pack(anchor='w')
         
         self.bk_tree = ttk.Treeview(frame, columns=("ID", "Loại", "Giá", "Còn Trống"), show='headings', height=6)
         for col in ("ID", "Loại", "Giá", "Còn Trống"):
@@ -396,6 +737,22 @@ class HotelApp(tk.Tk):
         
         ttk.Button(grp_form, text="XÁC NHẬN ĐẶT PHÒNG", command=self.bk_confirm).grid(row=3, column=0, columnspan=4, pady=20)
 
+        grp_alt = ttk.LabelFrame(frame, text="3. Hết phòng? Gợi ý ngày gần nhất (cùng số đêm, ±14 ngày)")
+        grp_alt.pack(fill='both', expand=True, pady=10)
+
+        ttk.Label(grp_alt, text="Loại phòng:").grid(row=0, column=0, padx=5, pady=5)
+        self.alt_type = ttk.Combobox(grp_alt, state="readonly", width=15,
+                                     values=[self.type_names[t] for t in sorted(self.type_names)])
+        self.alt_type.grid(row=0, column=1)
+        if self.type_names:
+            self.alt_type.current(0)
+        ttk.Button(grp_alt, text="Tìm ngày thay thế", command=self.bk_find_alternatives).grid(row=0, column=2, padx=10)
+
+        self.alt_list = tk.Listbox(grp_alt, height=5)
+        self.alt_list.grid(row=1, column=0, columnspan=4, sticky='we', padx=5, pady=5)
+        self.alt_list.bind("<Double-1>", self.bk_apply_alternative)
+        self.alt_windows = []
+
     def bk_search(self):
         self.selected_manual_rooms = []
         self.lbl_selected_rooms.config(text="Chưa chọn phòng nào (Sẽ tự động chọn)", foreground="blue")
@@ -403,23 +760,106 @@ class HotelApp(tk.Tk):
         s_date = self.bk_entry_start.get()
         e_date = self.bk_entry_end.get()
         
+        self.tasks.submit(self._load_bk_stats, s_date, e_date,
+                          on_done=self._render_bk_stats, on_error=self.show_task_error, key="bk_search")
+
+    def _load_bk_stats(self, s_date, e_date):
+        # Bản sao dạng cột của RoomCatalog (đã theo thứ tự số phòng), phòng bận tra trong chỉ mục
+        all_rooms = self.catalog.to_table()
+        busy_ids = self.availability.conflict_ids(s_date, e_date)
+        
+        stats = HotelAlgorithms.analyze_availability(all_rooms, busy_ids)
+        stats.sort(key=lambda x: x['id'])
+        return stats
+
+    def _render_bk_stats(self, stats):
+        self.bk_stats = stats
+        
+        for row in self.bk_tree.get_children():
+            self.bk_tree.delete(row)
+        
+        for st in self.bk_stats:
+            self.bk_tree.insert("", "end", values=(st['id'], st['name'], f"{st['price']:,.0f}", st['count']))
+
+
+    def bk_find_alternatives(self):
+        """Tìm N khoảng ngày gần nhất đủ phòng cho loại + số lượng + số đêm đang nhập"""
         try:
-            all_rooms = self.room_repo.get_all()
-            busy_ids = self.room_repo.get_conflict_ids(s_date, e_date)
-            
-            self.bk_stats = HotelAlgorithms.analyze_availability(all_rooms, busy_ids)
-            
-            self.bk_stats.sort(key=lambda x: x['id'])
-            
-            for row in self.bk_tree.get_children():
-                self.bk_tree.delete(row)
-            
-            for st in self.bk_stats:
-                self.bk_tree.insert("", "end", values=(st['id'], st['name'], f"{st['price']:,.0f}", st['count']))
-                
-        except Exception as e:
-            messagebox.showerror("Lỗi hệ thống", f"Chi tiết lỗi: {str(e)}")
+            s_date = datetime.strptime(self.bk_entry_start.get().strip(), "%Y-%m-%d").date()
+            e_date = datetime.strptime(self.bk_entry_end.get().strip(), "%Y-%m-%d").date()
+            nights = (e_date - s_date).days
+            qty = int(self.bk_qty.get())
+            if nights <= 0 or qty <= 0: raise ValueError
+        except ValueError:
+            messagebox.showerror("Lỗi", "Ngày (YYYY-MM-DD) hoặc số lượng không hợp lệ!")
+            return
 
+        type_name = self.alt_type.get()
+        type_id = next((t for t, name in self.type_names.items() if name == type_name), None)
+
+        def load():
+            try:
+                return True, self.occupancy.nearest_windows(s_date, nights, qty, type_id=type_id, radius=14, limit=5)
+            except ValueError as e:
+                return False, str(e)
+
+        def show(result):
+            ok, windows = result
+            if not ok:
+                messagebox.showerror("Lỗi", windows)
+                return
+            self.alt_windows = windows
+            self.alt_list.delete(0, tk.END)
+            if not windows:
+                self.alt_list.insert(tk.END, "Không có khoảng ngày nào trong ±14 ngày đủ phòng.")
+                return
+            for start, end, free in windows:
+                self.alt_list.insert(tk.END, f"{start:%d/%m/%Y} -> {end:%d/%m/%Y}: còn {free} phòng {type_name}")
+
+        self.alt_windows = []
+        self.tasks.submit(load, on_done=show, on_error=self.show_task_error, key="alternatives")
+
+    def bk_apply_alternative(self, event):
+        """Double click: áp dụng khoảng ngày gợi ý và tìm lại"""
+        sel = self.alt_list.curselection()
+        if not sel or sel[0] >= len(self.alt_windows): return
+        start, end, _ = self.alt_windows[sel[0]]
+        self.bk_entry_start.delete(0, tk.END); self.bk_entry_start.insert(0, start.isoformat())
+        self.bk_entry_end.delete(0, tk.END); self.bk_entry_end.insert(0, end.isoformat())
+        self.bk_search()
+
+    def show_horizon_ui(self, days=90):
+        """Số phòng trống theo loại cho từng đêm (tra trên OccupancyMatrix, không truy vấn SQL)"""
+        s_date = datetime.now().date()
+        e_date = s_date + timedelta(days=days)
+
+        def load():
+            return self.occupancy.free_counts_by_type(s_date, e_date), self.occupancy.occupancy(s_date, e_date)
+
+        self.tasks.submit(load, on_done=lambda result: self._render_horizon(s_date, days, *result),
+                          on_error=self.show_task_error, key="horizon")
+
+    def _render_horizon(self, s_date, days, counts, occupancy):
+        type_ids = sorted(counts)
+
+        popup = tk.Toplevel(self)
+        popup.title(f"Phòng trống {days} ngày tới")
+        popup.geometry("700x600")
+
+        columns = ["Ngày"] + [self.type_names.get(t, str(t)) for t in type_ids] + ["Công suất"]
+        tree = ttk.Treeview(popup, columns=columns, show='headings')
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=90, anchor='center')
+        scrollbar = ttk.Scrollbar(popup, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side='left', fill='both', expand=True, padx=(10, 0), pady=10)
+        scrollbar.pack(side='right', fill='y', pady=10)
+
+        for d in range(days):
+            night = s_date + timedelta(days=d)
+            row = [night.strftime("%d/%m/%Y")] + [counts[t][d] for t in type_ids] + [f"{occupancy[d]:.1f}%"]
+            tree.insert("", "end", values=row)
 
     def open_manual_selection_popup(self, event):
         sel = self.bk_tree.selection()
@@ -435,8 +875,8 @@ class HotelApp(tk.Tk):
             messagebox.showinfo("Thông báo", "Loại phòng này đã hết chỗ!")
             return
 
-        raw_ids = target_stat['room_ids']
-        sorted_ids = HotelAlgorithms.merge_sort(raw_ids)
+        # room_ids đã theo thứ tự số phòng vì được duyệt từ RoomCatalog
+        sorted_ids = target_stat['room_ids']
 
         popup = tk.Toplevel(self)
         popup.title(f"Chọn phòng {type_name}")
@@ -501,29 +941,46 @@ class HotelApp(tk.Tk):
                 messagebox.showwarning("Lỗi", "Vui lòng chọn loại phòng!")
                 return
             try:
-                qty = int(self.bk_qty.get())
-                if qty <= 0: raise ValueError
-                
-                type_id = self.bk_tree.item(sel[0])['values'][0]
-                target = next((x for x in self.bk_stats if x['id'] == type_id), None)
+                # Nhiều loại phòng: chọn nhiều dòng, số lượng "2,3" theo thứ tự dòng (1 số = áp dụng cho mọi dòng)
+                qtys = [int(q) for q in self.bk_qty.get().split(",")]
+                if len(qtys) == 1:
+                    qtys = qtys * len(sel)
+                if len(qtys) != len(sel) or any(q <= 0 for q in qtys): raise ValueError
                 
-                if qty > target['count']:
-                    messagebox.showerror("Lỗi", "Không đủ phòng trống!")
-                    return
+                need = {}
+                candidates = []
+                for item, qty in zip(sel, qtys):
+                    type_id = self.bk_tree.item(item)['values'][0]
+                    target = next((x for x in self.bk_stats if x['id'] == type_id), None)
+                    
+                    if qty > target['count']:
+                        messagebox.showerror("Lỗi", f"Không đủ phòng {target['name']} trống!\nDùng mục 3 để tìm ngày gần nhất còn đủ phòng.")
+                        self.alt_type.set(target['name'])
+                        self.bk_find_alternatives()
+                        return
+                    need[type_id] = qty
+                    candidates.extend((rid, type_id) for rid in target['room_ids'])
                 
-                room_ids_to_book = HotelAlgorithms.find_closest_rooms(target['room_ids'], qty)
+                # Xếp phòng ít tầng nhất, gần nhau nhất trên hành lang
+                result = self.allocator.allocate(candidates, need)
+                room_ids_to_book = result["rooms"] if result else []
             except ValueError:
                 messagebox.showerror("Lỗi", "Số lượng không hợp lệ!")
                 return
 
         if room_ids_to_book:
             if messagebox.askyesno("Xác nhận", f"Đặt các phòng: {room_ids_to_book}?"):
-                ok, msg = self.op_repo.create_booking(guest, room_ids_to_book, self.bk_entry_start.get(), self.bk_entry_end.get())
-                if ok:
-                    messagebox.showinfo("Thành công", msg)
-                    self.bk_search() 
-                else:
-                    messagebox.showerror("Lỗi", msg)
+                def on_booked(result):
+                    ok, msg = result
+                    if ok:
+                        messagebox.showinfo("Thành công", msg)
+                        self.bk_search() 
+                    else:
+                        messagebox.showerror("Lỗi", msg)
+
+                self.tasks.submit(self.op_repo.create_booking, guest, room_ids_to_book,
+                                  self.bk_entry_start.get(), self.bk_entry_end.get(),
+                                  on_done=on_booked, on_error=self.show_task_error)
 
 
     def setup_checkin_tab(self):
@@ -537,15 +994,42 @@ class HotelApp(tk.Tk):
         self.ck_cccd.pack(pady=5, ipadx=50)
         
         ttk.Button(frame, text="Thực hiện Check-in", command=self.ck_process).pack(pady=20)
+        ttk.Button(frame, text="Check-in toàn bộ khách đến hôm nay", command=self.ck_arrivals).pack(pady=5)
         
         self.ck_lbl_res = ttk.Label(frame, text="", font=('Arial', 10), foreground="blue")
         self.ck_lbl_res.pack(pady=10)
 
     def ck_process(self):
         cccd = self.ck_cccd.get()
-        status, res = self.op_repo.check_in(cccd)
+        self.tasks.submit(self.op_repo.check_in, cccd,
+                          on_done=self._on_checked_in, on_error=self.show_task_error)
+
+    def ck_arrivals(self):
+        if not messagebox.askyesno("Xác nhận", "Check-in tất cả phiếu 'Đã xác nhận' có ngày đến hôm nay?"):
+            return
+        self.tasks.submit(self.op_repo.check_in_arrivals,
+                          on_done=self._on_arrivals_done, on_error=self.show_task_error)
+
+    def _on_arrivals_done(self, result):
+        status, res = result
+        if not status:
+            self.ck_lbl_res.config(text=res, foreground="red")
+            messagebox.showwarning("Lỗi", res)
+            return
+
+        guests = len({r['cccd'] for r in res['rooms']})
+        msg = f"Đã check-in {res['count']} phòng cho {guests} khách ({res['elapsed_ms']:.0f} ms)"
+        self.ck_lbl_res.config(text=msg, foreground="green")
+        messagebox.showinfo("Thành công", msg)
+        if res['count']:
+            self._apply_room_changes([r['room'] for r in res['rooms']], 'Đang ở')
+            self.refresh_dashboard()
+
+    def _on_checked_in(self, result):
+        status, res = result
         if status:
             msg = f"Check-in thành công!\nKhách: {res['name']}\nPhòng: {res['rooms']}"
+            self._apply_room_changes(res['rooms'], 'Đang ở')
             self.ck_lbl_res.config(text=msg, foreground="green")
             messagebox.showinfo("Thành công", msg)
             self.refresh_dashboard()
@@ -562,16 +1046,27 @@ class HotelApp(tk.Tk):
             svc_popup.transient(parent_popup)
             svc_popup.grab_set()
         
-        services = self.svc_repo.get_all()
-        service_map = {s.name: s.id for s in services} 
-        
+        # Danh mục dịch vụ tải trên luồng nền; các nút dùng `services` sau khi đã nạp xong
+        services = []
+        service_map = {}
+
         frame_single = ttk.LabelFrame(svc_popup, text="1. Chọn món lẻ")
         frame_single.pack(fill='x', padx=10, pady=5)
         
         listbox = tk.Listbox(frame_single, height=8)
-        for s in services:
-            listbox.insert(tk.END, f"{s.id}. {s.name} - {s.price:,.0f}đ")
+        listbox.insert(tk.END, "Đang tải danh mục dịch vụ...")
         listbox.pack(pady=5, fill='x', padx=5)
+
+        def on_services(result):
+            if not svc_popup.winfo_exists():
+                return
+            services[:] = result
+            service_map.update({s.name: s.id for s in result})
+            listbox.delete(0, tk.END)
+            for s in services:
+                listbox.insert(tk.END, f"{s.id}. {s.name} - {s.price:,.0f}đ")
+
+        self.tasks.submit(self.svc_repo.get_all, on_done=on_services, on_error=self.show_task_error)
         
         frame_qty = ttk.Frame(frame_single)
         frame_qty.pack(fill='x', padx=5, pady=5)
@@ -584,7 +1079,7 @@ class HotelApp(tk.Tk):
         
         def confirm_single():
             sel = listbox.curselection()
-            if not sel: 
+            if not sel or not services: 
                 messagebox.showwarning("Lỗi", "Vui lòng chọn một món!")
                 return
             
@@ -592,20 +1087,25 @@ class HotelApp(tk.Tk):
             try:
                 qty = int(var_qty.get())
                 if qty <= 0: raise ValueError
-                
-                ok, msg = self.svc_repo.add_usage(rid, sid, qty)
-                
-                if ok: 
-                    messagebox.showinfo("Thành công", msg, parent=svc_popup)
-                    svc_popup.destroy() 
-
-                    if parent_popup:
-                        parent_popup.lift()
-                        parent_popup.focus_force()
-                else: 
-                    messagebox.showerror("Lỗi", msg)
             except ValueError: 
                 messagebox.showerror("Lỗi", "Số lượng phải là số nguyên dương")
+                return
+
+            self.tasks.submit(self.svc_repo.add_usage, rid, sid, qty,
+                              on_done=on_added, on_error=self.show_task_error)
+
+        def on_added(result):
+            ok, msg = result
+            if not ok:
+                messagebox.showerror("Lỗi", msg, parent=svc_popup if svc_popup.winfo_exists() else None)
+                return
+            if svc_popup.winfo_exists():
+                messagebox.showinfo("Thành công", msg, parent=svc_popup)
+                svc_popup.destroy()
+
+            if parent_popup and parent_popup.winfo_exists():
+                parent_popup.lift()
+                parent_popup.focus_force()
 
         ttk.Button(frame_qty, text="Gọi món này", command=confirm_single).pack(side='right')
 
@@ -617,6 +1117,9 @@ class HotelApp(tk.Tk):
         ttk.Label(frame_input, text="Ngân sách (VND):").pack(side='left')
         entry_budget = ttk.Entry(frame_input, width=15)
         entry_budget.pack(side='left', padx=5)
+        ttk.Label(frame_input, text="Tối đa/món:").pack(side='left')
+        var_max_qty = tk.StringVar(value="1")
+        ttk.Spinbox(frame_input, from_=1, to=10, width=4, textvariable=var_max_qty).pack(side='left', padx=5)
         
         list_combo = tk.Listbox(frame_combo, height=8, bg="#f0f0f0")
         list_combo.pack(fill='both', expand=True, padx=5, pady=5)
@@ -626,17 +1129,31 @@ class HotelApp(tk.Tk):
         def find_combos():
             try:
                 budget = float(entry_budget.get())
-                self.current_combos = HotelAlgorithms.suggest_service_combos(services, budget)
-                list_combo.delete(0, tk.END)
-                if not self.current_combos:
-                    list_combo.insert(tk.END, "Không tìm thấy combo phù hợp!")
-                    return
-
-                for i, c in enumerate(self.current_combos, 1):
-                    names = ", ".join(c['combo'])
-                    list_combo.insert(tk.END, f"#{i} [{c['total']:,.0f}đ]: {names}")
+                max_qty = int(var_max_qty.get())
+                if max_qty <= 0: raise ValueError
             except ValueError:
-                messagebox.showerror("Lỗi", "Nhập sai số tiền")
+                messagebox.showerror("Lỗi", "Nhập sai số tiền hoặc số lượng")
+                return
+
+            # Bảng DP cỡ ngân sách / ƯCLN(giá) -> chạy nền; lần tìm mới hủy lần cũ chưa xong
+            self.current_combos = []
+            list_combo.delete(0, tk.END)
+            list_combo.insert(tk.END, "Đang tìm combo...")
+            self.tasks.submit(HotelAlgorithms.suggest_service_combos, list(services), budget, 5, max_qty,
+                              on_done=show_combos, on_error=self.show_task_error, key="combos")
+
+        def show_combos(combos):
+            if not svc_popup.winfo_exists():
+                return
+            self.current_combos = combos
+            list_combo.delete(0, tk.END)
+            if not combos:
+                list_combo.insert(tk.END, "Không tìm thấy combo phù hợp!")
+                return
+
+            for i, c in enumerate(combos, 1):
+                names = ", ".join(name if qty == 1 else f"{name} x{qty}" for name, qty in c['items'])
+                list_combo.insert(tk.END, f"#{i} [{c['total']:,.0f}đ]: {names}")
 
         def select_combo():
             sel = list_combo.curselection()
@@ -645,18 +1162,25 @@ class HotelApp(tk.Tk):
             chosen = self.current_combos[sel[0]]
             confirm = messagebox.askyesno("Xác nhận", f"Gọi Combo giá {chosen['total']:,.0f}đ?")
             if confirm:
-                count = 0
-                for name in chosen['combo']:
-                    if name in service_map:
-                        self.svc_repo.add_usage(rid, service_map[name], 1)
-                        count += 1
-                
-                messagebox.showinfo("Hoàn tất", f"Đã thêm {count} món.")
-                svc_popup.destroy()
+                # Cả combo ghi trong 1 giao dịch: hoặc thêm đủ các món, hoặc không món nào
+                lines = [(rid, service_map[name], qty) for name, qty in chosen['items'] if name in service_map]
+
+                def on_combo_added(result):
+                    ok, res = result
+                    if not ok:
+                        messagebox.showerror("Lỗi", res, parent=svc_popup if svc_popup.winfo_exists() else None)
+                        return
+
+                    messagebox.showinfo("Hoàn tất", f"Đã thêm {len(lines)} món.")
+                    if svc_popup.winfo_exists():
+                        svc_popup.destroy()
+
+                    if parent_popup and parent_popup.winfo_exists():
+                        parent_popup.lift()
+                        parent_popup.focus_force()
 
-                if parent_popup:
-                    parent_popup.lift()
-                    parent_popup.focus_force()
+                self.tasks.submit(self.svc_repo.add_usages, lines,
+                                  on_done=on_combo_added, on_error=self.show_task_error)
 
         btn_frame = ttk.Frame(frame_combo)
         btn_frame.pack(pady=10)
@@ -664,5 +1188,7 @@ class HotelApp(tk.Tk):
         ttk.Button(btn_frame, text=" Chọn Combo", command=select_combo).pack(side='left', padx=10)
 
 if __name__ == "__main__":
+    # Báo cáo khởi động (HotelApp) và thông báo của database.py đi qua logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
     app = HotelApp()
     app.mainloop()
\ No newline at end of file
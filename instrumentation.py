@@ -0,0 +1,432 @@
+import re
+import json
+import time
+import hashlib
+import inspect
+import threading
+import functools
+from collections import deque, Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from streaming import StreamStats, execute, pack_params
+
+
+# Ngưỡng histogram (ms) dùng chung cho thao tác Repository và câu lệnh SQL
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def fingerprint(sql):
+    """Chuẩn hóa câu SQL để gom nhóm: gộp khoảng trắng, rút gọn danh sách VALUES / IN (?, ?, ...)"""
+    sql = " ".join(sql.split())
+    sql = re.sub(r"\(\?(?:, \?)*\)(?:, \(\?(?:, \?)*\))+", "(?...), ...", sql)
+    sql = re.sub(r"IN \(\?(?:, \?)+\)", "IN (?...)", sql)
+    return sql
+
+
+class Histogram:
+    """Histogram cố định theo LATENCY_BUCKETS_MS: chỉ tăng 1 bộ đếm mỗi lần ghi"""
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, ms):
+        i = 0
+        for bound in LATENCY_BUCKETS_MS:
+            if ms <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.total += ms
+        self.count += 1
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        """Ước lượng phân vị = cận trên của bucket chứa nó"""
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count, "sum_ms": self.total, "max_ms": self.max,
+            "avg_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50), "p95_ms": self.percentile(95), "p99_ms": self.percentile(99),
+            "buckets": {str(b): c for b, c in zip(list(LATENCY_BUCKETS_MS) + ["+Inf"], self.counts)},
+        }
+
+
+class _Stat:
+    __slots__ = ("calls", "errors", "rows", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+    """
+    Bộ thu số liệu cho thao tác Repository và câu lệnh SQL (an toàn đa luồng).
+    - Mỗi thao tác / câu SQL: số lần gọi, lỗi, số dòng trả về, histogram độ trễ.
+    - Slow-query log: các câu SQL chậm hơn slow_ms (giữ slow_log_size mục gần nhất).
+    - Phát hiện N+1: 1 thao tác gốc chạy cùng 1 câu SQL >= n_plus_one lần (vòng lặp từng dòng).
+    - streams: số dòng / byte ước lượng / lô của các truy vấn đọc dạng luồng (streaming.iter_batches).
+    enabled=False: các wrapper gọi thẳng hàm gốc, gần như không tốn chi phí.
+    """
+    def __init__(self, slow_ms=200.0, slow_log_size=200, n_plus_one=10, enabled=True):
+        self.slow_ms = slow_ms
+        self.n_plus_one = n_plus_one
+        self.enabled = enabled
+        self._ops = {}
+        self._sql = {}
+        self._sql_text = {}         # qid -> câu SQL đã chuẩn hóa
+        self.slow_log = deque(maxlen=slow_log_size)
+        self.n_plus_one_log = deque(maxlen=slow_log_size)
+        self.streams = StreamStats()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- Ngữ cảnh thao tác (theo luồng) ---
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_operation(self):
+        stack = self._stack()
+        return stack[0]["name"] if stack else None
+
+    @contextmanager
+    def operation(self, name):
+        """Đo 1 thao tác; thao tác lồng nhau được đo riêng, N+1 tính theo thao tác ngoài cùng"""
+        stack = self._stack()
+        frame = {"name": name, "rows": 0, "sql": Counter()}
+        stack.append(frame)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield frame
+        except Exception:
+            error = True
+            raise
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            stack.pop()
+            with self._lock:
+                stat = self._ops.get(name)
+                if stat is None:
+                    stat = self._ops[name] = _Stat()
+                stat.calls += 1
+                stat.errors += error
+                stat.rows += frame["rows"]
+                stat.latency.observe(ms)
+            if stack:
+                stack[-1]["rows"] += frame["rows"]
+                stack[-1]["sql"].update(frame["sql"])
+            else:
+                self._check_n_plus_one(name, frame["sql"], ms)
+
+    def _check_n_plus_one(self, name, sql_counts, ms):
+        for qid, n in sql_counts.items():
+            if n >= self.n_plus_one:
+                with self._lock:
+                    self.n_plus_one_log.append({
+                        "time": datetime.now().isoformat(timespec="seconds"), "operation": name,
+                        "qid": qid, "sql": self._sql_text.get(qid, ""), "executions": n, "elapsed_ms": ms
+                    })
+
+    # --- Ghi nhận SQL ---
+    def query_id(self, sql):
+        fp = fingerprint(sql)
+        qid = hashlib.sha1(fp.encode("utf-8")).hexdigest()[:10]
+        if qid not in self._sql_text:
+            with self._lock:
+                self._sql_text[qid] = fp
+        return qid
+
+    def record_sql(self, qid, ms, error=False, params=0):
+        with self._lock:
+            stat = self._sql.get(qid)
+            if stat is None:
+                stat = self._sql[qid] = _Stat()
+            stat.calls += 1
+            stat.errors += error
+            stat.latency.observe(ms)
+        stack = self._stack()
+        if stack:
+            stack[-1]["sql"][qid] += 1
+        if ms >= self.slow_ms:
+            with self._lock:
+                self.slow_log.append({
+                    "time": datetime.now().isoformat(timespec="seconds"), "qid": qid,
+                    "sql": self._sql_text.get(qid, ""), "ms": ms, "params": params,
+                    "operation": stack[0]["name"] if stack else None,
+                })
+
+    def record_rows(self, qid, n):
+        if not n:
+            return
+        with self._lock:
+            stat = self._sql.get(qid)
+            if stat is not None:
+                stat.rows += n
+        stack = self._stack()
+        if stack:
+            stack[-1]["rows"] += n
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+            self._sql.clear()
+            self.slow_log.clear()
+            self.n_plus_one_log.clear()
+        self.streams.reset()
+
+    # --- Xuất số liệu ---
+    def snapshot(self):
+        with self._lock:
+            ops = {name: dict(calls=s.calls, errors=s.errors, rows=s.rows, latency=s.latency.to_dict())
+                   for name, s in self._ops.items()}
+            sql = {qid: dict(sql=self._sql_text.get(qid, ""), calls=s.calls, errors=s.errors, rows=s.rows,
+                             latency=s.latency.to_dict())
+                   for qid, s in self._sql.items()}
+            return {
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "slow_ms": self.slow_ms,
+                "operations": ops,
+                "queries": sql,
+                "slow_queries": list(self.slow_log),
+                "n_plus_one": list(self.n_plus_one_log),
+                "streams": self.streams.snapshot(),
+            }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent, default=str)
+
+    def top_operations(self, n=10, by="sum_ms"):
+        ops = self.snapshot()["operations"]
+        return sorted(ops.items(), key=lambda kv: kv[1]["latency"][by], reverse=True)[:n]
+
+    def to_prometheus(self, prefix="hotel"):
+        """Định dạng text exposition của Prometheus (độ trễ theo giây)"""
+        snap = self.snapshot()
+        lines = []
+
+        def esc(v):
+            return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+        def family(metric, label, data, help_text):
+            lines.append(f"# HELP {prefix}_{metric}_calls_total {help_text}: số lần gọi")
+            lines.append(f"# TYPE {prefix}_{metric}_calls_total counter")
+            for key, s in data.items():
+                lines.append(f'{prefix}_{metric}_calls_total{{{label}="{esc(key)}"}} {s["calls"]}')
+            lines.append(f"# TYPE {prefix}_{metric}_errors_total counter")
+            for key, s in data.items():
+                lines.append(f'{prefix}_{metric}_errors_total{{{label}="{esc(key)}"}} {s["errors"]}')
+            lines.append(f"# TYPE {prefix}_{metric}_rows_total counter")
+            for key, s in data.items():
+                lines.append(f'{prefix}_{metric}_rows_total{{{label}="{esc(key)}"}} {s["rows"]}')
+            lines.append(f"# HELP {prefix}_{metric}_duration_seconds {help_text}: độ trễ")
+            lines.append(f"# TYPE {prefix}_{metric}_duration_seconds histogram")
+            for key, s in data.items():
+                lat = s["latency"]
+                cumulative = 0
+                for bound, c in lat["buckets"].items():
+                    cumulative += c
+                    le = bound if bound == "+Inf" else f"{float(bound) / 1000:g}"
+                    lines.append(f'{prefix}_{metric}_duration_seconds_bucket{{{label}="{esc(key)}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_{metric}_duration_seconds_sum{{{label}="{esc(key)}"}} {lat["sum_ms"] / 1000:.6f}')
+                lines.append(f'{prefix}_{metric}_duration_seconds_count{{{label}="{esc(key)}"}} {lat["count"]}')
+
+        family("repository", "operation", snap["operations"], "Thao tác Repository")
+        family("sql", "qid", snap["queries"], "Câu lệnh SQL (qid = mã của câu đã chuẩn hóa)")
+
+        lines.append(f"# TYPE {prefix}_slow_queries_total counter")
+        lines.append(f"{prefix}_slow_queries_total {len(snap['slow_queries'])}")
+        for metric in ("rows", "bytes", "batches"):
+            lines.append(f"# TYPE {prefix}_stream_{metric}_total counter")
+            for name, s in snap["streams"].items():
+                lines.append(f'{prefix}_stream_{metric}_total{{stream="{esc(name)}"}} {s[metric]}')
+        lines.append(f"# TYPE {prefix}_stream_peak_batch_bytes gauge")
+        for name, s in snap["streams"].items():
+            lines.append(f'{prefix}_stream_peak_batch_bytes{{stream="{esc(name)}"}} {s["peak_batch_bytes"]}')
+        lines.append(f"# TYPE {prefix}_n_plus_one_total counter")
+        counts = Counter(e["operation"] for e in snap["n_plus_one"])
+        for op, c in counts.items():
+            lines.append(f'{prefix}_n_plus_one_total{{operation="{esc(op)}"}} {c}')
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedCursor:
+    """Bọc cursor DB-API: đo mọi execute/executemany và đếm số dòng fetch về"""
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._qid = None
+
+    @property
+    def stream_stats(self):
+        """streaming.iter_batches ghi số liệu luồng vào Metrics này"""
+        return self._metrics.streams
+
+    def _run(self, call, sql, params):
+        m = self._metrics
+        self._qid = qid = m.query_id(sql)
+        start = time.perf_counter()
+        error = False
+        try:
+            call()
+        except Exception:
+            error = True
+            raise
+        finally:
+            m.record_sql(qid, (time.perf_counter() - start) * 1000, error,
+                         len(params) if params is not None and hasattr(params, "__len__") else 0)
+        return self
+
+    def execute(self, sql, *params):
+        params = pack_params(params)
+        return self._run(lambda: execute(self._cursor, sql, params), sql, params)
+
+    def executemany(self, sql, seq):
+        return self._run(lambda: self._cursor.executemany(sql, seq), sql, seq)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._metrics.record_rows(self._qid, 1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._metrics.record_rows(self._qid, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._metrics.record_rows(self._qid, len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._metrics.record_rows(self._qid, 1)
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, metrics):
+        self._conn = conn
+        self._metrics = metrics
+
+    def cursor(self):
+        return InstrumentedCursor(self._conn.cursor(), self._metrics)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class InstrumentedPool:
+    """Bọc pool (ConnectionPool hoặc bất kỳ đối tượng có connection()): mọi cursor đều được đo"""
+    def __init__(self, pool, metrics):
+        self.pool = pool
+        self.metrics = metrics
+
+    @contextmanager
+    def connection(self):
+        with self.pool.connection() as conn:
+            yield InstrumentedConnection(conn, self.metrics) if self.metrics.enabled else conn
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+def instrument(repo, metrics, name=None):
+    """
+    Bọc mọi phương thức public của 1 Repository (trên chính instance) để đo thời gian, lỗi, số dòng.
+    Tên thao tác: '<Tên lớp>.<phương thức>'. Trả về chính repo.
+    Phương thức generator được đo đến khi duyệt xong (thao tác khác gọi giữa chừng tính lồng bên trong).
+    """
+    prefix = name or type(repo).__name__
+    for attr in dir(type(repo)):
+        if attr.startswith("_"):
+            continue
+        method = getattr(repo, attr)
+        if not callable(method) or isinstance(method, type):
+            continue
+
+        def wrap(func, op_name):
+            if inspect.isgeneratorfunction(func):
+                # Generator (đọc dạng luồng): đo toàn bộ quá trình duyệt, không chỉ lúc tạo generator
+                @functools.wraps(func)
+                def gen_wrapper(*args, **kwargs):
+                    if not metrics.enabled:
+                        return (yield from func(*args, **kwargs))
+                    with metrics.operation(op_name):
+                        return (yield from func(*args, **kwargs))
+                return gen_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not metrics.enabled:
+                    return func(*args, **kwargs)
+                with metrics.operation(op_name):
+                    return func(*args, **kwargs)
+            return wrapper
+
+        setattr(repo, attr, wrap(method, f"{prefix}.{attr}"))
+    return repo
+
+
+class StartupTimer:
+    """Mốc thời gian khởi động (ms tính từ t0): import, cửa sổ hiện lên, kết nối DB, nạp dữ liệu..."""
+    def __init__(self, t0=None):
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self.marks = []         # (tên, ms từ t0)
+        self.spans = []         # (tên, thời lượng ms)
+
+    def mark(self, name):
+        ms = (time.perf_counter() - self.t0) * 1000
+        self.marks.append((name, ms))
+        return ms
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, (time.perf_counter() - start) * 1000))
+
+    def add_span(self, name, ms):
+        self.spans.append((name, ms))
+
+    def get(self, name):
+        return next((ms for n, ms in self.marks if n == name), None)
+
+    def to_dict(self):
+        return {"marks_ms": dict(self.marks), "spans_ms": dict(self.spans)}
+
+    def report(self):
+        lines = ["[STARTUP] Mốc thời gian (tính từ lúc chạy):"]
+        lines += [f"  {name:<24} {ms:>9.1f} ms" for name, ms in self.marks]
+        if self.spans:
+            lines.append("[STARTUP] Chi tiết:")
+            lines += [f"  {name:<24} {ms:>9.1f} ms" for name, ms in self.spans]
+        return "\n".join(lines)
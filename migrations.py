@@ -0,0 +1,243 @@
+import sys
+import argparse
+from collections import namedtuple
+
+
+# Mỗi migration: phiên bản, mô tả, các câu lệnh nâng cấp (up) và hạ cấp (down).
+# Phiên bản 1 = bảng gốc + dữ liệu mẫu (DatabaseManager._init_tables / seed_data).
+# Câu lệnh up phải chạy lại được an toàn (kiểm tra tồn tại trước khi tạo).
+Migration = namedtuple("Migration", "version description up down")
+
+
+def _create_index(name, table, definition):
+    return f"""
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{name}' AND object_id = OBJECT_ID('{table}'))
+        CREATE NONCLUSTERED INDEX {name} ON {table} {definition}
+    """
+
+
+def _drop_index(name, table):
+    return f"DROP INDEX IF EXISTS {name} ON {table}"
+
+
+# Chỉ mục phủ (covering) cho các truy vấn nóng: cột lọc/nối làm khóa, cột SELECT đưa vào INCLUDE
+# -> Index Seek không cần Key Lookup về bảng gốc.
+COVERING_INDEXES = [
+    # get_conflict_ids / get_active_bookings / ARRIVALS_BATCH (check-in cả ngày):
+    # lọc TrangThaiDat + khoảng NgayDen, trả SoPhong, NgayDi, MaKH
+    ("IX_PhieuDatPhong_TrangThai_NgayDen", "PhieuDatPhong",
+     "(TrangThaiDat, NgayDen) INCLUDE (NgayDi, SoPhong, MaKH)"),
+    # check_in theo CCCD: KhachHang(CCCD) đã có UNIQUE -> tra tiếp phiếu theo khách
+    ("IX_PhieuDatPhong_MaKH", "PhieuDatPhong",
+     "(MaKH, TrangThaiDat, NgayDen) INCLUDE (SoPhong)"),
+    # add_usage / get_bill_raw_data: phiếu đang ở của 1 phòng
+    ("IX_PhieuDatPhong_SoPhong_TrangThai", "PhieuDatPhong",
+     "(SoPhong, TrangThaiDat) INCLUDE (MaKH)"),
+    # add_usage dò (MaPD, MaDV); hóa đơn lấy dịch vụ theo MaPD
+    ("IX_ChiTietSD_MaPD_MaDV", "ChiTietSD",
+     "(MaPD, MaDV) INCLUDE (SoLuong)"),
+    # get_bill_raw_data / ARRIVALS_BATCH (NOT EXISTS): hóa đơn theo phiếu
+    ("IX_HoaDon_MaPD", "HoaDon",
+     "(MaPD) INCLUDE (TrangThaiHD, NgayTao)"),
+    # get_open_folios_raw / night audit: mọi hóa đơn chưa thanh toán
+    ("IX_HoaDon_TrangThai", "HoaDon",
+     "(TrangThaiHD) INCLUDE (MaPD, NgayTao)"),
+    # Dashboard (query_rooms) và get_bill_raw_data lọc phòng theo trạng thái
+    ("IX_Phong_TrangThai", "Phong",
+     "(TrangThai) INCLUDE (MaLP, GhiChu)"),
+]
+
+# Read model "folio đang mở": mỗi lượt lưu trú chưa thanh toán 1 dòng, giữ sẵn tổng dịch vụ,
+# các dòng dịch vụ (JSON) và giá phòng/đêm -> xem hóa đơn / check-out chỉ đọc 1 dòng.
+# Được cập nhật tăng dần bởi check-in, add_usages, checkout; FOLIO_REBUILD dựng lại từ các bảng gốc.
+FOLIO_TABLE = """
+    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='FolioLuuTru' AND xtype='U')
+    CREATE TABLE FolioLuuTru (
+        MaPD INT PRIMARY KEY, MaHD INT NOT NULL, SoPhong INT NOT NULL,
+        TenKH NVARCHAR(100), TenLP NVARCHAR(50), NgayNhan DATETIME NOT NULL,
+        GiaPhong DECIMAL(18, 0) NOT NULL, TongDichVu DECIMAL(18, 0) NOT NULL DEFAULT 0,
+        ChiTietDV NVARCHAR(MAX) NOT NULL DEFAULT N'[]', CapNhat DATETIME DEFAULT GETDATE()
+    )
+"""
+
+# Danh sách dịch vụ của 1 phiếu (theo thứ tự gọi) dạng JSON [{"name", "qty", "price"}]
+FOLIO_ITEMS_JSON = """ISNULL((
+    SELECT dv.TenDV AS name, ct.SoLuong AS qty, dv.Gia AS price
+    FROM ChiTietSD ct JOIN DichVu dv ON ct.MaDV = dv.MaDV
+    WHERE ct.MaPD = {ma_pd} ORDER BY ct.MaSD FOR JSON PATH
+), N'[]')"""
+
+# Giá trị đúng của folio tính từ các bảng gốc (cùng điều kiện với get_bill_raw_data)
+FOLIO_SOURCE = f"""
+    SELECT pd.MaPD, hd.MaHD, p.SoPhong, kh.TenKH, lp.TenLP, hd.NgayTao AS NgayNhan, lp.GiaTheoNgay AS GiaPhong,
+           ISNULL(sv.TongDichVu, 0) AS TongDichVu, {FOLIO_ITEMS_JSON.format(ma_pd="pd.MaPD")} AS ChiTietDV
+    FROM HoaDon hd
+    JOIN PhieuDatPhong pd ON hd.MaPD = pd.MaPD
+    JOIN Phong p ON pd.SoPhong = p.SoPhong
+    JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+    JOIN KhachHang kh ON pd.MaKH = kh.MaKH
+    OUTER APPLY (
+        SELECT SUM(ct.SoLuong * dv.Gia) AS TongDichVu
+        FROM ChiTietSD ct JOIN DichVu dv ON ct.MaDV = dv.MaDV
+        WHERE ct.MaPD = pd.MaPD
+    ) sv
+    WHERE p.TrangThai = N'Đang ở' AND hd.TrangThaiHD = N'Chưa thanh toán'
+"""
+
+FOLIO_COLUMNS = ("MaPD", "MaHD", "SoPhong", "TenKH", "TenLP", "NgayNhan", "GiaPhong", "TongDichVu", "ChiTietDV")
+
+
+def is_sqlserver(cursor):
+    """Cursor pyodbc (SQL Server); kết nối khác (SQLite stand-in...) không có fast_executemany"""
+    return hasattr(cursor, "fast_executemany")
+
+
+def folio_source_rows(cursor):
+    """
+    Như FOLIO_SOURCE nhưng tính bằng Python (không cần OUTER APPLY / FOR JSON) - cho kết nối không phải
+    SQL Server. Trả về {MaPD: (các cột FOLIO_COLUMNS)}, ChiTietDV là list [{"name", "qty", "price"}].
+    """
+    cursor.execute("""
+        SELECT pd.MaPD, hd.MaHD, p.SoPhong, kh.TenKH, lp.TenLP, hd.NgayTao, lp.GiaTheoNgay
+        FROM HoaDon hd
+        JOIN PhieuDatPhong pd ON hd.MaPD = pd.MaPD
+        JOIN Phong p ON pd.SoPhong = p.SoPhong
+        JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+        JOIN KhachHang kh ON pd.MaKH = kh.MaKH
+        WHERE p.TrangThai = N'Đang ở' AND hd.TrangThaiHD = N'Chưa thanh toán'
+    """)
+    folios = cursor.fetchall()
+    cursor.execute("""
+        SELECT ct.MaPD, dv.TenDV, ct.SoLuong, dv.Gia
+        FROM ChiTietSD ct
+        JOIN DichVu dv ON ct.MaDV = dv.MaDV
+        JOIN HoaDon hd ON hd.MaPD = ct.MaPD
+        WHERE hd.TrangThaiHD = N'Chưa thanh toán'
+        ORDER BY ct.MaSD
+    """)
+    items = {}
+    for ma_pd, name, qty, price in cursor.fetchall():
+        items.setdefault(ma_pd, []).append({"name": name, "qty": qty, "price": price})
+
+    rows = {}
+    for ma_pd, ma_hd, room_id, ten_kh, ten_lp, check_in, price in folios:
+        lines = items.get(ma_pd, [])
+        rows[ma_pd] = (ma_pd, ma_hd, room_id, ten_kh, ten_lp, check_in, price,
+                       sum(i["qty"] * i["price"] for i in lines), lines)
+    return rows
+
+
+FOLIO_REBUILD = f"""
+    MERGE FolioLuuTru AS f
+    USING ({FOLIO_SOURCE}) AS src
+    ON f.MaPD = src.MaPD
+    WHEN MATCHED AND (f.MaHD <> src.MaHD OR f.SoPhong <> src.SoPhong OR f.NgayNhan <> src.NgayNhan
+                      OR f.GiaPhong <> src.GiaPhong OR f.TongDichVu <> src.TongDichVu
+                      OR f.ChiTietDV <> src.ChiTietDV OR ISNULL(f.TenKH, N'') <> ISNULL(src.TenKH, N''))
+        THEN UPDATE SET MaHD = src.MaHD, SoPhong = src.SoPhong, TenKH = src.TenKH, TenLP = src.TenLP,
+                        NgayNhan = src.NgayNhan, GiaPhong = src.GiaPhong, TongDichVu = src.TongDichVu,
+                        ChiTietDV = src.ChiTietDV, CapNhat = GETDATE()
+    WHEN NOT MATCHED BY TARGET
+        THEN INSERT (MaPD, MaHD, SoPhong, TenKH, TenLP, NgayNhan, GiaPhong, TongDichVu, ChiTietDV)
+             VALUES (src.MaPD, src.MaHD, src.SoPhong, src.TenKH, src.TenLP, src.NgayNhan, src.GiaPhong,
+                     src.TongDichVu, src.ChiTietDV)
+    WHEN NOT MATCHED BY SOURCE THEN DELETE
+    OUTPUT $action, ISNULL(INSERTED.MaPD, DELETED.MaPD), ISNULL(INSERTED.SoPhong, DELETED.SoPhong);
+"""
+
+MIGRATIONS = [
+    Migration(
+        2, "Chỉ mục phủ cho các truy vấn nóng",
+        up=[_create_index(name, table, definition) for name, table, definition in COVERING_INDEXES],
+        down=[_drop_index(name, table) for name, table, _ in reversed(COVERING_INDEXES)],
+    ),
+    Migration(
+        3, "Read model folio đang mở (FolioLuuTru)",
+        up=[FOLIO_TABLE,
+            _create_index("IX_FolioLuuTru_SoPhong", "FolioLuuTru", "(SoPhong)"),
+            FOLIO_REBUILD],
+        down=["DROP TABLE IF EXISTS FolioLuuTru"],
+    ),
+    Migration(
+        4, "Bảng tổng hợp doanh thu theo ngày (analytics.py)",
+        up=["""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='DoanhThuNgay' AND xtype='U')
+            CREATE TABLE DoanhThuNgay (
+                Ngay DATE NOT NULL, MaLP INT NOT NULL, SoPhong INT NOT NULL DEFAULT 0,
+                DemDaBan INT NOT NULL DEFAULT 0, TienPhong DECIMAL(18, 0) NOT NULL DEFAULT 0,
+                PhuThu DECIMAL(18, 0) NOT NULL DEFAULT 0, DoanhThuDV DECIMAL(18, 0) NOT NULL DEFAULT 0,
+                SoLuotTra INT NOT NULL DEFAULT 0, PRIMARY KEY (Ngay, MaLP)
+            )
+        """, """
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='DoanhThuDichVuNgay' AND xtype='U')
+            CREATE TABLE DoanhThuDichVuNgay (
+                Ngay DATE NOT NULL, MaDV INT NOT NULL, MaLP INT NOT NULL,
+                SoLuong INT NOT NULL DEFAULT 0, DoanhThu DECIMAL(18, 0) NOT NULL DEFAULT 0,
+                PRIMARY KEY (Ngay, MaDV, MaLP)
+            )
+        """],
+        down=["DROP TABLE IF EXISTS DoanhThuDichVuNgay", "DROP TABLE IF EXISTS DoanhThuNgay"],
+    ),
+    Migration(
+        5, "Chỉ mục Phong(MaLP): số phòng theo loại khi ghi bảng tổng hợp lúc checkout",
+        up=[_create_index("IX_Phong_MaLP", "Phong", "(MaLP)")],
+        down=[_drop_index("IX_Phong_MaLP", "Phong")],
+    ),
+]
+
+LATEST_VERSION = max([1] + [m.version for m in MIGRATIONS])
+
+
+def apply_migrations(conn, current, target):
+    """
+    Chạy các migration từ phiên bản current đến target (nâng hoặc hạ cấp, không gồm phiên bản 1).
+    Mỗi migration commit riêng kèm dòng SchemaVersion tương ứng. Trả về danh sách phiên bản đã chạy.
+    """
+    cursor = conn.cursor()
+    done = []
+    if target >= current:
+        for m in sorted(MIGRATIONS, key=lambda m: m.version):
+            if current < m.version <= target:
+                for stmt in m.up:
+                    cursor.execute(stmt)
+                cursor.execute("INSERT INTO SchemaVersion (Version) VALUES (?)", (m.version,))
+                conn.commit()
+                done.append(m.version)
+    else:
+        for m in sorted(MIGRATIONS, key=lambda m: m.version, reverse=True):
+            if target < m.version <= current:
+                for stmt in m.down:
+                    cursor.execute(stmt)
+                cursor.execute("DELETE FROM SchemaVersion WHERE Version >= ?", (m.version,))
+                conn.commit()
+                done.append(-m.version)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quản lý phiên bản schema")
+    parser.add_argument("command", choices=["status", "upgrade", "downgrade"])
+    parser.add_argument("--to", type=int, help="Phiên bản đích (mặc định: mới nhất khi upgrade)")
+    args = parser.parse_args(argv)
+
+    from database import DatabaseManager
+    db = DatabaseManager(auto_migrate=False)
+    with db.get_pool().connection() as conn:
+        current = db._schema_version(conn)
+        print(f"Phiên bản hiện tại: {current} / mới nhất: {LATEST_VERSION}")
+        for m in MIGRATIONS:
+            mark = "x" if m.version <= current else " "
+            print(f"  [{mark}] v{m.version}: {m.description}")
+        if args.command == "status":
+            return
+
+        target = args.to if args.to is not None else (LATEST_VERSION if args.command == "upgrade" else current - 1)
+        if args.command == "downgrade" and target < 1:
+            print("Không hạ cấp dưới phiên bản 1 (bảng gốc).")
+            sys.exit(1)
+        db.migrate(conn, target)
+        print(f"Đã chuyển sang phiên bản {db._schema_version(conn)}")
+
+
+if __name__ == "__main__":
+    main()
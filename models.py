@@ -1,5 +1,6 @@
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from array import array
+from datetime import datetime, timedelta
 
 @dataclass
 class Room:
@@ -29,4 +30,246 @@ class BillDetail:
     room_total: float
     service_items: list 
     service_total: float
-    grand_total: float
\ No newline at end of file
+    grand_total: float
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_micros(value):
+    """datetime -> số micro giây kể từ 1970-01-01 (không xét múi giờ)"""
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+@dataclass
+class RoomColumns:
+    """
+    Danh sách phòng dạng cột (array / memoryview, vd từ snapshot.py) - không tạo 1 đối tượng Room mỗi dòng.
+    statuses: tên trạng thái -> mã trong status_code; types: MaLP -> (TenLP, giá/ngày, sức chứa).
+    """
+    id: object
+    status_code: object
+    type_id: object
+    statuses: dict
+    types: dict
+
+    def __len__(self):
+        return len(self.id)
+
+
+class RoomTable(RoomColumns):
+    """
+    Danh sách phòng dạng struct-of-arrays thay cho 1 đối tượng Room mỗi dòng:
+    - Cột: id (q), status_code (B), type_id (i), price (d) + từ điển trạng thái / loại phòng dùng chung
+      (tên loại, sức chứa chỉ lưu 1 lần mỗi loại); ghi chú chỉ lưu cho phòng có ghi chú.
+    - Duyệt / get() trả về RoomRow: view nhẹ có cùng thuộc tính với Room, đọc thẳng từ các cột.
+    Là RoomColumns nên HotelAlgorithms.analyze_availability duyệt thẳng các cột.
+    """
+    def __init__(self, rows=()):
+        super().__init__(id=array('q'), status_code=array('B'), type_id=array('i'), statuses={}, types={})
+        self.price = array('d')
+        self.status_names = []      # mã -> tên trạng thái
+        self.notes = {}             # số phòng -> ghi chú (khác rỗng)
+        self._pos = {}              # số phòng -> vị trí trong các cột
+        for r in rows:
+            self.append(*r)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Từ các dòng (SoPhong, TrangThai, MaLP, TenLP, GiaTheoNgay, SucChua, GhiChu) của RoomRepository"""
+        return cls(rows)
+
+    def _status_code(self, status):
+        code = self.statuses.get(status)
+        if code is None:
+            code = self.statuses[status] = len(self.status_names)
+            self.status_names.append(status)
+        return code
+
+    def append(self, room_id, status, type_id, type_name, price, capacity, note=""):
+        """Thêm 1 phòng (hoặc ghi đè nếu số phòng đã có)"""
+        price = float(price)
+        self.types[type_id] = (type_name, price, capacity)
+        i = self._pos.get(room_id)
+        if i is None:
+            self._pos[room_id] = len(self.id)
+            self.id.append(room_id)
+            self.status_code.append(self._status_code(status))
+            self.type_id.append(type_id)
+            self.price.append(price)
+        else:
+            self.status_code[i] = self._status_code(status)
+            self.type_id[i] = type_id
+            self.price[i] = price
+        self.set_note(room_id, note)
+
+    def put(self, room):
+        """Thêm / ghi đè từ 1 đối tượng có thuộc tính giống Room (Room, RoomRow của bảng khác)"""
+        self.append(room.id, room.status, room.type_id, room.type_name, room.price, room.capacity, room.note)
+
+    def remove(self, room_id):
+        """Xóa bằng cách đổi chỗ với dòng cuối - O(1)"""
+        i = self._pos.pop(room_id)
+        last = len(self.id) - 1
+        if i != last:
+            for col in (self.id, self.status_code, self.type_id, self.price):
+                col[i] = col[last]
+            self._pos[self.id[i]] = i
+        for col in (self.id, self.status_code, self.type_id, self.price):
+            del col[last]
+        self.notes.pop(room_id, None)
+
+    def set_status(self, room_id, status):
+        self.status_code[self._pos[room_id]] = self._status_code(status)
+
+    def set_note(self, room_id, note):
+        if note:
+            self.notes[room_id] = note
+        else:
+            self.notes.pop(room_id, None)
+
+    def get(self, room_id):
+        return RoomRow(self, room_id) if room_id in self._pos else None
+
+    def take(self, room_ids):
+        """Bảng mới gồm các phòng room_ids theo đúng thứ tự đó (sao chép cột, giữ nguyên các mã)"""
+        t = RoomTable()
+        t.statuses, t.status_names, t.types = dict(self.statuses), list(self.status_names), dict(self.types)
+        pos = [self._pos[rid] for rid in room_ids]
+        t.id.extend(self.id[i] for i in pos)
+        t.status_code.extend(self.status_code[i] for i in pos)
+        t.type_id.extend(self.type_id[i] for i in pos)
+        t.price.extend(self.price[i] for i in pos)
+        t._pos = {rid: i for i, rid in enumerate(t.id)}
+        t.notes = {rid: self.notes[rid] for rid in room_ids if rid in self.notes}
+        return t
+
+    def ids_with_status(self, status):
+        code = self.statuses.get(status)
+        return [rid for rid, c in zip(self.id, self.status_code) if c == code]
+
+    def __contains__(self, room_id):
+        return room_id in self._pos
+
+    def __iter__(self):
+        return (RoomRow(self, rid) for rid in self.id)
+
+    def __getitem__(self, i):
+        return RoomRow(self, self.id[i])
+
+    def __repr__(self):
+        return f"RoomTable({len(self)} phòng, {len(self.types)} loại)"
+
+
+class RoomRow:
+    """View 1 phòng của RoomTable (cùng thuộc tính với Room). Giữ số phòng nên vẫn đúng khi bảng đổi chỗ dòng."""
+    __slots__ = ("_table", "id")
+
+    def __init__(self, table, room_id):
+        self._table = table
+        self.id = room_id
+
+    def _i(self):
+        return self._table._pos[self.id]
+
+    @property
+    def status(self):
+        t = self._table
+        return t.status_names[t.status_code[self._i()]]
+
+    @status.setter
+    def status(self, value):
+        self._table.set_status(self.id, value)
+
+    @property
+    def type_id(self):
+        return self._table.type_id[self._i()]
+
+    @property
+    def type_name(self):
+        return self._table.types[self.type_id][0]
+
+    @property
+    def capacity(self):
+        return self._table.types[self.type_id][2]
+
+    @property
+    def price(self):
+        return self._table.price[self._i()]
+
+    @property
+    def note(self):
+        return self._table.notes.get(self.id, "")
+
+    @note.setter
+    def note(self, value):
+        self._table.set_note(self.id, value)
+
+    def __repr__(self):
+        return (f"RoomRow(id={self.id}, status={self.status!r}, type_id={self.type_id}, "
+                f"type_name={self.type_name!r}, price={self.price}, capacity={self.capacity}, note={self.note!r})")
+
+
+@dataclass
+class FolioColumns:
+    """
+    Đầu vào dạng cột cho HotelAlgorithms.calculate_bills (các hóa đơn mở + dòng dịch vụ của chúng).
+    check_in tính bằng micro giây (to_micros); customer_name có thể None khi nguồn không có tên khách.
+    """
+    ma_hd: object
+    ma_pd: object
+    room_id: object
+    check_in: object
+    room_price: object
+    svc_ma_pd: object
+    svc_name: object
+    svc_qty: object
+    svc_price: object
+    customer_name: object = None
+
+    def __len__(self):
+        return len(self.ma_hd)
+
+
+@dataclass
+class FolioBatch:
+    """Kết quả tính tiền hàng loạt dạng cột (mỗi chỉ số i = 1 lượt lưu trú)"""
+    audit_time: datetime
+    ma_hd: array = field(default_factory=lambda: array('q'))
+    ma_pd: array = field(default_factory=lambda: array('q'))
+    room_id: array = field(default_factory=lambda: array('q'))
+    days_used: array = field(default_factory=lambda: array('q'))
+    room_price: array = field(default_factory=lambda: array('d'))
+    room_total: array = field(default_factory=lambda: array('d'))
+    service_total: array = field(default_factory=lambda: array('d'))
+    grand_total: array = field(default_factory=lambda: array('d'))
+    customer_name: list = field(default_factory=list)
+    check_in: list = field(default_factory=list)
+    service_items: dict = field(default_factory=dict)   # ma_pd -> [{"name", "qty", "price"}]
+
+    def __len__(self):
+        return len(self.ma_hd)
+
+    def totals(self):
+        return {
+            "stays": len(self),
+            "room_total": sum(self.room_total),
+            "service_total": sum(self.service_total),
+            "grand_total": sum(self.grand_total)
+        }
+
+    def to_bill_details(self):
+        return [
+            BillDetail(
+                ma_hd=self.ma_hd[i], ma_pd=self.ma_pd[i],
+                customer_name=self.customer_name[i],
+                check_in=self.check_in[i], check_out=self.audit_time, days_used=self.days_used[i],
+                room_price=self.room_price[i], room_total=self.room_total[i],
+                service_items=self.service_items.get(self.ma_pd[i], []),
+                service_total=self.service_total[i], grand_total=self.grand_total[i]
+            )
+            for i in range(len(self))
+        ]
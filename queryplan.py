@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import argparse
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from repositories import RoomRepository, ServiceRepository, OperationRepository
+from streaming import execute, pack_params
+
+
+SHOWPLAN_NS = {"sp": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+# Toán tử cho thấy truy vấn chưa được chỉ mục phủ
+WARN_OPS = {"Table Scan", "Clustered Index Scan", "Index Scan", "Key Lookup", "RID Lookup"}
+
+
+class CapturingCursor:
+    """Chạy câu lệnh thật, ghi lại (SQL, tham số, thời gian execute + fetch) cho thao tác hiện tại"""
+    def __init__(self, cursor, session):
+        self._cursor = cursor
+        self._session = session
+        self._entry = None
+
+    def execute(self, sql, *params):
+        params = pack_params(params)
+        start = time.perf_counter()
+        execute(self._cursor, sql, params)
+        self._entry = {"operation": self._session.operation, "sql": sql, "params": list(params or []),
+                       "execute_ms": (time.perf_counter() - start) * 1000, "fetch_ms": 0.0, "rows": 0}
+        self._session.statements.append(self._entry)
+        return self
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        result = getattr(self._cursor, method)(*args)
+        self._entry["fetch_ms"] += (time.perf_counter() - start) * 1000
+        if isinstance(result, list):
+            self._entry["rows"] += len(result)
+        elif result is not None:
+            self._entry["rows"] += 1
+        return result
+
+    def fetchone(self):
+        return self._fetch("fetchone")
+
+    def fetchall(self):
+        return self._fetch("fetchall")
+
+    def fetchmany(self, *args):
+        return self._fetch("fetchmany", *args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CapturingSession:
+    """
+    Dùng 1 kết nối duy nhất trong 1 giao dịch: commit() của Repository bị bỏ qua và
+    mọi thay đổi (check-in, thêm dịch vụ...) được rollback khi kết thúc -> chạy được trên DB thật.
+    Đối tượng này có connection() nên truyền thẳng vào các Repository như 1 pool.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self._conn = pool.acquire()
+        self.statements = []
+        self.operation = None
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return CapturingCursor(self._conn.cursor(), self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.rollback()
+        self.pool.release(self._conn)
+
+
+def capture_plan(conn, sql, params):
+    """Kế hoạch thực thi ước lượng (SHOWPLAN_XML): câu lệnh KHÔNG được chạy, chỉ trả về XML"""
+    cursor = conn.cursor()
+    cursor.execute("SET SHOWPLAN_XML ON")
+    plans = []
+    try:
+        execute(cursor, sql, params or None)
+        while True:
+            try:
+                plans.extend(row[0] for row in cursor.fetchall())
+            except Exception:
+                pass
+            if not cursor.nextset():
+                break
+    finally:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+    return plans
+
+
+def summarize_plan(xml_text):
+    """Các toán tử vật lý + chỉ mục được dùng, tổng chi phí ước lượng"""
+    root = ET.fromstring(xml_text)
+    ops, indexes, cost = [], set(), 0.0
+    for stmt in root.iterfind(".//sp:StmtSimple", SHOWPLAN_NS):
+        cost += float(stmt.get("StatementSubTreeCost", 0) or 0)
+    for rel in root.iterfind(".//sp:RelOp", SHOWPLAN_NS):
+        physical = rel.get("PhysicalOp")
+        obj = rel.find("./*/sp:Object", SHOWPLAN_NS)
+        target = ""
+        if obj is not None:
+            target = f"{obj.get('Table', '')}.{obj.get('Index', '')}".strip(".")
+            if obj.get("Index"):
+                indexes.add(obj.get("Index").strip("[]"))
+        ops.append(f"{physical} {target}".strip())
+    warnings = sorted({op for op in ops if op.split(" [")[0] in WARN_OPS})
+    return {"cost": cost, "operators": ops, "indexes": sorted(indexes), "warnings": warnings}
+
+
+def sample_inputs(pool):
+    """Lấy tham số thực tế cho từng thao tác: 1 phòng đang ở, 1 CCCD có phiếu, ngày hôm nay"""
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT TOP 1 SoPhong FROM Phong WHERE TrangThai = N'Đang ở'")
+        row = cursor.fetchone()
+        room = row[0] if row else 101
+        cursor.execute("""
+            SELECT TOP 1 kh.CCCD FROM PhieuDatPhong pd JOIN KhachHang kh ON pd.MaKH = kh.MaKH
+            WHERE pd.TrangThaiDat = N'Đã xác nhận' ORDER BY pd.NgayDen
+        """)
+        row = cursor.fetchone()
+        cccd = row[0] if row else "000000000000"
+    return {"room": room, "cccd": cccd}
+
+
+def run(pool, save_dir=None):
+    inputs = sample_inputs(pool)
+    today = date.today()
+    session = CapturingSession(pool)
+    room_repo = RoomRepository(session)
+    op_repo = OperationRepository(session)
+    svc_repo = ServiceRepository(session)
+
+    scenarios = [
+        ("RoomRepository.get_all", room_repo.get_all),
+        ("RoomRepository.query_rooms", lambda: room_repo.query_rooms(status='Trống', order_by="price")),
+        ("RoomRepository.get_conflict_ids", lambda: room_repo.get_conflict_ids(today, today + timedelta(days=3))),
+        ("RoomRepository.get_active_bookings", room_repo.get_active_bookings),
+        ("OperationRepository.get_bill_raw_data", lambda: op_repo.get_bill_raw_data(inputs["room"])),
+        ("OperationRepository.get_folio", lambda: op_repo.get_folio(inputs["room"])),
+        ("OperationRepository.get_open_folios_raw", op_repo.get_open_folios_raw),
+        ("OperationRepository.reconcile_folios", lambda: op_repo.reconcile_folios(repair=False)),
+        ("OperationRepository.check_in", lambda: op_repo.check_in(inputs["cccd"])),
+        ("OperationRepository.check_in_arrivals", lambda: op_repo.check_in_arrivals()),
+        ("ServiceRepository.add_usage", lambda: svc_repo.add_usage(inputs["room"], 1, 1)),
+        ("ServiceRepository.add_usages", lambda: svc_repo.add_usages([(inputs["room"], 1, 1), (inputs["room"], 2, 2)])),
+    ]
+    try:
+        for name, func in scenarios:
+            session.operation = name
+            func()
+    finally:
+        session.close()
+
+    report = []
+    with pool.connection() as conn:
+        for i, st in enumerate(session.statements):
+            entry = {k: st[k] for k in ("operation", "execute_ms", "fetch_ms", "rows")}
+            entry["sql"] = " ".join(st["sql"].split())
+            try:
+                plans = capture_plan(conn, st["sql"], st["params"])
+                summaries = [summarize_plan(p) for p in plans]
+                entry["cost"] = sum(s["cost"] for s in summaries)
+                entry["indexes"] = sorted({ix for s in summaries for ix in s["indexes"]})
+                entry["warnings"] = sorted({w for s in summaries for w in s["warnings"]})
+                entry["operators"] = [op for s in summaries for op in s["operators"]]
+                if save_dir:
+                    os.makedirs(save_dir, exist_ok=True)
+                    for j, p in enumerate(plans):
+                        path = os.path.join(save_dir, f"{i:02d}_{st['operation']}_{j}.sqlplan")
+                        with open(path, "w", encoding="utf-8") as f:
+                            f.write(p)
+            except Exception as e:
+                conn.rollback()
+                entry["error"] = str(e)
+            report.append(entry)
+    return report
+
+
+def print_report(report):
+    print(f"{'Thao tác':<40} {'Exec (ms)':>10} {'Fetch (ms)':>10} {'Dòng':>8} {'Cost':>9}  Chỉ mục / Cảnh báo")
+    print("-" * 130)
+    for e in report:
+        if "error" in e:
+            detail = f"LỖI: {e['error'][:60]}"
+        else:
+            detail = ", ".join(e["indexes"]) or "-"
+            if e["warnings"]:
+                detail += "  !! " + "; ".join(e["warnings"])
+        print(f"{e['operation']:<40} {e['execute_ms']:>10.2f} {e['fetch_ms']:>10.2f} {e['rows']:>8} "
+              f"{e.get('cost', 0):>9.4f}  {detail}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Chạy từng truy vấn của Repository (rollback), đo thời gian và lấy kế hoạch thực thi")
+    parser.add_argument("--out", default="query_plans.json", help="File JSON kết quả")
+    parser.add_argument("--save-plans", help="Thư mục lưu file .sqlplan (mở bằng SSMS)")
+    args = parser.parse_args(argv)
+
+    from database import DatabaseManager
+    db = DatabaseManager()
+    print(f"Schema phiên bản {db.schema_version}")
+    report = run(db.get_pool(), args.save_plans)
+    print_report(report)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"schema_version": db.schema_version, "statements": report}, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã ghi {args.out}")
+
+
+if __name__ == "__main__":
+    main()
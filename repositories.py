@@ -1,181 +1,455 @@
-from models import Room, Service
+import json
+import time
+from datetime import datetime
+
+from models import RoomTable, Service
+from migrations import FOLIO_COLUMNS, FOLIO_ITEMS_JSON, FOLIO_SOURCE, FOLIO_REBUILD, folio_source_rows, is_sqlserver
+from analytics import RevenueRollup
+from streaming import iter_rows, stream_query
 
 class RoomRepository:
-    def __init__(self, cursor):
-        self.cursor = cursor
+    """Mỗi phương thức mượn 1 kết nối riêng từ pool -> dùng được từ nhiều luồng"""
+    def __init__(self, pool):
+        self.pool = pool
 
     def get_all(self):
+        """Toàn bộ phòng dạng RoomTable (cột + từ điển loại/trạng thái, không tạo 1 Room mỗi dòng)"""
         query = """
             SELECT p.SoPhong, p.TrangThai, p.MaLP, lp.TenLP, lp.GiaTheoNgay, lp.SucChua, p.GhiChu
             FROM Phong p JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
         """
-        self.cursor.execute(query)
-        results = []
-        for r in self.cursor.fetchall():
-            note_val = r[6] if r[6] is not None else ""
-            
-            room_obj = Room(r[0], r[1], r[2], r[3], float(r[4]), r[5], note_val)
-            results.append(room_obj)
-        return results
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            # Nạp thẳng từng lô vào các cột, không giữ danh sách dòng thô của cả bảng
+            return RoomTable.from_rows(iter_rows(cursor, name="RoomRepository.get_all"))
+
+    # Thứ tự sắp xếp -> cột SQL (khớp với RoomCatalog.ORDERS, luôn kèm SoPhong để khóa duy nhất)
+    SORT_COLUMNS = {
+        "id": None,
+        "price": "lp.GiaTheoNgay",
+        "capacity": "lp.SucChua",
+    }
+
+    @staticmethod
+    def _like_pattern(text):
+        """Chuỗi con cho LIKE: thoát các ký tự đại diện của T-SQL"""
+        for ch in "[%_":
+            text = text.replace(ch, f"[{ch}]")
+        return f"%{text}%"
+
+    def query_rooms(self, type_name=None, status=None, text=None, order_by="id", reverse=False,
+                    after=None, limit=200):
+        """
+        Lấy 1 trang phòng đã lọc + sắp xếp ngay trên SQL Server (Keyset Pagination).
+        - after: con trỏ của trang trước (khóa sắp xếp của dòng cuối, vd (giá, số phòng)),
+          None = trang đầu. Không dùng OFFSET nên trang sau không phải đọc lại các trang trước.
+        - Trả về (rooms: RoomTable, next_cursor); next_cursor = None khi đã hết dữ liệu.
+        Con trỏ có cùng dạng với khóa của RoomCatalog.ORDERS -> dùng lẫn được với RoomCatalog.page.
+        """
+        if order_by not in self.SORT_COLUMNS:
+            raise ValueError(f"Không hỗ trợ sắp xếp theo '{order_by}'.")
+        column = self.SORT_COLUMNS[order_by]
+        direction, cmp = ("DESC", "<") if reverse else ("ASC", ">")
+
+        where, params = [], []
+        if type_name is not None:
+            where.append("lp.TenLP = ?")
+            params.append(type_name)
+        if status is not None:
+            where.append("p.TrangThai = ?")
+            params.append(status)
+        if text:
+            where.append("CAST(p.SoPhong AS NVARCHAR(12)) LIKE ?")
+            params.append(self._like_pattern(text))
+        if after is not None:
+            if column is None:
+                where.append(f"p.SoPhong {cmp} ?")
+                params.append(after[-1])
+            else:
+                where.append(f"({column} {cmp} ? OR ({column} = ? AND p.SoPhong {cmp} ?))")
+                params.extend((after[0], after[0], after[-1]))
+
+        order = f"p.SoPhong {direction}" if column is None else f"{column} {direction}, p.SoPhong {direction}"
+        query = f"""
+            SELECT TOP (?) p.SoPhong, p.TrangThai, p.MaLP, lp.TenLP, lp.GiaTheoNgay, lp.SucChua, p.GhiChu
+            FROM Phong p JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY {order}
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            # Lấy dư 1 dòng để biết còn trang sau hay không
+            cursor.execute(query, [limit + 1] + params)
+            rows = cursor.fetchall()
+
+        rooms = RoomTable.from_rows(rows[:limit])
+        next_cursor = None
+        if len(rows) > limit and rooms:
+            last = rooms[-1]
+            next_cursor = (last.id,) if column is None else \
+                ((last.price if order_by == "price" else last.capacity), last.id)
+        return rooms, next_cursor
+
+    ID_CHUNK = 1000     # SQL Server: tối đa 2100 tham số / câu lệnh
+
+    def get_by_ids(self, room_ids):
+        """Các phòng theo danh sách số phòng (RoomTable) - dùng để làm mới vài phòng trong RoomCatalog"""
+        room_ids = list(dict.fromkeys(room_ids))
+        rows = []
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(room_ids), self.ID_CHUNK):
+                chunk = room_ids[i:i + self.ID_CHUNK]
+                cursor.execute(f"""
+                    SELECT p.SoPhong, p.TrangThai, p.MaLP, lp.TenLP, lp.GiaTheoNgay, lp.SucChua, p.GhiChu
+                    FROM Phong p JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+                    WHERE p.SoPhong IN ({', '.join(['?'] * len(chunk))})
+                """, chunk)
+                rows.extend(cursor.fetchall())
+        return RoomTable.from_rows(rows)
 
     def get_conflict_ids(self, s_date, e_date):
         query = """
-            SELECT SoPhong FROM PhieuDatPhong 
+            SELECT SoPhong FROM PhieuDatPhong
             WHERE TrangThaiDat IN (N'Đã cọc', N'Đã xác nhận', N'Đang ở')
             AND (NgayDen < ? AND NgayDi > ?)
         """
-        self.cursor.execute(query, (e_date, s_date))
-        return [r[0] for r in self.cursor.fetchall()]
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (e_date, s_date))
+            return [r[0] for r in iter_rows(cursor, name="RoomRepository.get_conflict_ids")]
+
+    def iter_active_bookings(self, arraysize=None):
+        """
+        Generator (MaPD, SoPhong, NgayDen, NgayDi) của các phiếu còn chiếm phòng, đọc theo lô fetchmany.
+        Giữ 1 kết nối của pool đến khi duyệt xong -> nên tiêu thụ liền 1 mạch (vd AvailabilityIndex.load).
+        """
+        query = """
+            SELECT MaPD, SoPhong, NgayDen, NgayDi FROM PhieuDatPhong
+            WHERE TrangThaiDat IN (N'Đã cọc', N'Đã xác nhận', N'Đang ở')
+        """
+        for r in stream_query(self.pool, query, arraysize=arraysize, name="RoomRepository.iter_active_bookings"):
+            yield (r[0], r[1], r[2], r[3])
+
+    def get_active_bookings(self):
+        """Các phiếu còn chiếm phòng - dùng để nạp AvailabilityIndex"""
+        return list(self.iter_active_bookings())
 
     def update_status(self, room_id, status):
-        # Check current status first
-        self.cursor.execute("SELECT TrangThai FROM Phong WHERE SoPhong = ?", (room_id,))
-        row = self.cursor.fetchone()
-        if not row: return False, "Phòng không tồn tại."
-        if row[0] == 'Đang ở' and status == 'Trống':
-            return False, "CẢNH BÁO: Phòng đang có khách. Phải Checkout trước."
-        
-        self.cursor.execute("UPDATE Phong SET TrangThai = ? WHERE SoPhong = ?", (status, room_id))
-        self.cursor.commit()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            # Check current status first
+            cursor.execute("SELECT TrangThai FROM Phong WHERE SoPhong = ?", (room_id,))
+            row = cursor.fetchone()
+            if not row: return False, "Phòng không tồn tại."
+            if row[0] == 'Đang ở' and status == 'Trống':
+                return False, "CẢNH BÁO: Phòng đang có khách. Phải Checkout trước."
+
+            cursor.execute("UPDATE Phong SET TrangThai = ? WHERE SoPhong = ?", (status, room_id))
+            conn.commit()
         return True, f"Cập nhật {room_id} -> {status}"
-    
+
     def update_note(self, room_id, note):
         try:
-            self.cursor.execute("UPDATE Phong SET GhiChu = ? WHERE SoPhong = ?", (note, room_id))
-            self.cursor.commit()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE Phong SET GhiChu = ? WHERE SoPhong = ?", (note, room_id))
+                conn.commit()
             return True, "Đã lưu ghi chú thành công."
         except Exception as e:
             return False, f"Lỗi lưu ghi chú: {e}"
 
 class ServiceRepository:
-    def __init__(self, cursor):
-        self.cursor = cursor
+    def __init__(self, pool):
+        self.pool = pool
 
     def get_all(self):
-        self.cursor.execute("SELECT * FROM DichVu")
-        return [Service(r[0], r[1], float(r[2])) for r in self.cursor.fetchall()]
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM DichVu")
+            return [Service(r[0], r[1], float(r[2])) for r in cursor.fetchall()]
+
+    # 1 batch = 1 round trip: gắn MaPD đang ở cho từng dòng, báo phòng chưa check-in, MERGE cộng dồn số lượng,
+    # cộng tiền vào folio đang mở của các phiếu liên quan
+    USAGE_BATCH = """
+        SET NOCOUNT ON;
+        DECLARE @src TABLE (SoPhong INT, MaDV INT, SoLuong INT, MaPD INT NULL);
+
+        INSERT INTO @src (SoPhong, MaDV, SoLuong, MaPD)
+        SELECT v.SoPhong, v.MaDV, v.SoLuong, pd.MaPD
+        FROM (VALUES {values}) AS v(SoPhong, MaDV, SoLuong)
+        OUTER APPLY (
+            SELECT TOP 1 MaPD FROM PhieuDatPhong
+            WHERE SoPhong = v.SoPhong AND TrangThaiDat = N'Đang ở'
+            ORDER BY MaPD DESC
+        ) pd;
+
+        SELECT DISTINCT SoPhong FROM @src WHERE MaPD IS NULL;
+
+        MERGE ChiTietSD WITH (HOLDLOCK) AS ct
+        USING (SELECT MaPD, MaDV, SUM(SoLuong) AS SoLuong FROM @src WHERE MaPD IS NOT NULL GROUP BY MaPD, MaDV) AS src
+        ON ct.MaPD = src.MaPD AND ct.MaDV = src.MaDV
+        WHEN MATCHED THEN UPDATE SET SoLuong = ct.SoLuong + src.SoLuong
+        WHEN NOT MATCHED THEN INSERT (MaPD, MaDV, SoLuong) VALUES (src.MaPD, src.MaDV, src.SoLuong)
+        OUTPUT $action, INSERTED.MaPD, INSERTED.MaDV, INSERTED.SoLuong;
+
+        UPDATE f SET TongDichVu = f.TongDichVu + d.Tien, ChiTietDV = {items_json}, CapNhat = GETDATE()
+        FROM FolioLuuTru f
+        JOIN (
+            SELECT s.MaPD, SUM(s.SoLuong * dv.Gia) AS Tien
+            FROM @src s JOIN DichVu dv ON s.MaDV = dv.MaDV
+            WHERE s.MaPD IS NOT NULL GROUP BY s.MaPD
+        ) d ON f.MaPD = d.MaPD;
+    """
+    # 3 tham số / dòng, tối đa 2100 tham số và 1000 dòng VALUES / câu lệnh
+    USAGE_CHUNK = 600
 
     def add_usage(self, room_id, service_id, qty):
-        try:
-            self.cursor.execute("SELECT MaPD FROM PhieuDatPhong WHERE SoPhong = ? AND TrangThaiDat = N'Đang ở'", (room_id,))
-            row = self.cursor.fetchone()
-            if not row: return False, "Phòng chưa có khách check-in."
-            ma_pd = row[0]
-            
-            self.cursor.execute("SELECT MaSD, SoLuong FROM ChiTietSD WHERE MaPD = ? AND MaDV = ?", (ma_pd, service_id))
-            existing_item = self.cursor.fetchone()
-            
-            if existing_item:
-                new_qty = existing_item[1] + qty
-                self.cursor.execute("UPDATE ChiTietSD SET SoLuong = ? WHERE MaSD = ?", (new_qty, existing_item[0]))
-                action = "Cập nhật"
-            else:
-                self.cursor.execute("INSERT INTO ChiTietSD (MaPD, MaDV, SoLuong) VALUES (?, ?, ?)", (ma_pd, service_id, qty))
-                action = "Thêm mới"
-                
-            self.cursor.commit()
-            return True, f"{action} dịch vụ thành công."
-        except Exception as e:
-            return False, str(e)
+        ok, res = self.add_usages([(room_id, service_id, qty)])
+        if not ok:
+            return False, res
+        action = "Cập nhật" if res["updated"] else "Thêm mới"
+        return True, f"{action} dịch vụ thành công."
+
+    def add_usages(self, lines, atomic=True):
+        """
+        Gọi dịch vụ theo lô: lines = [(SoPhong, MaDV, SoLuong), ...] (combo, dữ liệu từ máy POS...).
+        Các dòng trùng (phòng, dịch vụ) được cộng gộp; mỗi 600 dòng 1 round trip, commit 1 lần.
+        atomic=True: có phòng chưa check-in -> không ghi gì; False: bỏ qua các dòng đó, trả trong "missing".
+        Trả về (True, {"inserted", "updated", "lines", "missing", "elapsed_ms"}).
+        """
+        start = time.perf_counter()
+        merged = {}
+        for room_id, service_id, qty in lines:
+            if int(qty) <= 0:
+                return False, f"Số lượng không hợp lệ: phòng {room_id}, dịch vụ {service_id}"
+            key = (int(room_id), int(service_id))
+            merged[key] = merged.get(key, 0) + int(qty)
+        if not merged:
+            return False, "Không có dịch vụ nào để thêm."
+
+        rows = [(rid, sid, qty) for (rid, sid), qty in merged.items()]
+        inserted = updated = 0
+        missing = []
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for i in range(0, len(rows), self.USAGE_CHUNK):
+                    chunk = rows[i:i + self.USAGE_CHUNK]
+                    values = ", ".join(["(?, ?, ?)"] * len(chunk))
+                    cursor.execute(self.USAGE_BATCH.format(values=values, items_json=FOLIO_ITEMS_JSON.format(ma_pd="f.MaPD")),
+                                   [v for row in chunk for v in row])
+                    missing.extend(r[0] for r in cursor.fetchall())
+                    cursor.nextset()
+                    for action, *_ in cursor.fetchall():
+                        if action == "UPDATE":
+                            updated += 1
+                        else:
+                            inserted += 1
+
+                if missing and atomic:
+                    conn.rollback()
+                    rooms = ", ".join(str(r) for r in sorted(set(missing)))
+                    return False, f"Phòng chưa có khách check-in: {rooms}"
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                return False, str(e)
+
+        return True, {
+            "inserted": inserted,
+            "updated": updated,
+            "lines": len(rows),
+            "missing": sorted(set(missing)),
+            "elapsed_ms": (time.perf_counter() - start) * 1000
+        }
 
 class OperationRepository:
     """Xử lý các giao dịch phức tạp: Đặt phòng, Checkin, Checkout"""
-    def __init__(self, conn):
-        self.conn = conn
-        self.cursor = conn.cursor()
+    def __init__(self, pool, availability=None, occupancy=None):
+        self.pool = pool
+        # Các chỉ mục trong bộ nhớ (AvailabilityIndex, OccupancyMatrix) được cập nhật sau mỗi lần commit
+        self.availability = availability
+        self.occupancy = occupancy
+
+    def _indexes(self):
+        return [i for i in (self.availability, self.occupancy) if i is not None]
+
+    # SQL Server: tối đa 2100 tham số / câu lệnh và 1000 dòng / VALUES
+    GUEST_CHUNK = 500
+    BOOKING_CHUNK = 1000
 
     def create_booking(self, guest_info, room_ids, s_date, e_date):
-        try:
-            name, cccd, phone = guest_info
-            
-            # --- LOGIC MỚI: KIỂM TRA KHÁCH HÀNG TỒN TẠI ---
-            self.cursor.execute("SELECT MaKH FROM KhachHang WHERE CCCD = ?", (cccd,))
-            row = self.cursor.fetchone()
-            
-            if row:
-                # Nếu đã có -> Update thông tin mới nhất
-                makh = row[0]
-                self.cursor.execute("""
-                    UPDATE KhachHang SET TenKH = ?, SDT = ? WHERE MaKH = ?
-                """, (name, phone, makh))
-            else:
-                # Nếu chưa có -> Insert mới
-                self.cursor.execute("""
-                    INSERT INTO KhachHang(TenKH, CCCD, SDT) VALUES(?, ?, ?)
-                """, (name, cccd, phone))
-                self.cursor.execute("SELECT @@IDENTITY")
-                makh = self.cursor.fetchone()[0]
-
-            # --- TẠO PHIẾU ĐẶT PHÒNG ---
-            for rid in room_ids:
-                self.cursor.execute("""
-                    INSERT INTO PhieuDatPhong(MaKH, SoPhong, NgayDen, NgayDi, TrangThaiDat)
-                    VALUES(?, ?, ?, ?, N'Đã xác nhận')
-                """, (makh, rid, s_date, e_date))
-            
-            self.conn.commit()
-            return True, f"Đặt thành công cho khách {name} (Mã KH: {makh:.0f})"
-        except Exception as e:
-            self.conn.rollback()
-            return False, str(e)
+        ok, res = self.create_group_booking([(guest_info, room_ids)], s_date, e_date)
+        if not ok:
+            return False, res
+        name, cccd, _ = guest_info
+        return True, f"Đặt thành công cho khách {name} (Mã KH: {res['customers'][cccd]:.0f})"
+
+    def create_group_booking(self, groups, s_date, e_date):
+        """
+        Đặt phòng đoàn theo lô: groups = [((TenKH, CCCD, SDT), [SoPhong, ...]), ...].
+        1 MERGE cho khách hàng + 1 INSERT...SELECT cho mỗi 1000 phiếu, commit 1 lần.
+        Trả về (True, {"customers": {CCCD: MaKH}, "bookings": [(MaPD, SoPhong), ...]}).
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                customers, created = self.insert_group_bookings(cursor, groups, s_date, e_date)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                return False, str(e)
+
+        for index in self._indexes():
+            for ma_pd, rid in created:
+                index.add(ma_pd, rid, s_date, e_date)
+        return True, {"customers": customers, "bookings": created}
+
+    @classmethod
+    def insert_group_bookings(cls, cursor, groups, s_date, e_date):
+        """Phần ghi của create_group_booking (không commit) - dùng chung cho benchmark"""
+        # --- UPSERT KHÁCH HÀNG (CCCD trùng trong lô: lấy thông tin sau cùng) ---
+        guests = {}
+        for (name, cccd, phone), _ in groups:
+            guests[cccd] = (name, cccd, phone)
+        guest_rows = list(guests.values())
+
+        customers = {}
+        for i in range(0, len(guest_rows), cls.GUEST_CHUNK):
+            chunk = guest_rows[i:i + cls.GUEST_CHUNK]
+            values = ", ".join(["(?, ?, ?)"] * len(chunk))
+            cursor.execute(f"""
+                MERGE KhachHang AS kh
+                USING (VALUES {values}) AS src(TenKH, CCCD, SDT)
+                ON kh.CCCD = src.CCCD
+                WHEN MATCHED THEN UPDATE SET TenKH = src.TenKH, SDT = src.SDT
+                WHEN NOT MATCHED THEN INSERT (TenKH, CCCD, SDT) VALUES (src.TenKH, src.CCCD, src.SDT)
+                OUTPUT INSERTED.MaKH, INSERTED.CCCD;
+            """, [v for row in chunk for v in row])
+            for makh, cccd in cursor.fetchall():
+                customers[cccd] = makh
+
+        # --- TẠO PHIẾU ĐẶT PHÒNG (set-based, lấy MaPD qua OUTPUT) ---
+        pairs = [(customers[guest[1]], rid) for guest, room_ids in groups for rid in room_ids]
+        created = []
+        for i in range(0, len(pairs), cls.BOOKING_CHUNK):
+            chunk = pairs[i:i + cls.BOOKING_CHUNK]
+            values = ", ".join(["(?, ?)"] * len(chunk))
+            cursor.execute(f"""
+                INSERT INTO PhieuDatPhong(MaKH, SoPhong, NgayDen, NgayDi, TrangThaiDat)
+                OUTPUT INSERTED.MaPD, INSERTED.SoPhong
+                SELECT v.MaKH, v.SoPhong, ?, ?, N'Đã xác nhận'
+                FROM (VALUES {values}) AS v(MaKH, SoPhong)
+            """, [s_date, e_date] + [v for pair in chunk for v in pair])
+            created.extend((r[0], r[1]) for r in cursor.fetchall())
+
+        return customers, created
+
+    # 1 batch = 1 round trip: chuyển phiếu -> Đang ở, cập nhật phòng, tạo hóa đơn + folio, trả kết quả từng phòng
+    ARRIVALS_BATCH = """
+        SET NOCOUNT ON;
+        DECLARE @arr TABLE (MaPD INT PRIMARY KEY, SoPhong INT, MaKH INT);
+
+        UPDATE pd SET TrangThaiDat = N'Đang ở'
+        OUTPUT INSERTED.MaPD, INSERTED.SoPhong, INSERTED.MaKH INTO @arr
+        FROM PhieuDatPhong pd
+        JOIN KhachHang kh ON pd.MaKH = kh.MaKH
+        WHERE pd.TrangThaiDat = N'Đã xác nhận' AND pd.NgayDen = ? {cccd_filter};
+
+        UPDATE p SET TrangThai = N'Đang ở'
+        FROM Phong p JOIN @arr a ON p.SoPhong = a.SoPhong;
+
+        INSERT INTO HoaDon (MaPD, TrangThaiHD)
+        SELECT a.MaPD, N'Chưa thanh toán' FROM @arr a
+        WHERE NOT EXISTS (SELECT 1 FROM HoaDon hd WHERE hd.MaPD = a.MaPD);
+
+        INSERT INTO FolioLuuTru (MaPD, MaHD, SoPhong, TenKH, TenLP, NgayNhan, GiaPhong, TongDichVu, ChiTietDV)
+        SELECT a.MaPD, hd.MaHD, a.SoPhong, kh.TenKH, lp.TenLP, hd.NgayTao, lp.GiaTheoNgay, 0, N'[]'
+        FROM @arr a
+        JOIN HoaDon hd ON hd.MaPD = a.MaPD AND hd.TrangThaiHD = N'Chưa thanh toán'
+        JOIN KhachHang kh ON a.MaKH = kh.MaKH
+        JOIN Phong p ON a.SoPhong = p.SoPhong
+        JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+        WHERE NOT EXISTS (SELECT 1 FROM FolioLuuTru f WHERE f.MaPD = a.MaPD);
+
+        SELECT a.MaPD, a.SoPhong, kh.TenKH, kh.CCCD
+        FROM @arr a JOIN KhachHang kh ON a.MaKH = kh.MaKH
+        ORDER BY kh.CCCD, a.SoPhong;
+    """
+    CCCD_CHUNK = 1000
 
     def check_in(self, cccd):
         """Check-in tự động theo CCCD (Chỉ check-in booking hôm nay)"""
-        try:
-            from datetime import datetime
-            today = datetime.now().date()
+        ok, res = self.check_in_arrivals([cccd])
+        if not ok:
+            return False, res
 
-            query = """
-                SELECT pd.MaPD, pd.SoPhong, pd.NgayDen, kh.TenKH
-                FROM PhieuDatPhong pd
-                JOIN KhachHang kh ON pd.MaKH = kh.MaKH
-                WHERE kh.CCCD = ? 
-                AND pd.TrangThaiDat = N'Đã xác nhận'
-            """
-            self.cursor.execute(query, (cccd,))
-            bookings = self.cursor.fetchall()
-            
-            if not bookings:
-                return False, f"Không tìm thấy phiếu đặt phòng nào cho CCCD: {cccd}"
-
-            valid_bookings = []
-            today_rooms = []
-            
-            for b in bookings:
-                # b[2] là NgayDen
-                if b[2] == today:
-                    valid_bookings.append(b)
-                    today_rooms.append(b[1]) 
-                else:
-                    pass 
-            
-            if not valid_bookings:
-                return False, f"Khách có lịch đặt nhưng KHÔNG PHẢI HÔM NAY.\n   -> Ngày hẹn check-in: {bookings[0][2]}"
-
-            customer_name = valid_bookings[0][3] 
-            
-            for vb in valid_bookings:
-                ma_pd = vb[0]
-                so_phong = vb[1]
-                
-                self.cursor.execute("UPDATE PhieuDatPhong SET TrangThaiDat = N'Đang ở' WHERE MaPD = ?", (ma_pd,))
-                self.cursor.execute("UPDATE Phong SET TrangThai = N'Đang ở' WHERE SoPhong = ?", (so_phong,))
-                
-                self.cursor.execute("SELECT 1 FROM HoaDon WHERE MaPD = ?", (ma_pd,))
-                if not self.cursor.fetchone():
-                    self.cursor.execute("INSERT INTO HoaDon (MaPD, TrangThaiHD) VALUES (?, N'Chưa thanh toán')", (ma_pd,))
-
-            self.conn.commit()
-            
+        if res["count"]:
             return True, {
-                "name": customer_name,
-                "rooms": today_rooms,
-                "count": len(today_rooms)
+                "name": res["rooms"][0]["name"],
+                "rooms": [r["room"] for r in res["rooms"]],
+                "count": res["count"]
             }
 
-        except Exception as e:
-            self.conn.rollback()
-            return False, f"Lỗi hệ thống: {str(e)}"
+        # Không có phiếu nào hôm nay -> tra lại để báo lỗi cụ thể
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT TOP 1 pd.NgayDen
+                FROM PhieuDatPhong pd
+                JOIN KhachHang kh ON pd.MaKH = kh.MaKH
+                WHERE kh.CCCD = ? AND pd.TrangThaiDat = N'Đã xác nhận'
+                ORDER BY pd.NgayDen
+            """, (cccd,))
+            row = cursor.fetchone()
+
+        if not row:
+            return False, f"Không tìm thấy phiếu đặt phòng nào cho CCCD: {cccd}"
+        return False, f"Khách có lịch đặt nhưng KHÔNG PHẢI HÔM NAY.\n   -> Ngày hẹn check-in: {row[0]}"
+
+    def check_in_arrivals(self, cccds=None, day=None):
+        """
+        Check-in hàng loạt các phiếu 'Đã xác nhận' có ngày đến = day (mặc định hôm nay).
+        cccds=None: toàn bộ khách đến trong ngày; ngược lại chỉ các CCCD trong danh sách.
+        Trả về (True, {"rooms": [{ma_pd, room, name, cccd}], "count", "missing", "elapsed_ms"}).
+        """
+        day = day or datetime.now().date()
+        start = time.perf_counter()
+
+        if cccds is None:
+            batches = [None]
+        else:
+            unique = list(dict.fromkeys(cccds))
+            batches = [unique[i:i + self.CCCD_CHUNK] for i in range(0, len(unique), self.CCCD_CHUNK)]
+
+        rooms = []
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for chunk in batches:
+                    cccd_filter = ""
+                    params = [day]
+                    if chunk is not None:
+                        cccd_filter = f"AND kh.CCCD IN ({', '.join(['?'] * len(chunk))})"
+                        params += chunk
+                    cursor.execute(self.ARRIVALS_BATCH.format(cccd_filter=cccd_filter), params)
+                    rooms.extend({"ma_pd": r[0], "room": r[1], "name": r[2], "cccd": r[3]} for r in cursor.fetchall())
+
+                conn.commit()
+                # Đã xác nhận -> Đang ở: phiếu vẫn chiếm phòng nên các chỉ mục không đổi
+            except Exception as e:
+                conn.rollback()
+                return False, f"Lỗi hệ thống: {str(e)}"
+
+        found = {r["cccd"] for r in rooms}
+        return True, {
+            "rooms": rooms,
+            "count": len(rooms),
+            "missing": [c for c in (cccds or []) if c not in found],
+            "elapsed_ms": (time.perf_counter() - start) * 1000
+        }
 
     def get_bill_raw_data(self, room_id):
         query_room = """
@@ -187,41 +461,186 @@ class OperationRepository:
             JOIN KhachHang kh ON pd.MaKH = kh.MaKH
             WHERE p.SoPhong = ? AND p.TrangThai = N'Đang ở' AND hd.TrangThaiHD = N'Chưa thanh toán'
         """
-        self.cursor.execute(query_room, (room_id,))
-        room_data = self.cursor.fetchone()
-        if not room_data: return None, "Không có thông tin hóa đơn."
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query_room, (room_id,))
+            room_data = cursor.fetchone()
+            if not room_data: return None, "Không có thông tin hóa đơn."
+
+            ma_pd = room_data[5]
+            query_svc = "SELECT dv.TenDV, ctsd.SoLuong, dv.Gia FROM ChiTietSD ctsd JOIN DichVu dv ON ctsd.MaDV = dv.MaDV WHERE ctsd.MaPD = ?"
+            cursor.execute(query_svc, (ma_pd,))
+
+            services = [{"name": r[0], "qty": r[1], "price": float(r[2])} for r in cursor.fetchall()]
 
-        ma_pd = room_data[5]
-        query_svc = "SELECT dv.TenDV, ctsd.SoLuong, dv.Gia FROM ChiTietSD ctsd JOIN DichVu dv ON ctsd.MaDV = dv.MaDV WHERE ctsd.MaPD = ?"
-        self.cursor.execute(query_svc, (ma_pd,))
-        
-        services = [{"name": r[0], "qty": r[1], "price": float(r[2])} for r in self.cursor.fetchall()]
-        
         return {
             "ma_hd": room_data[0], "check_in": room_data[1], "price": float(room_data[2]),
             "type": room_data[3], "customer": room_data[4], "ma_pd": ma_pd, "services": services
         }, "OK"
 
-    def checkout(self, room_id, bill_detail, surcharge=0):
-        try:
-            final_total = bill_detail.grand_total + surcharge
-            
-            self.cursor.execute("""
-                UPDATE HoaDon 
-                SET TongTien = ?, PhuThu = ?, TrangThaiHD = N'Đã thanh toán' 
-                WHERE MaHD = ?
-            """, (final_total, surcharge, bill_detail.ma_hd))
-            
-            self.cursor.execute("""
-                UPDATE Phong 
-                SET TrangThai = N'Đang dọn', GhiChu = '' 
-                WHERE SoPhong = ?
+    def get_folio(self, room_id):
+        """
+        Folio đang mở của phòng (read model FolioLuuTru): 1 dòng đã tính sẵn tổng dịch vụ + chi tiết.
+        Cùng dạng dữ liệu với get_bill_raw_data (thêm "service_total"); chưa có dòng folio
+        (dữ liệu cũ / nạp hàng loạt) thì đọc từ các bảng gốc.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT TOP 1 MaHD, NgayNhan, GiaPhong, TenLP, TenKH, MaPD, TongDichVu, ChiTietDV
+                FROM FolioLuuTru WHERE SoPhong = ? ORDER BY MaPD DESC
             """, (room_id,))
-            
-            self.cursor.execute("UPDATE PhieuDatPhong SET TrangThaiDat = N'Hoàn tất' WHERE MaPD = ?", (bill_detail.ma_pd,))
-            
-            self.conn.commit()
-            return True, "Thanh toán thành công. Phòng chuyển sang 'Đang dọn'."
-        except Exception as e:
-            self.conn.rollback()
-            return False, f"Lỗi checkout: {str(e)}"
\ No newline at end of file
+            row = cursor.fetchone()
+        if not row:
+            return self.get_bill_raw_data(room_id)
+
+        services = [{"name": s["name"], "qty": s["qty"], "price": float(s["price"])} for s in json.loads(row[7])]
+        return {
+            "ma_hd": row[0], "check_in": row[1], "price": float(row[2]),
+            "type": row[3], "customer": row[4], "ma_pd": row[5], "services": services,
+            "service_total": float(row[6])
+        }, "OK"
+
+    def reconcile_folios(self, repair=False):
+        """
+        Đối soát FolioLuuTru với các bảng gốc (HoaDon, ChiTietSD, DichVu...).
+        Trả về (True, {"checked", "missing", "stale", "mismatched", "repaired", "elapsed_ms"}):
+        - missing: lượt lưu trú đang mở chưa có folio; stale: folio của lượt đã đóng;
+        - mismatched: folio lệch (tổng dịch vụ, chi tiết, giá phòng, hóa đơn...).
+        repair=False (mặc định): chỉ phát hiện lệch. repair=True: dựng lại đúng các dòng lệch bằng 1 MERGE, commit 1 lần.
+        Kết nối không phải SQL Server (SQLite stand-in) so sánh và sửa bằng Python, cùng kết quả.
+        """
+        start = time.perf_counter()
+        diff = f"""
+            SELECT ISNULL(src.MaPD, f.MaPD), ISNULL(src.SoPhong, f.SoPhong),
+                   CASE WHEN f.MaPD IS NULL THEN 'missing' WHEN src.MaPD IS NULL THEN 'stale' ELSE 'mismatched' END
+            FROM ({FOLIO_SOURCE}) AS src
+            FULL OUTER JOIN FolioLuuTru f ON f.MaPD = src.MaPD
+            WHERE f.MaPD IS NULL OR src.MaPD IS NULL
+               OR f.MaHD <> src.MaHD OR f.SoPhong <> src.SoPhong OR f.NgayNhan <> src.NgayNhan
+               OR f.GiaPhong <> src.GiaPhong OR f.TongDichVu <> src.TongDichVu OR f.ChiTietDV <> src.ChiTietDV
+               OR ISNULL(f.TenKH, N'') <> ISNULL(src.TenKH, N'')
+        """
+        result = {"missing": [], "stale": [], "mismatched": [], "repaired": 0}
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                sqlserver = is_sqlserver(cursor)
+                if sqlserver:
+                    cursor.execute(diff)
+                    for ma_pd, room_id, kind in cursor.fetchall():
+                        result[kind].append((ma_pd, room_id))
+                else:
+                    source = self._diff_folios(cursor, result)
+                cursor.execute("SELECT COUNT(*) FROM FolioLuuTru")
+                result["checked"] = cursor.fetchone()[0]
+
+                if repair and (result["missing"] or result["stale"] or result["mismatched"]):
+                    if sqlserver:
+                        cursor.execute(FOLIO_REBUILD)
+                        result["repaired"] = len(cursor.fetchall())
+                    else:
+                        result["repaired"] = self._repair_folios(cursor, result, source)
+                    conn.commit()
+            except Exception as e:
+                conn.rollback()
+                return False, f"Lỗi đối soát folio: {str(e)}"
+
+        result["elapsed_ms"] = (time.perf_counter() - start) * 1000
+        return True, result
+
+    @staticmethod
+    def _diff_folios(cursor, result):
+        """Phần so sánh của reconcile_folios tính bằng Python (kết nối không phải SQL Server)"""
+        source = folio_source_rows(cursor)
+        cursor.execute(f"SELECT {', '.join(FOLIO_COLUMNS)} FROM FolioLuuTru")
+        seen = set()
+        for f in cursor.fetchall():
+            src = source.get(f[0])
+            seen.add(f[0])
+            if src is None:
+                result["stale"].append((f[0], f[2]))
+                continue
+            items = [{"name": i["name"], "qty": i["qty"], "price": float(i["price"])} for i in json.loads(f[8])]
+            expected = [{"name": i["name"], "qty": i["qty"], "price": float(i["price"])} for i in src[8]]
+            if (f[1], f[2], f[5], float(f[6]), float(f[7]), f[3] or "") != \
+                    (src[1], src[2], src[5], float(src[6]), float(src[7]), src[3] or "") or items != expected:
+                result["mismatched"].append((f[0], f[2]))
+        result["missing"].extend((ma_pd, src[2]) for ma_pd, src in source.items() if ma_pd not in seen)
+        return source
+
+    @staticmethod
+    def _repair_folios(cursor, result, source):
+        """Phần sửa của reconcile_folios khi không có MERGE: xóa dòng lệch / thừa, ghi lại từ source"""
+        now = datetime.now()
+        for ma_pd, _ in result["stale"] + result["mismatched"]:
+            cursor.execute("DELETE FROM FolioLuuTru WHERE MaPD = ?", (ma_pd,))
+        for ma_pd, _ in result["missing"] + result["mismatched"]:
+            src = source[ma_pd]
+            cursor.execute(f"""
+                INSERT INTO FolioLuuTru ({', '.join(FOLIO_COLUMNS)}, CapNhat)
+                VALUES ({', '.join(['?'] * (len(FOLIO_COLUMNS) + 1))})
+            """, (*src[:-1], json.dumps(src[-1], ensure_ascii=False), now))
+        return len(result["stale"]) + len(result["mismatched"]) + len(result["missing"])
+
+    def get_open_folios_raw(self):
+        """
+        Toàn bộ hóa đơn chưa thanh toán của phòng đang ở (2 truy vấn cho mọi phòng):
+        - folios: (MaHD, MaPD, SoPhong, NgayTao, GiaTheoNgay, TenKH)
+        - services: (MaPD, TenDV, SoLuong, Gia)
+        """
+        query_folio = """
+            SELECT hd.MaHD, pd.MaPD, p.SoPhong, hd.NgayTao, lp.GiaTheoNgay, kh.TenKH
+            FROM HoaDon hd
+            JOIN PhieuDatPhong pd ON hd.MaPD = pd.MaPD
+            JOIN Phong p ON pd.SoPhong = p.SoPhong
+            JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+            JOIN KhachHang kh ON pd.MaKH = kh.MaKH
+            WHERE p.TrangThai = N'Đang ở' AND hd.TrangThaiHD = N'Chưa thanh toán'
+        """
+        query_svc = """
+            SELECT ctsd.MaPD, dv.TenDV, ctsd.SoLuong, dv.Gia
+            FROM ChiTietSD ctsd
+            JOIN DichVu dv ON ctsd.MaDV = dv.MaDV
+            JOIN HoaDon hd ON hd.MaPD = ctsd.MaPD
+            WHERE hd.TrangThaiHD = N'Chưa thanh toán'
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query_folio)
+            folios = cursor.fetchall()
+            cursor.execute(query_svc)
+            services = cursor.fetchall()
+        return folios, services
+
+    def checkout(self, room_id, bill_detail, surcharge=0):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                final_total = bill_detail.grand_total + surcharge
+
+                cursor.execute("""
+                    UPDATE HoaDon
+                    SET TongTien = ?, PhuThu = ?, TrangThaiHD = N'Đã thanh toán'
+                    WHERE MaHD = ?
+                """, (final_total, surcharge, bill_detail.ma_hd))
+
+                cursor.execute("""
+                    UPDATE Phong
+                    SET TrangThai = N'Đang dọn', GhiChu = ''
+                    WHERE SoPhong = ?
+                """, (room_id,))
+
+                cursor.execute("UPDATE PhieuDatPhong SET TrangThaiDat = N'Hoàn tất' WHERE MaPD = ?", (bill_detail.ma_pd,))
+                cursor.execute("DELETE FROM FolioLuuTru WHERE MaPD = ?", (bill_detail.ma_pd,))
+                # Cộng dồn vào bảng tổng hợp doanh thu theo ngày trong cùng giao dịch
+                RevenueRollup.record_checkout(cursor, room_id, bill_detail, surcharge)
+
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                return False, f"Lỗi checkout: {str(e)}"
+
+        for index in self._indexes():
+            index.remove(bill_detail.ma_pd)
+        return True, "Thanh toán thành công. Phòng chuyển sang 'Đang dọn'."
@@ -1,12 +1,18 @@
 import math
+import operator
+from functools import lru_cache
+from array import array
 from datetime import datetime
-from models import BillDetail
+from models import BillDetail, FolioBatch, RoomColumns, FolioColumns, from_micros, to_micros
+from allocation import RoomAllocator
 
 class HotelAlgorithms:
     
     @staticmethod
     def analyze_availability(all_rooms, conflict_ids):
-        """Logic lọc phòng bằng Hash Map"""
+        """Logic lọc phòng bằng Hash Map. all_rooms: list[Room] hoặc RoomColumns (dạng cột)"""
+        if isinstance(all_rooms, RoomColumns):
+            return HotelAlgorithms._availability_columns(all_rooms, conflict_ids)
         busy_set = set(conflict_ids)
         stats_map = {} 
         for room in all_rooms:
@@ -21,6 +27,24 @@ class HotelAlgorithms:
                 stats_map[tid]["count"] += 1
                 stats_map[tid]["room_ids"].append(room.id)
         return list(stats_map.values())
+
+    @staticmethod
+    def _availability_columns(rooms, conflict_ids):
+        """Như analyze_availability nhưng duyệt thẳng các cột id / mã trạng thái / loại phòng"""
+        busy_set = set(conflict_ids)
+        maintenance = rooms.statuses.get('Bảo trì')
+        stats_map = {}
+        for rid, code, tid in zip(rooms.id, rooms.status_code, rooms.type_id):
+            if code == maintenance or rid in busy_set:
+                continue
+            st = stats_map.get(tid)
+            if st is None:
+                name, price, cap = rooms.types[tid]
+                st = stats_map[tid] = {"id": tid, "name": name, "price": price, "cap": cap,
+                                       "count": 0, "room_ids": []}
+            st["count"] += 1
+            st["room_ids"].append(rid)
+        return list(stats_map.values())
     
 
     @staticmethod
@@ -57,16 +81,24 @@ class HotelAlgorithms:
         return False 
 
     @staticmethod
-    def calculate_bill(raw_data):
-        """Logic tính tiền (Pure Function)"""
-        check_out = datetime.now()
+    def stay_days(check_in, check_out):
+        """Số ngày tính tiền: làm tròn lên, tối thiểu 1 ngày"""
+        days = math.ceil((check_out - check_in).total_seconds() / 86400)
+        return max(1, days)
+
+    @staticmethod
+    def calculate_bill(raw_data, check_out=None):
+        """Logic tính tiền (Pure Function). check_out mặc định là thời điểm hiện tại"""
+        check_out = check_out or datetime.now()
         check_in = raw_data['check_in']
 
-        days = math.ceil((check_out - check_in).total_seconds() / 86400)
-        days = max(1, days)
+        days = HotelAlgorithms.stay_days(check_in, check_out)
 
         room_total = days * raw_data['price']
-        svc_total = sum(s['qty'] * s['price'] for s in raw_data['services'])
+        # Folio (get_folio) đã cộng dồn sẵn tổng dịch vụ
+        svc_total = raw_data.get('service_total')
+        if svc_total is None:
+            svc_total = sum(s['qty'] * s['price'] for s in raw_data['services'])
         
         return BillDetail(
             ma_hd=raw_data['ma_hd'], ma_pd=raw_data['ma_pd'],
@@ -76,62 +108,147 @@ class HotelAlgorithms:
             service_items=raw_data['services'], service_total=svc_total,
             grand_total=room_total + svc_total
         )
+
+    @staticmethod
+    def calculate_bills(folios, services=None, audit_time=None):
+        """
+        Night audit: tính tiền tạm cho mọi phòng đang ở tại cùng 1 mốc audit_time.
+        Dữ liệu đi theo cột (array) thay vì 1 dict + 1 BillDetail mỗi phòng;
+        tổng dịch vụ được cộng dồn trong 1 lượt duyệt qua ChiTietSD.
+        Đầu vào: kết quả của OperationRepository.get_open_folios_raw(), hoặc 1 FolioColumns
+        (vd Snapshot.open_folios()) - khi đó bỏ qua tham số services.
+        """
+        audit_time = audit_time or datetime.now()
+        if isinstance(folios, FolioColumns):
+            return HotelAlgorithms._bills_columns(folios, audit_time)
+        batch = FolioBatch(audit_time=audit_time)
+        n = len(folios)
+
+        batch.ma_hd.extend(f[0] for f in folios)
+        batch.ma_pd.extend(f[1] for f in folios)
+        batch.room_id.extend(f[2] for f in folios)
+        batch.check_in = [f[3] for f in folios]
+        batch.room_price.extend(float(f[4]) for f in folios)
+        batch.customer_name = [f[5] for f in folios]
+
+        # Số ngày: ceil(giây / 86400), tối thiểu 1
+        batch.days_used.extend(
+            max(1, math.ceil((audit_time - ci).total_seconds() / 86400)) for ci in batch.check_in
+        )
+        batch.room_total.extend(map(operator.mul, batch.days_used, batch.room_price))
+
+        # Tổng dịch vụ: cộng dồn theo vị trí của MaPD
+        row_of = {ma_pd: i for i, ma_pd in enumerate(batch.ma_pd)}
+        svc_total = array('d', bytes(8 * n))
+        items = batch.service_items
+        for ma_pd, name, qty, price in services:
+            i = row_of.get(ma_pd)
+            if i is None:
+                continue
+            price = float(price)
+            svc_total[i] += qty * price
+            items.setdefault(ma_pd, []).append({"name": name, "qty": qty, "price": price})
+        batch.service_total = svc_total
+
+        batch.grand_total.extend(map(operator.add, batch.room_total, svc_total))
+        return batch
+
+    @staticmethod
+    def _bills_columns(cols, audit_time):
+        batch = FolioBatch(audit_time=audit_time)
+        n = len(cols)
+        batch.ma_hd.extend(cols.ma_hd)
+        batch.ma_pd.extend(cols.ma_pd)
+        batch.room_id.extend(cols.room_id)
+        batch.room_price.extend(cols.room_price)
+        batch.check_in = [from_micros(us) for us in cols.check_in]
+        batch.customer_name = list(cols.customer_name) if cols.customer_name is not None else [""] * n
+
+        # Số ngày: ceil(micro giây / 86400e6), tối thiểu 1 - tính thẳng trên cột số nguyên
+        audit_us, day_us = to_micros(audit_time), 86400 * 10**6
+        batch.days_used.extend(max(1, -((ci - audit_us) // day_us)) for ci in cols.check_in)
+        batch.room_total.extend(map(operator.mul, batch.days_used, batch.room_price))
+
+        row_of = {ma_pd: i for i, ma_pd in enumerate(batch.ma_pd)}
+        svc_total = array('d', bytes(8 * n))
+        items = batch.service_items
+        for ma_pd, name, qty, price in zip(cols.svc_ma_pd, cols.svc_name, cols.svc_qty, cols.svc_price):
+            i = row_of.get(ma_pd)
+            if i is None:
+                continue
+            svc_total[i] += qty * price
+            items.setdefault(ma_pd, []).append({"name": name, "qty": qty, "price": price})
+        batch.service_total = svc_total
+
+        batch.grand_total.extend(map(operator.add, batch.room_total, svc_total))
+        return batch
     
     
 
     @staticmethod
-    def find_closest_rooms(available_ids, quantity):
-        available_ids.sort()
-        
-        n = len(available_ids)
-        if n < quantity:
-            return None 
-        
-        min_diff = float('inf')
-        best_window = []
-        
-        for i in range(n - quantity + 1):
-            current_window = available_ids[i : i + quantity]
-            
-            diff = current_window[-1] - current_window[0]
-            
-            if diff < min_diff:
-                min_diff = diff
-                best_window = current_window
-
-            if diff == quantity - 1:
-                break
-                
-        return best_window
+    def find_closest_rooms(available_ids, quantity, layout=None):
+        """Xếp phòng gần nhau theo tầng & hành lang (xem RoomAllocator) - O(N)"""
+        result = RoomAllocator(layout).allocate([(rid, 0) for rid in available_ids], {0: quantity})
+        return result["rooms"] if result else None
+
     @staticmethod
-    def suggest_service_combos(service_list, max_budget):
+    def suggest_service_combos(service_list, max_budget, k=5, max_qty=1):
         """
-        Sử dụng BACKTRACKING để tìm các tổ hợp dịch vụ
-        có tổng giá <= max_budget.
+        Top-k combo dịch vụ có tổng giá <= max_budget (tổng càng sát ngân sách càng tốt).
+        Quy hoạch động Knapsack có giới hạn số lượng: O(N * W * k * q) với W = ngân sách / ƯCLN(giá),
+        thay cho Backtracking O(2^N). max_qty: số lượng tối đa mỗi món (int chung hoặc {tên: sl}).
+        Kết quả được ghi nhớ theo (thực đơn, ngân sách, k, max_qty).
         """
+        if isinstance(max_qty, dict):
+            items = tuple((s.name, int(round(s.price)), max_qty.get(s.name, 1)) for s in service_list)
+        else:
+            items = tuple((s.name, int(round(s.price)), max_qty) for s in service_list)
+        return [
+            {"combo": list(c["combo"]), "items": list(c["items"]), "total": c["total"]}
+            for c in HotelAlgorithms._top_k_combos(items, int(max_budget), k)
+        ]
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _top_k_combos(items, budget, k):
+        items = [(name, price, qty) for name, price, qty in items if price > 0 and qty > 0 and price <= budget]
+        if not items or budget <= 0:
+            return ()
+
+        # Quy đổi giá về đơn vị ƯCLN để bảng DP nhỏ nhất có thể
+        unit = 0
+        for _, price, _ in items:
+            unit = math.gcd(unit, price)
+        cap = budget // unit
+
+        # dp[w]: tối đa k tổ hợp (dạng tuple (chỉ số món, số lượng)) có tổng đúng bằng w đơn vị
+        dp = [[] for _ in range(cap + 1)]
+        dp[0] = [()]
+        # Cập nhật tại chỗ: duyệt w giảm dần nên dp[w - q * w_item] (ô nhỏ hơn) vẫn là giá trị
+        # trước khi xét món i -> mỗi món dùng tối đa 1 lần với 1 số lượng q, chỉ chạm các ô thay đổi
+        for i, (_, price, max_q) in enumerate(items):
+            w_item = price // unit
+            for w in range(cap, w_item - 1, -1):
+                cell = dp[w]
+                for q in range(1, min(max_q, w // w_item) + 1):
+                    if len(cell) >= k:
+                        break
+                    for combo in dp[w - q * w_item]:
+                        cell.append(combo + ((i, q),))
+                        if len(cell) >= k:
+                            break
+
         results = []
-        
-        def backtrack(start_idx, current_combo, current_total):
-            if current_total > 0:
+        for w in range(cap, 0, -1):
+            for combo in dp[w]:
+                names = []
+                for i, q in combo:
+                    names.extend([items[i][0]] * q)
                 results.append({
-                    "combo": list(current_combo), 
-                    "total": current_total
+                    "combo": tuple(names),
+                    "items": tuple((items[i][0], q) for i, q in combo),
+                    "total": float(w * unit)
                 })
-            
-            for i in range(start_idx, len(service_list)):
-                item = service_list[i]
-                
-                if current_total + item.price > max_budget:
-                    continue
-                
-                current_combo.append(item.name)
-                
-                backtrack(i + 1, current_combo, current_total + item.price)
-                
-                current_combo.pop()
-
-        service_list.sort(key=lambda x: x.price)
-        backtrack(0, [], 0)
-        
-        results.sort(key=lambda x: x['total'], reverse=True)
-        return results[:5]
\ No newline at end of file
+                if len(results) >= k:
+                    return tuple(results)
+        return tuple(results)
@@ -0,0 +1,385 @@
+import os
+import sys
+import json
+import mmap
+import time
+import bisect
+import struct
+import argparse
+from array import array
+from datetime import date, datetime
+
+from models import RoomColumns, FolioColumns, to_micros
+from streaming import iter_batches
+
+
+MAGIC = b"HOTELSNP"
+VERSION = 1
+ALIGN = 8
+
+# Kiểu cột: mã array + cách chuyển giá trị DB. "str" = mã int32 trỏ vào bảng chuỗi dùng chung.
+COLUMN_TYPES = {
+    "int": 'q',
+    "float": 'd',
+    "date": 'q',        # date.toordinal()
+    "datetime": 'q',    # micro giây kể từ 1970-01-01 (models.to_micros)
+    "str": 'i',
+}
+NULL_INT = -1
+
+TABLES = {
+    "LoaiPhong": ("MaLP", [("MaLP", "int"), ("TenLP", "str"), ("GiaTheoNgay", "float"), ("SucChua", "int")]),
+    "Phong": ("SoPhong", [("SoPhong", "int"), ("TrangThai", "str"), ("MaLP", "int"), ("GhiChu", "str")]),
+    "DichVu": ("MaDV", [("MaDV", "int"), ("TenDV", "str"), ("Gia", "float")]),
+    "PhieuDatPhong": ("MaPD", [("MaPD", "int"), ("MaKH", "int"), ("SoPhong", "int"), ("NgayDen", "date"),
+                               ("NgayDi", "date"), ("TrangThaiDat", "str")]),
+    "HoaDon": ("MaHD", [("MaHD", "int"), ("MaPD", "int"), ("NgayTao", "datetime"), ("TongTien", "float"),
+                        ("PhuThu", "float"), ("TrangThaiHD", "str")]),
+    # Sắp theo MaPD -> dịch vụ của 1 phiếu là 1 đoạn liên tiếp (tra bằng bisect)
+    "ChiTietSD": ("MaPD, MaSD", [("MaSD", "int"), ("MaPD", "int"), ("MaDV", "int"), ("SoLuong", "int"),
+                                 ("ThoiGian", "datetime")]),
+}
+
+
+def _encode(kind, value):
+    if value is None:
+        return 0.0 if kind == "float" else NULL_INT
+    if kind == "int":
+        return int(value)
+    if kind == "float":
+        return float(value)
+    if kind == "date":
+        return (value.date() if isinstance(value, datetime) else value).toordinal()
+    if kind == "datetime":
+        return to_micros(value)
+    raise ValueError(kind)
+
+
+def export_snapshot(pool, path, fetch_size=10000):
+    """
+    Ghi các bảng TABLES ra 1 file cột:
+      MAGIC | u32 độ dài manifest | manifest JSON | các cột (căn lề 8 byte)
+    Chuỗi được mã hóa từ điển: mỗi chuỗi khác nhau lưu 1 lần (UTF-8) trong bảng chuỗi dùng chung.
+    Ghi ra file tạm rồi os.replace -> người đọc không bao giờ thấy file dở dang.
+    Trả về manifest.
+    """
+    start = time.perf_counter()
+    strings, string_code = [], {}
+
+    def intern(value):
+        if value is None:
+            return NULL_INT
+        code = string_code.get(value)
+        if code is None:
+            code = string_code[value] = len(strings)
+            strings.append(value)
+        return code
+
+    tables = {}
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        for name, (order_by, columns) in TABLES.items():
+            data = [array(COLUMN_TYPES[kind]) for _, kind in columns]
+            cursor.execute(f"SELECT {', '.join(c for c, _ in columns)} FROM {name} ORDER BY {order_by}")
+            for rows in iter_batches(cursor, fetch_size, name=f"snapshot.{name}"):
+                for j, (_, kind) in enumerate(columns):
+                    col = data[j]
+                    if kind == "str":
+                        col.extend(intern(r[j]) for r in rows)
+                    else:
+                        col.extend(_encode(kind, r[j]) for r in rows)
+            tables[name] = (columns, data)
+
+    # Bảng chuỗi: offsets (n + 1 phần tử) + blob UTF-8
+    blob = bytearray()
+    offsets = array('q', [0])
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+
+    manifest = {"version": VERSION, "byteorder": sys.byteorder, "created": datetime.now().isoformat(),
+                "tables": {}, "strings": {}}
+    chunks, pos = [], 0
+
+    def place(buf):
+        nonlocal pos
+        pad = (-pos) % ALIGN
+        chunks.append(b"\0" * pad)
+        pos += pad
+        offset = pos
+        chunks.append(buf)
+        pos += len(buf)
+        return offset
+
+    for name, (columns, data) in tables.items():
+        meta = {"rows": len(data[0]), "columns": {}}
+        for (col, kind), values in zip(columns, data):
+            meta["columns"][col] = {"type": kind, "offset": place(values.tobytes()), "length": len(values)}
+        manifest["tables"][name] = meta
+    manifest["strings"] = {"count": len(strings), "offsets": place(offsets.tobytes()),
+                           "blob": place(bytes(blob)), "blob_size": len(blob)}
+
+    header = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    data_start = len(prefix) + (-len(prefix)) % ALIGN
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(prefix)
+        f.write(b"\0" * (data_start - len(prefix)))
+        for c in chunks:
+            f.write(c)
+    os.replace(tmp, path)
+    manifest["elapsed_ms"] = (time.perf_counter() - start) * 1000
+    manifest["size"] = os.path.getsize(path)
+    return manifest
+
+
+class StringPool:
+    """Bảng chuỗi trên mmap: pool[mã] giải mã UTF-8 khi cần (có cache); code(s) tra ngược"""
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+        self._cache = {}
+        self._codes = None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, code):
+        if code < 0:
+            return None
+        s = self._cache.get(code)
+        if s is None:
+            s = self._cache[code] = bytes(self._blob[self._offsets[code]:self._offsets[code + 1]]).decode("utf-8")
+        return s
+
+    def code(self, value):
+        """Mã của 1 chuỗi (None nếu không có) - lần đầu dựng từ điển ngược cho toàn bảng chuỗi"""
+        if self._codes is None:
+            self._codes = {self[i]: i for i in range(len(self))}
+        return self._codes.get(value)
+
+
+class StringColumn:
+    """Cột chuỗi: codes là memoryview int32, giá trị giải mã qua StringPool"""
+    def __init__(self, codes, pool):
+        self.codes = codes
+        self.pool = pool
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.pool[self.codes[i]]
+
+    def __iter__(self):
+        pool = self.pool
+        return (pool[c] for c in self.codes)
+
+    def distinct(self):
+        """{chuỗi: mã} của các giá trị có trong cột"""
+        return {self.pool[c]: c for c in set(self.codes) if c >= 0}
+
+
+class TableView:
+    """1 bảng trong snapshot: view[cột] -> memoryview kiểu số (không sao chép) hoặc StringColumn"""
+    def __init__(self, name, rows, columns):
+        self.name = name
+        self.rows = rows
+        self.columns = columns
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+
+class Snapshot:
+    """
+    Mở file snapshot bằng mmap (chỉ đọc): chỉ đọc manifest, các cột là memoryview trỏ thẳng vào
+    trang của file -> mở gần như tức thời, hệ điều hành nạp trang khi cột được duyệt tới.
+    Sau close() các cột (kể cả RoomColumns của rooms()) không dùng được nữa; kết quả của
+    open_folios() / conflict_ids() là bản sao nên vẫn dùng được.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._views = []            # Mọi memoryview đã tạo trên mmap -> close() giải phóng hết
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} không phải snapshot")
+        (size,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        head = len(MAGIC) + 4
+        self.manifest = json.loads(self._mm[head:head + size].decode("utf-8"))
+        if self.manifest["version"] != VERSION or self.manifest["byteorder"] != sys.byteorder:
+            self.close()
+            raise ValueError("Snapshot khác phiên bản hoặc thứ tự byte")
+
+        base = head + size + (-(head + size)) % ALIGN
+        self._buf = memoryview(self._mm)
+        st = self.manifest["strings"]
+        offsets = self._view(base + st["offsets"], st["count"] + 1, 'q')
+        blob = self._buf[base + st["blob"]:base + st["blob"] + st["blob_size"]]
+        self._views.append(blob)
+        self.strings = StringPool(offsets, blob)
+
+        self.tables = {}
+        for name, meta in self.manifest["tables"].items():
+            columns = {}
+            for col, c in meta["columns"].items():
+                view = self._view(base + c["offset"], c["length"], COLUMN_TYPES[c["type"]])
+                columns[col] = StringColumn(view, self.strings) if c["type"] == "str" else view
+            self.tables[name] = TableView(name, meta["rows"], columns)
+
+    def _view(self, offset, length, code):
+        size = array(code).itemsize
+        raw = self._buf[offset:offset + length * size]
+        view = raw.cast(code)
+        self._views += [raw, view]
+        return view
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def close(self):
+        """
+        Giải phóng mọi memoryview đã tạo rồi đóng mmap. Nếu người gọi còn giữ view tự cắt thêm
+        (vd col[10:20]) thì mmap chưa đóng được ngay: vùng nhớ được trả khi view cuối cùng bị hủy.
+        """
+        self.tables = {}
+        self.strings = None
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if getattr(self, "_buf", None) is not None:
+            self._buf.release()
+            self._buf = None
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def room_types(self):
+        lp = self["LoaiPhong"]
+        return {tid: (lp["TenLP"][i], lp["GiaTheoNgay"][i], lp["SucChua"][i]) for i, tid in enumerate(lp["MaLP"])}
+
+    def rooms(self):
+        """Phòng dạng cột cho HotelAlgorithms.analyze_availability (không tạo đối tượng Room)"""
+        p = self["Phong"]
+        return RoomColumns(id=p["SoPhong"], status_code=p["TrangThai"].codes, type_id=p["MaLP"],
+                           statuses=p["TrangThai"].distinct(), types=self.room_types())
+
+    def conflict_ids(self, s_date, e_date):
+        """Phòng bị trùng lịch trong [s_date, e_date) - cùng điều kiện với RoomRepository.get_conflict_ids"""
+        pd = self["PhieuDatPhong"]
+        active = {self.strings.code(s) for s in ('Đã cọc', 'Đã xác nhận', 'Đang ở')} - {None}
+        s, e = s_date.toordinal(), e_date.toordinal()
+        return {rid for rid, st, d_in, d_out in zip(pd["SoPhong"], pd["TrangThaiDat"].codes, pd["NgayDen"], pd["NgayDi"])
+                if st in active and d_in < e and d_out > s}
+
+    def open_folios(self):
+        """
+        Hóa đơn chưa thanh toán của phòng đang ở + dịch vụ của chúng dạng cột
+        (FolioColumns cho HotelAlgorithms.calculate_bills). Tra phiếu / phòng bằng bisect trên cột đã sắp.
+        """
+        hd, pd, p, ct, dv = (self[t] for t in ("HoaDon", "PhieuDatPhong", "Phong", "ChiTietSD", "DichVu"))
+        unpaid = self.strings.code('Chưa thanh toán')
+        occupied = self.strings.code('Đang ở')
+        types = self.room_types()
+        services = {sid: (dv["TenDV"][i], dv["Gia"][i]) for i, sid in enumerate(dv["MaDV"])}
+        pd_ids, room_ids, ct_pd = pd["MaPD"], p["SoPhong"], ct["MaPD"]
+
+        cols = FolioColumns(ma_hd=array('q'), ma_pd=array('q'), room_id=array('q'), check_in=array('q'),
+                            room_price=array('d'), svc_ma_pd=array('q'), svc_name=[], svc_qty=array('q'),
+                            svc_price=array('d'))
+        for i, st in enumerate(hd["TrangThaiHD"].codes):
+            if st != unpaid:
+                continue
+            ma_pd = hd["MaPD"][i]
+            j = bisect.bisect_left(pd_ids, ma_pd)
+            if j == len(pd_ids) or pd_ids[j] != ma_pd:
+                continue
+            rid = pd["SoPhong"][j]
+            k = bisect.bisect_left(room_ids, rid)
+            if k == len(room_ids) or room_ids[k] != rid or p["TrangThai"].codes[k] != occupied:
+                continue
+
+            cols.ma_hd.append(hd["MaHD"][i])
+            cols.ma_pd.append(ma_pd)
+            cols.room_id.append(rid)
+            cols.check_in.append(hd["NgayTao"][i])
+            cols.room_price.append(types[p["MaLP"][k]][1])
+            for m in range(bisect.bisect_left(ct_pd, ma_pd), bisect.bisect_right(ct_pd, ma_pd)):
+                name, price = services[ct["MaDV"][m]]
+                cols.svc_ma_pd.append(ma_pd)
+                cols.svc_name.append(name)
+                cols.svc_qty.append(ct["SoLuong"][m])
+                cols.svc_price.append(price)
+        return cols
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot dạng cột (mmap) của phòng, phiếu đặt, hóa đơn, dịch vụ")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="Xuất snapshot từ CSDL")
+    p_export.add_argument("path")
+    p_export.add_argument("--sqlite", help="Đọc từ file SQLite (datagen --sqlite) thay vì SQL Server")
+    p_info = sub.add_parser("info", help="Thông tin các bảng / cột")
+    p_info.add_argument("path")
+    p_audit = sub.add_parser("audit", help="Tính tiền tạm toàn bộ phòng đang ở từ snapshot")
+    p_audit.add_argument("path")
+    p_avail = sub.add_parser("availability", help="Phòng trống theo loại trong khoảng ngày")
+    p_avail.add_argument("path")
+    p_avail.add_argument("--from", dest="start", required=True)
+    p_avail.add_argument("--to", dest="end", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        if args.sqlite:
+            from sqlite_standin import SQLiteStandIn
+            pool = SQLiteStandIn(args.sqlite)
+        else:
+            from database import DatabaseManager
+            pool = DatabaseManager().get_pool()
+        m = export_snapshot(pool, args.path)
+        rows = {t: meta["rows"] for t, meta in m["tables"].items()}
+        print(f"Đã ghi {args.path}: {m['size'] / 1e6:.1f} MB, {rows}, "
+              f"{m['strings']['count']} chuỗi ({m['elapsed_ms']:.0f} ms)")
+        return
+
+    start = time.perf_counter()
+    with Snapshot(args.path) as snap:
+        opened = (time.perf_counter() - start) * 1000
+        if args.command == "info":
+            print(f"Mở trong {opened:.2f} ms, tạo lúc {snap.manifest['created']}, {snap.manifest['strings']['count']} chuỗi")
+            for name, meta in snap.manifest["tables"].items():
+                cols = ", ".join(f"{c}:{m['type']}" for c, m in meta["columns"].items())
+                print(f"  {name:<15} {meta['rows']:>10,} dòng  {cols}")
+        elif args.command == "audit":
+            from services import HotelAlgorithms
+            batch = HotelAlgorithms.calculate_bills(snap.open_folios())
+            t = batch.totals()
+            print(f"{t['stays']} phòng đang ở | phòng {t['room_total']:,.0f} | dịch vụ {t['service_total']:,.0f} | "
+                  f"tổng {t['grand_total']:,.0f} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        else:
+            from services import HotelAlgorithms
+            s_date, e_date = date.fromisoformat(args.start), date.fromisoformat(args.end)
+            stats = HotelAlgorithms.analyze_availability(snap.rooms(), snap.conflict_ids(s_date, e_date))
+            for st in sorted(stats, key=lambda x: x["id"]):
+                print(f"  {st['name']:<10} {st['count']:>6} phòng trống  ({st['price']:,.0f}đ, {st['cap']} người)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import random
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+
+class TSQLCursor:
+    """Cursor SQLite nhận câu lệnh viết cho SQL Server: bỏ tiền tố N'', chuyển TOP thành LIMIT"""
+    _TOP = re.compile(r"\bTOP\s*\(?(\?|\d+)\)?\s*", re.IGNORECASE)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        query = re.sub(r"\bN'", "'", query)
+        params = list(params)
+        m = self._TOP.search(query)
+        if m:
+            query = query[:m.start()] + query[m.end():]
+            limit = params.pop(0) if m.group(1) == "?" else int(m.group(1))
+            query = query.rstrip().rstrip(";") + " LIMIT ?"
+            params.append(limit)
+        self._cursor.execute(query, params)
+        return self
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(re.sub(r"\bN'", "'", query), rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TSQLConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return TSQLCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SQLiteStandIn:
+    """
+    CSDL SQLite (file tạm) thay cho SQL Server để đo các Repository mà không cần máy chủ.
+    Cung cấp `connection()` giống ConnectionPool nên truyền thẳng vào RoomRepository / OperationRepository.
+    cold=True: mỗi lần mượn mở kết nối mới (cache trang của SQLite rỗng); False: dùng lại 1 kết nối.
+    """
+    SCHEMA = [
+        "CREATE TABLE KhachHang (MaKH INTEGER PRIMARY KEY, TenKH TEXT, CCCD TEXT UNIQUE, SDT TEXT)",
+        "CREATE TABLE LoaiPhong (MaLP INTEGER PRIMARY KEY, TenLP TEXT, GiaTheoNgay DECIMAL, SucChua INT)",
+        "CREATE TABLE Phong (SoPhong INTEGER PRIMARY KEY, TrangThai TEXT, MaLP INT, GhiChu TEXT DEFAULT '')",
+        "CREATE TABLE PhieuDatPhong (MaPD INTEGER PRIMARY KEY, MaKH INT, SoPhong INT, NgayDen DATE, NgayDi DATE, TrangThaiDat TEXT)",
+        "CREATE TABLE HoaDon (MaHD INTEGER PRIMARY KEY, NgayTao TIMESTAMP, MaPD INT, TongTien DECIMAL DEFAULT 0, "
+        "PhuThu DECIMAL DEFAULT 0, TrangThaiHD TEXT DEFAULT 'Chưa thanh toán')",
+        "CREATE TABLE DichVu (MaDV INTEGER PRIMARY KEY, TenDV TEXT, Gia DECIMAL)",
+        "CREATE TABLE ChiTietSD (MaSD INTEGER PRIMARY KEY, MaPD INT, MaDV INT, SoLuong INT, ThoiGian TIMESTAMP)",
+        "CREATE TABLE FolioLuuTru (MaPD INTEGER PRIMARY KEY, MaHD INT, SoPhong INT, TenKH TEXT, TenLP TEXT, "
+        "NgayNhan TIMESTAMP, GiaPhong DECIMAL, TongDichVu DECIMAL DEFAULT 0, ChiTietDV TEXT DEFAULT '[]', CapNhat TIMESTAMP)",
+        "CREATE TABLE DoanhThuNgay (Ngay DATE, MaLP INT, SoPhong INT, DemDaBan INT, TienPhong DECIMAL, PhuThu DECIMAL, "
+        "DoanhThuDV DECIMAL, SoLuotTra INT, PRIMARY KEY (Ngay, MaLP))",
+        "CREATE TABLE DoanhThuDichVuNgay (Ngay DATE, MaDV INT, MaLP INT, SoLuong INT, DoanhThu DECIMAL, "
+        "PRIMARY KEY (Ngay, MaDV, MaLP))",
+    ]
+    ROOM_TYPES = [(1, 'Standard', 300000, 2), (2, 'Superior', 500000, 2), (3, 'Deluxe', 800000, 2),
+                  (4, 'Family', 1200000, 4), (5, 'President', 3000000, 4)]
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(tempfile.mkdtemp(prefix="hotel_bench_"), "hotel.db")
+        self.cold = False
+        self._conn = None
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        return TSQLConnection(conn)
+
+    @contextmanager
+    def connection(self):
+        if self.cold:
+            conn = self._open()
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+        if self._conn is None:
+            self._conn = self._open()
+        yield self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def seed(self, n_rooms, seed=42, today=None):
+        """
+        Dữ liệu giả lập có tính mùa vụ đơn giản: ~35% phòng đang ở (hóa đơn mở + 0-4 dịch vụ),
+        mỗi phòng ~0.8 phiếu đặt trước trong 60 ngày tới. Cùng seed -> cùng dữ liệu.
+        """
+        rng = random.Random(seed)
+        today = today or date.today()
+        now = datetime.now()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for stmt in self.SCHEMA:
+                cursor.execute(stmt)
+            cursor.executemany("INSERT INTO LoaiPhong VALUES (?, ?, ?, ?)", self.ROOM_TYPES)
+            services = [(1, 'Coca Cola', 15000), (2, 'Bia Tiger', 25000), (3, 'Mì tôm trứng', 30000),
+                        (4, 'Giặt ủi', 50000), (5, 'Massage', 200000), (6, 'Thuê xe máy', 150000)]
+            services += [(i, f"Dịch vụ {i}", rng.randint(2, 60) * 5000) for i in range(7, 31)]
+            cursor.executemany("INSERT INTO DichVu VALUES (?, ?, ?)", services)
+
+            rooms, customers, bookings, folios, usages, read_model = [], [], [], [], [], []
+            for room_id in range(101, 101 + n_rooms):
+                status = rng.choices(['Trống', 'Đang ở', 'Đang dọn', 'Bảo trì'], [55, 35, 7, 3])[0]
+                type_id = rng.randint(1, 5)
+                rooms.append((room_id, status, type_id, ''))
+
+                if status == 'Đang ở':
+                    makh = len(customers) + 1
+                    customers.append((makh, f"Khách {makh}", f"{makh:012d}", "0900000000"))
+                    ma_pd = len(bookings) + 1
+                    s = today - timedelta(days=rng.randint(0, 5))
+                    bookings.append((ma_pd, makh, room_id, s, s + timedelta(days=rng.randint(1, 7) + 5), 'Đang ở'))
+                    ma_hd, check_in = len(folios) + 1, now - timedelta(hours=rng.randint(1, 120))
+                    folios.append((ma_hd, check_in, ma_pd))
+                    items = []
+                    for _ in range(rng.randint(0, 4)):
+                        sid, qty = rng.randint(1, len(services)), rng.randint(1, 3)
+                        usages.append((ma_pd, sid, qty, now))
+                        items.append({"name": services[sid - 1][1], "qty": qty, "price": services[sid - 1][2]})
+                    _, type_name, room_price, _ = self.ROOM_TYPES[type_id - 1]
+                    read_model.append((ma_pd, ma_hd, room_id, f"Khách {makh}", type_name, check_in, room_price,
+                                       sum(i["qty"] * i["price"] for i in items),
+                                       json.dumps(items, ensure_ascii=False), now))
+
+                if rng.random() < 0.8:
+                    makh = len(customers) + 1
+                    customers.append((makh, f"Khách {makh}", f"{makh:012d}", "0900000000"))
+                    s = today + timedelta(days=rng.randint(6, 60))
+                    bookings.append((len(bookings) + 1, makh, room_id, s,
+                                     s + timedelta(days=rng.randint(1, 7)), 'Đã xác nhận'))
+
+            cursor.executemany("INSERT INTO Phong VALUES (?, ?, ?, ?)", rooms)
+            cursor.executemany("INSERT INTO KhachHang VALUES (?, ?, ?, ?)", customers)
+            cursor.executemany("INSERT INTO PhieuDatPhong VALUES (?, ?, ?, ?, ?, ?)", bookings)
+            cursor.executemany("INSERT INTO HoaDon (MaHD, NgayTao, MaPD) VALUES (?, ?, ?)", folios)
+            cursor.executemany("INSERT INTO ChiTietSD (MaPD, MaDV, SoLuong, ThoiGian) VALUES (?, ?, ?, ?)", usages)
+            cursor.executemany("INSERT INTO FolioLuuTru VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", read_model)
+            for stmt in ("CREATE INDEX IX_PD_Room ON PhieuDatPhong(SoPhong, TrangThaiDat)",
+                         "CREATE INDEX IX_HD_PD ON HoaDon(MaPD)",
+                         "CREATE INDEX IX_CTSD_PD ON ChiTietSD(MaPD)",
+                         "CREATE INDEX IX_Folio_Room ON FolioLuuTru(SoPhong)",
+                         "CREATE INDEX IX_Phong_MaLP ON Phong(MaLP)"):
+                cursor.execute(stmt)
+            conn.commit()
+        return {"rooms": len(rooms), "customers": len(customers), "bookings": len(bookings),
+                "folios": len(folios), "service_usages": len(usages)}
@@ -0,0 +1,146 @@
+import sys
+import threading
+
+
+class StreamConfig:
+    ARRAYSIZE = 500                 # Số dòng mỗi lần fetchmany ban đầu
+    MAX_BATCH_BYTES = 1 << 20       # Trần bộ nhớ ước lượng của 1 lô (~1 MB) -> giới hạn đỉnh bộ nhớ
+    MIN_ARRAYSIZE = 50
+    MAX_ARRAYSIZE = 20000
+    SAMPLE_ROWS = 32                # Số dòng đầu mỗi lô dùng để ước lượng kích thước
+
+
+def pack_params(params):
+    """Tham số kiểu pyodbc `execute(sql, *params)` (1 dãy / nhiều giá trị rời / không có) -> dãy hoặc None"""
+    if not params:
+        return None
+    return params[0] if len(params) == 1 else params
+
+
+def execute(cursor, sql, params=None):
+    """cursor.execute với tham số tùy chọn: params=None -> gọi không kèm tham số"""
+    if params is None:
+        return cursor.execute(sql)
+    return cursor.execute(sql, params)
+
+
+def row_bytes(row):
+    """Kích thước ước lượng (byte) của 1 dòng trong bộ nhớ Python: tuple/Row + từng giá trị"""
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+
+
+def batch_bytes(rows, sample=StreamConfig.SAMPLE_ROWS):
+    """Ước lượng kích thước 1 lô từ `sample` dòng đầu (không duyệt cả lô)"""
+    if not rows:
+        return 0
+    head = rows[:sample]
+    return sum(row_bytes(r) for r in head) * len(rows) // len(head)
+
+
+class _StreamStat:
+    __slots__ = ("streams", "rows", "batches", "bytes", "peak_batch_rows", "peak_batch_bytes", "arraysize")
+
+    def __init__(self):
+        self.streams = 0
+        self.rows = 0
+        self.batches = 0
+        self.bytes = 0
+        self.peak_batch_rows = 0
+        self.peak_batch_bytes = 0
+        self.arraysize = 0
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class StreamStats:
+    """Số liệu đọc dạng luồng theo tên (thao tác): số luồng, dòng, lô, byte ước lượng, lô lớn nhất"""
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        stat = self._stats.get(name)
+        if stat is None:
+            stat = self._stats[name] = _StreamStat()
+        return stat
+
+    def start(self, name):
+        with self._lock:
+            self._get(name).streams += 1
+
+    def record_batch(self, name, rows, nbytes, arraysize):
+        with self._lock:
+            stat = self._get(name)
+            stat.rows += rows
+            stat.batches += 1
+            stat.bytes += nbytes
+            stat.peak_batch_rows = max(stat.peak_batch_rows, rows)
+            stat.peak_batch_bytes = max(stat.peak_batch_bytes, nbytes)
+            stat.arraysize = arraysize
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: s.to_dict() for name, s in self._stats.items()}
+
+
+# Nơi ghi mặc định khi cursor không được đo (không bọc bởi instrumentation.InstrumentedCursor)
+stream_stats = StreamStats()
+
+
+def _tune(arraysize, nbytes, rows, max_batch_bytes):
+    """Số dòng lô sau sao cho kích thước ước lượng ~ max_batch_bytes"""
+    if not rows or not nbytes:
+        return arraysize
+    target = max_batch_bytes * rows // nbytes
+    return max(StreamConfig.MIN_ARRAYSIZE, min(StreamConfig.MAX_ARRAYSIZE, target))
+
+
+def iter_batches(cursor, arraysize=None, max_batch_bytes=None, name="stream", stats=None):
+    """
+    Đọc kết quả của cursor (đã execute) theo từng lô fetchmany thay vì fetchall.
+    - arraysize: số dòng lô đầu (mặc định StreamConfig.ARRAYSIZE). Sau mỗi lô, số dòng được chỉnh lại
+      theo kích thước dòng thực tế để 1 lô không vượt max_batch_bytes -> bộ nhớ đỉnh chỉ ~1 lô.
+    - max_batch_bytes=0: giữ cố định arraysize.
+    - Số liệu (dòng, byte ước lượng, lô) ghi vào `stats`, mặc định là Metrics.streams của cursor được đo
+      hoặc stream_stats của module.
+    Phải đọc hết (hoặc close() generator) trước khi execute câu khác trên cùng cursor.
+    """
+    size = arraysize or StreamConfig.ARRAYSIZE
+    limit = StreamConfig.MAX_BATCH_BYTES if max_batch_bytes is None else max_batch_bytes
+    if stats is None:
+        stats = getattr(cursor, "stream_stats", None) or stream_stats
+    stats.start(name)
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        nbytes = batch_bytes(rows)
+        stats.record_batch(name, len(rows), nbytes, size)
+        yield rows
+        if len(rows) < size:
+            return
+        if limit:
+            size = _tune(size, nbytes, len(rows), limit)
+
+
+def iter_rows(cursor, arraysize=None, max_batch_bytes=None, name="stream", stats=None):
+    """Như iter_batches nhưng trả từng dòng"""
+    for rows in iter_batches(cursor, arraysize, max_batch_bytes, name, stats):
+        yield from rows
+
+
+def stream_query(pool, sql, params=None, arraysize=None, max_batch_bytes=None, name="stream", stats=None):
+    """
+    Generator trả từng dòng của 1 câu SELECT, đọc theo lô.
+    Kết nối được mượn từ pool trong suốt quá trình duyệt và trả lại khi duyệt xong hoặc generator bị
+    close() (dùng `with contextlib.closing(...)` nếu có thể dừng giữa chừng).
+    """
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        execute(cursor, sql, params)
+        yield from iter_rows(cursor, arraysize, max_batch_bytes, name, stats)
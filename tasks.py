@@ -0,0 +1,92 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+
+class TaskRunner:
+    """
+    Chạy công việc nặng (truy vấn DB, thuật toán) trên ThreadPoolExecutor để không khóa luồng Tk.
+    - Kết quả được đẩy vào Queue và luồng giao diện lấy ra bằng after() -> callback luôn chạy trên luồng Tk.
+    - Mỗi task có thể gắn `key`: task mới cùng key sẽ hủy task cũ (nếu chưa chạy)
+      và kết quả của task cũ bị bỏ qua (VD: người dùng gõ lại bộ lọc).
+    - `on_busy_change(bool)` được gọi khi chuyển giữa trạng thái rảnh / đang xử lý.
+    """
+    def __init__(self, root, max_workers=4, poll_ms=30, on_busy_change=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_busy_change = on_busy_change
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hotel-task")
+        self._results = queue.Queue()
+        self._latest = {}       # key -> (generation, future)
+        self._generation = 0
+        self._pending = 0
+        self._closed = False
+
+        self.root.after(self.poll_ms, self._poll)
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None):
+        """Gửi fn(*args) sang luồng nền. on_done(result) / on_error(exc) chạy trên luồng Tk"""
+        if self._closed:
+            return None
+        self._generation += 1
+        gen = self._generation
+
+        if key is not None:
+            self.cancel(key)
+
+        future = self._executor.submit(fn, *args)
+        if key is not None:
+            self._latest[key] = (gen, future)
+
+        self._set_pending(self._pending + 1)
+        future.add_done_callback(lambda f: self._results.put((key, gen, f, on_done, on_error)))
+        return future
+
+    def cancel(self, key):
+        """Hủy task đang chờ của key (task đang chạy dở sẽ bị bỏ qua kết quả)"""
+        entry = self._latest.pop(key, None)
+        if entry:
+            entry[1].cancel()
+
+    def _poll(self):
+        if self._closed:
+            return
+        while True:
+            try:
+                key, gen, future, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._set_pending(self._pending - 1)
+
+            if key is not None:
+                latest = self._latest.get(key)
+                if latest is None or latest[0] != gen:
+                    continue        # Đã bị task mới hơn thay thế
+                del self._latest[key]
+
+            try:
+                result = future.result()
+            except CancelledError:
+                continue
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+                continue
+            if on_done:
+                on_done(result)
+
+        self.root.after(self.poll_ms, self._poll)
+
+    def _set_pending(self, value):
+        was_busy = self._pending > 0
+        self._pending = value
+        if self.on_busy_change and was_busy != (value > 0):
+            self.on_busy_change(value > 0)
+
+    def shutdown(self):
+        self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,21 @@
+import pytest
+
+from sqlite_standin import SQLiteStandIn
+
+
+@pytest.fixture(scope="session")
+def seeded_db(tmp_path_factory):
+    """CSDL SQLite dựng bằng SQLiteStandIn.seed (cùng schema với các Repository), dùng chung cả phiên"""
+    db = SQLiteStandIn(str(tmp_path_factory.mktemp("db") / "hotel.db"))
+    db.seed(300, seed=7)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def fresh_db(tmp_path):
+    """Như seeded_db nhưng riêng cho từng test - dùng cho test có ghi dữ liệu"""
+    db = SQLiteStandIn(str(tmp_path / "hotel.db"))
+    db.seed(120, seed=11)
+    yield db
+    db.close()
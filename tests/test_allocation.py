@@ -0,0 +1,88 @@
+import random
+from collections import Counter
+
+import pytest
+
+from allocation import RoomAllocator, RoomLayout
+
+
+def random_case(rng, layout):
+    floors = rng.randint(1, 6)
+    candidates = []
+    for floor in range(1, floors + 1):
+        for pos in rng.sample(range(1, 30), rng.randint(0, 12)):
+            candidates.append((floor * layout.rooms_per_floor + pos, rng.randint(1, 3)))
+    need = {t: rng.randint(0, 4) for t in rng.sample([1, 2, 3], rng.randint(1, 3))}
+    return candidates, need
+
+
+def covers(rooms, need):
+    have = Counter(t for _, t in rooms)
+    return all(have[t] >= q for t, q in need.items())
+
+
+def brute_best_corridor_span(candidates, need, layout):
+    """Đoạn hành lang ngắn nhất đủ phòng: thử mọi cặp (trái, phải) trên từng hành lang"""
+    corridors = {}
+    for rid, t in candidates:
+        floor, wing, pos = layout.locate(rid)
+        corridors.setdefault((floor, wing), []).append((pos, t))
+    best = None
+    for rooms in corridors.values():
+        rooms.sort()
+        for i in range(len(rooms)):
+            for j in range(i, len(rooms)):
+                if covers(rooms[i:j + 1], need):
+                    span = rooms[j][0] - rooms[i][0]
+                    best = span if best is None else min(best, span)
+    return best
+
+
+def brute_best_floor_band(candidates, need, layout):
+    """Số tầng ít nhất của 1 dải tầng liên tiếp đủ phòng"""
+    floors = sorted({layout.locate(rid)[0] for rid, _ in candidates})
+    best = None
+    for i, lo in enumerate(floors):
+        for hi in floors[i:]:
+            rooms = [(rid, t) for rid, t in candidates if lo <= layout.locate(rid)[0] <= hi]
+            if covers(rooms, need):
+                best = hi - lo + 1 if best is None else min(best, hi - lo + 1)
+    return best
+
+
+@pytest.mark.parametrize("wing_size", [None, 10])
+def test_allocate_matches_brute_force(wing_size):
+    rng = random.Random(wing_size or 0)
+    layout = RoomLayout(rooms_per_floor=100, wing_size=wing_size)
+    allocator = RoomAllocator(layout)
+    for _ in range(300):
+        candidates, need = random_case(rng, layout)
+        need_pos = {t: q for t, q in need.items() if q > 0}
+        got = allocator.allocate(candidates, need)
+
+        if not need_pos or not covers(candidates, need_pos):
+            assert got is None
+            continue
+
+        # Hợp lệ: phòng thuộc danh sách trống, không trùng, đúng số lượng từng loại
+        types = dict(candidates)
+        assert len(set(got["rooms"])) == len(got["rooms"])
+        assert Counter(types[r] for r in got["rooms"]) == Counter(need_pos)
+
+        locations = [layout.locate(r) for r in got["rooms"]]
+        assert got["floors"] == len({f for f, _, _ in locations})
+        assert got["corridors"] == len({(f, w) for f, w, _ in locations})
+
+        span = brute_best_corridor_span(candidates, need_pos, layout)
+        if span is not None:
+            assert got["corridors"] == 1 and got["span"] == span
+            assert max(p for _, _, p in locations) - min(p for _, _, p in locations) <= span
+        else:
+            floors = [f for f, _, _ in locations]
+            assert max(floors) - min(floors) + 1 <= brute_best_floor_band(candidates, need_pos, layout)
+
+
+def test_overrides_place_irregular_rooms():
+    layout = RoomLayout(overrides={9001: (3, 0, 4), 9002: (3, 0, 5)})
+    got = RoomAllocator(layout).allocate([(9001, 1), (9002, 1), (110, 1), (250, 1)], {1: 2})
+    assert got["rooms"] == [9001, 9002] and got["span"] == 1
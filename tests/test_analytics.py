@@ -0,0 +1,62 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from analytics import AnalyticsRepository, stay_contributions
+from repositories import OperationRepository
+from services import HotelAlgorithms
+
+
+def test_stay_contributions_splits_room_and_books_extras_on_checkout_day():
+    rows = stay_contributions(datetime(2024, 3, 30, 14, 0), 3, 500000, surcharge=20000, service_total=75000)
+    assert rows == {
+        date(2024, 3, 30): [1, 500000.0, 0.0, 0.0, 0],
+        date(2024, 3, 31): [1, 500000.0, 0.0, 0.0, 0],
+        date(2024, 4, 1): [1, 500000.0, 0.0, 0.0, 0],
+        date(2024, 4, 2): [0, 0.0, 20000.0, 75000.0, 1],
+    }
+
+
+def test_stay_contributions_same_day_and_early_checkout():
+    # 0 đêm vẫn tính 1 đêm; trả phòng sớm thì dịch vụ rơi vào ngày trả thực tế (trùng 1 đêm đã bán)
+    assert stay_contributions(date(2024, 1, 1), 0, 300000) == {
+        date(2024, 1, 1): [1, 300000.0, 0.0, 0.0, 0],
+        date(2024, 1, 2): [0, 0.0, 0.0, 0.0, 1],
+    }
+    rows = stay_contributions(date(2024, 1, 1), 2, 300000, service_total=10, check_out=datetime(2024, 1, 2, 9))
+    assert rows[date(2024, 1, 2)] == [1, 300000.0, 0.0, 10.0, 1]
+
+
+def _rollups(db):
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT Ngay, MaLP, SoPhong, DemDaBan, TienPhong, PhuThu, DoanhThuDV, SoLuotTra "
+                       "FROM DoanhThuNgay ORDER BY Ngay, MaLP")
+        daily = [(*r[:4], pytest.approx(float(r[4])), pytest.approx(float(r[5])), pytest.approx(float(r[6])), r[7])
+                 for r in cursor.fetchall()]
+        cursor.execute("SELECT Ngay, MaDV, MaLP, SoLuong, DoanhThu FROM DoanhThuDichVuNgay ORDER BY Ngay, MaDV, MaLP")
+        services = [(*r[:4], pytest.approx(float(r[4]))) for r in cursor.fetchall()]
+    return daily, services
+
+
+def test_checkout_rollup_matches_rebuild(fresh_db):
+    repo = OperationRepository(fresh_db)
+    with fresh_db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT SoPhong FROM FolioLuuTru ORDER BY SoPhong")
+        rooms = [r[0] for r in cursor.fetchall()]
+
+    # Trả phòng đúng số đêm nguyên -> ngày trả trùng với ngày rebuild suy ra (ngày nhận + số đêm)
+    for i, room_id in enumerate(rooms):
+        raw, _ = repo.get_folio(room_id)
+        bill = HotelAlgorithms.calculate_bill(raw, raw["check_in"] + timedelta(days=1 + i % 4))
+        ok, msg = repo.checkout(room_id, bill, surcharge=10000 * (i % 3))
+        assert ok, msg
+
+    daily, services = _rollups(fresh_db)
+    assert sum(r[7] for r in daily) == len(rooms)
+    assert max(r[3] for r in daily) > 1 and services  # có dòng được cộng dồn từ nhiều lượt checkout
+
+    ok, res = AnalyticsRepository(fresh_db).rebuild()
+    assert ok and res["stays"] == len(rooms)
+    assert _rollups(fresh_db) == (daily, services)
@@ -0,0 +1,180 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from availability import AvailabilityIndex, OccupancyMatrix, popcount
+
+TODAY = date(2026, 3, 1)
+
+
+def random_bookings(rng, n, rooms, span=60, max_len=10):
+    bookings = []
+    for ma_pd in range(1, n + 1):
+        s = TODAY + timedelta(days=rng.randint(-span // 2, span))
+        bookings.append((ma_pd, rng.choice(rooms), s, s + timedelta(days=rng.randint(1, max_len))))
+    return bookings
+
+
+def brute_conflicts(bookings, s, e):
+    """Định nghĩa gốc: phiếu giao [s, e) khi NgayDen < e và NgayDi > s"""
+    return {rid for _, rid, bs, be in bookings if bs < e and be > s}
+
+
+def random_windows(rng, k=200):
+    for _ in range(k):
+        s = TODAY + timedelta(days=rng.randint(-45, 75))
+        yield s, s + timedelta(days=rng.randint(1, 14))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_conflict_ids_match_brute_force(seed):
+    rng = random.Random(seed)
+    rooms = list(range(101, 141))
+    bookings = random_bookings(rng, 300, rooms)
+    index = AvailabilityIndex()
+    index.load(bookings)
+    for s, e in random_windows(rng):
+        assert index.conflict_ids(s, e) == brute_conflicts(bookings, s, e)
+
+
+def test_add_remove_keep_index_consistent():
+    rng = random.Random(42)
+    rooms = list(range(101, 121))
+    live = {b[0]: b for b in random_bookings(rng, 100, rooms)}
+    index = AvailabilityIndex()
+    index.load(live.values())
+    next_pd = len(live) + 1
+
+    for step in range(400):
+        if live and rng.random() < 0.5:
+            ma_pd = rng.choice(list(live))
+            assert index.remove(ma_pd)
+            del live[ma_pd]
+        else:
+            # Có cả phiếu dài bất thường để kiểm tra cập nhật max_len khi thêm / xóa
+            _, rid, s, e = random_bookings(rng, 1, rooms, max_len=rng.choice([3, 30]))[0]
+            live[next_pd] = (next_pd, rid, s, e)
+            index.add(next_pd, rid, s, e)
+            next_pd += 1
+        if step % 20 == 0:
+            for s, e in random_windows(rng, 20):
+                assert index.conflict_ids(s, e) == brute_conflicts(live.values(), s, e)
+
+    assert len(index) == len(live)
+    assert not index.remove(-1)
+
+
+def test_add_same_booking_replaces_old_dates():
+    index = AvailabilityIndex()
+    index.add(1, 101, "2026-03-01", "2026-03-05")
+    index.add(1, 101, "2026-03-10", "2026-03-12")
+    assert len(index) == 1
+    assert index.is_free(101, "2026-03-01", "2026-03-05")
+    assert not index.is_free(101, "2026-03-11", "2026-03-20")
+
+
+def test_empty_stays_are_ignored():
+    index = AvailabilityIndex()
+    index.load([(1, 101, TODAY, TODAY)])
+    index.add(2, 102, TODAY + timedelta(days=2), TODAY)
+    assert len(index) == 0
+
+
+# --- OccupancyMatrix ---
+def test_popcount():
+    rng = random.Random(0)
+    for x in [0, 1, (1 << 4000) - 1] + [rng.getrandbits(rng.randint(1, 3000)) for _ in range(50)]:
+        assert popcount(x) == bin(x).count("1")
+
+
+ROOMS = [(100 + i, i % 3) for i in range(40)]     # (SoPhong, MaLP)
+
+
+def nights(s, e):
+    d = s
+    while d < e:
+        yield d
+        d += timedelta(days=1)
+
+
+def brute_free(bookings, s, e, type_id=None, out_of_service=()):
+    """Số phòng trống từng đêm + các phòng trống mọi đêm, tính thẳng từ danh sách phiếu"""
+    sellable = [rid for rid, tid in ROOMS if (type_id is None or tid == type_id) and rid not in out_of_service]
+    counts, free_all = [], set(sellable)
+    for d in nights(s, e):
+        busy = {rid for _, rid, bs, be in bookings if bs <= d < be}
+        counts.append(sum(1 for rid in sellable if rid not in busy))
+        free_all -= busy
+    return counts, sorted(free_all)
+
+
+@pytest.fixture
+def occupancy():
+    rng = random.Random(3)
+    bookings = [(m, rng.choice(ROOMS)[0], s, s + timedelta(days=rng.randint(1, 10)))
+                for m, s in ((m, TODAY + timedelta(days=rng.randint(-200, 300))) for m in range(300))]
+    matrix = OccupancyMatrix(ROOMS, start_date=TODAY, days=60)
+    matrix.load(bookings)
+    return matrix, bookings, rng
+
+
+def test_free_counts_and_rooms_match_brute_force(occupancy):
+    matrix, bookings, rng = occupancy
+    matrix.set_out_of_service([101, 117])
+    for _ in range(150):
+        # Cả khoảng nằm trong, vắt qua và nằm hẳn ngoài ma trận 60 đêm
+        s = TODAY + timedelta(days=rng.randint(-250, 350))
+        e = s + timedelta(days=rng.randint(1, 40))
+        type_id = rng.choice([None, 0, 1, 2])
+        counts, free = brute_free(bookings, s, e, type_id, out_of_service={101, 117})
+        assert matrix.free_counts(s, e, type_id) == counts
+        assert matrix.free_rooms(s, e, type_id) == free
+
+
+def test_queries_never_grow_matrix(occupancy):
+    matrix, _, _ = occupancy
+    matrix.free_counts(TODAY - timedelta(days=300), TODAY - timedelta(days=200))
+    matrix.free_mask(TODAY + timedelta(days=500), TODAY + timedelta(days=520))
+    matrix.nearest_windows(TODAY + timedelta(days=400), 3, 1, earliest=TODAY)
+    assert matrix.start == TODAY.toordinal() and len(matrix._nights) == 60
+
+
+@pytest.mark.parametrize("s, e", [
+    (TODAY, TODAY),                                                 # khoảng rỗng
+    (TODAY, TODAY + timedelta(days=OccupancyMatrix.MAX_SPAN_DAYS + 1)),
+    (date(2099, 1, 1), date(2099, 1, 3)),                           # ngoài HORIZON_DAYS
+])
+def test_out_of_range_queries_raise(occupancy, s, e):
+    matrix, _, _ = occupancy
+    with pytest.raises(ValueError):
+        matrix.free_counts(s, e)
+
+
+def test_remove_restores_overlapping_booking_bits():
+    matrix = OccupancyMatrix(ROOMS, start_date=TODAY, days=30)
+    matrix.add(1, 100, TODAY, TODAY + timedelta(days=10))
+    matrix.add(2, 100, TODAY + timedelta(days=5), TODAY + timedelta(days=15))
+    assert matrix.remove(1)
+    expected, _ = brute_free([(2, 100, TODAY + timedelta(days=5), TODAY + timedelta(days=15))],
+                             TODAY, TODAY + timedelta(days=20), type_id=0)
+    assert matrix.free_counts(TODAY, TODAY + timedelta(days=20), 0) == expected
+    assert not matrix.remove(1)
+
+
+def test_nearest_windows_match_brute_force(occupancy):
+    matrix, bookings, rng = occupancy
+    for _ in range(30):
+        s = TODAY + timedelta(days=rng.randint(0, 80))
+        stay, quantity, type_id = rng.randint(1, 5), rng.randint(1, 12), rng.choice([None, 0, 1, 2])
+        got = matrix.nearest_windows(s, stay, quantity, type_id, radius=7, limit=4, earliest=TODAY)
+
+        expected = []
+        for offset in sorted(range(-7, 8), key=lambda o: (abs(o), o)):
+            start = s + timedelta(days=offset)
+            if start < TODAY:
+                continue
+            _, free = brute_free(bookings, start, start + timedelta(days=stay), type_id)
+            if len(free) >= quantity:
+                expected.append((start, start + timedelta(days=stay), len(free)))
+        assert got == expected[:4]
@@ -0,0 +1,139 @@
+import random
+
+import pytest
+
+from catalog import NGramIndex, RoomCatalog
+from models import Room
+
+TYPES = [(1, 'Standard', 300000, 2), (2, 'Deluxe', 800000, 2), (3, 'Family', 1200000, 4)]
+STATUSES = ['Trống', 'Đang ở', 'Đang dọn', 'Bảo trì']
+
+
+def random_rooms(rng, n):
+    rooms = []
+    for room_id in rng.sample(range(100, 2000), n):
+        tid, name, price, cap = rng.choice(TYPES)
+        rooms.append(Room(room_id, rng.choice(STATUSES), tid, name, price, cap))
+    return rooms
+
+
+def brute_query(rooms, type_name=None, status=None, text=None, order_by="id", reverse=False):
+    """Lọc + sắp xếp trên toàn bộ danh sách"""
+    key = RoomCatalog.ORDERS[order_by]
+    hits = [r for r in rooms
+            if (type_name is None or r.type_name == type_name)
+            and (status is None or r.status == status)
+            and (not text or text in str(r.id))]
+    return [r.id for r in sorted(hits, key=key, reverse=reverse)]
+
+
+def random_filters(rng):
+    return dict(
+        type_name=rng.choice([None, 'Standard', 'Deluxe', 'Family', 'Không có']),
+        status=rng.choice([None] + STATUSES),
+        text=rng.choice([None, "", "1", "12", "0", "105", "19", "999"]),
+        order_by=rng.choice(list(RoomCatalog.ORDERS)),
+        reverse=rng.random() < 0.5,
+    )
+
+
+def ids(rooms):
+    return [r.id for r in rooms]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_query_matches_brute_force(seed):
+    rng = random.Random(seed)
+    rooms = random_rooms(rng, 300)
+    catalog = RoomCatalog(rooms)
+    for _ in range(100):
+        filters = random_filters(rng)
+        assert ids(catalog.query(**filters)) == brute_query(rooms, **filters)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pages_concatenate_to_full_result(seed):
+    rng = random.Random(seed)
+    rooms = random_rooms(rng, 300)
+    catalog = RoomCatalog(rooms)
+    for _ in range(30):
+        filters = random_filters(rng)
+        limit = rng.randint(1, 40)
+        got, after = [], None
+        while True:
+            page, after = catalog.page(limit, after=after, **filters)
+            assert len(page) <= limit
+            got.extend(ids(page))
+            if after is None:
+                break
+        assert got == brute_query(rooms, **filters)
+
+
+def test_updates_keep_indexes_in_sync():
+    rng = random.Random(9)
+    rooms = {r.id: r for r in random_rooms(rng, 200)}
+    catalog = RoomCatalog(rooms.values())
+
+    for _ in range(300):
+        op = rng.random()
+        room_id = rng.choice(list(rooms))
+        if op < 0.4:
+            status = rng.choice(STATUSES)
+            rooms[room_id].status = status
+            catalog.update_status(room_id, status)
+        elif op < 0.6:
+            # Đổi loại phòng -> đổi giá/sức chứa: phải sắp xếp lại
+            tid, name, price, cap = rng.choice(TYPES)
+            rooms[room_id] = Room(room_id, rooms[room_id].status, tid, name, price, cap)
+            catalog.upsert(rooms[room_id])
+        elif op < 0.8:
+            assert catalog.remove(room_id)
+            del rooms[room_id]
+        else:
+            new = random_rooms(rng, 1)[0]
+            if new.id not in rooms:
+                rooms[new.id] = new
+                catalog.upsert(new)
+
+    assert len(catalog) == len(rooms)
+    for _ in range(50):
+        filters = random_filters(rng)
+        assert ids(catalog.query(**filters)) == brute_query(list(rooms.values()), **filters)
+
+
+def test_sync_applies_changes_and_partial_keeps_absent_rooms():
+    rng = random.Random(1)
+    rooms = random_rooms(rng, 50)
+    catalog = RoomCatalog(rooms)
+    fresh = [Room(r.id, 'Bảo trì', r.type_id, r.type_name, r.price, r.capacity, "hỏng") for r in rooms[:10]]
+
+    # Ghi chú của cả 10 phòng đều đổi -> cả 10 được tính là thay đổi
+    assert catalog.sync(fresh, partial=True) == 10
+    assert len(catalog) == 50
+    assert all(catalog.get(r.id).note == "hỏng" for r in fresh)
+
+    assert catalog.sync(fresh) == 40
+    assert sorted(ids(catalog.rooms())) == sorted(r.id for r in fresh)
+    assert ids(catalog.query(status='Bảo trì')) == sorted(r.id for r in fresh)
+
+
+# --- NGramIndex ---
+NAMES = ["Nguyễn Văn An", "Trần Thị Bình", "Lê Đức Anh", "Phạm Ngọc Ánh", "Đặng Quốc Bảo", "nguyen van a"]
+
+
+def test_ngram_search_and_prefix_match_brute_force():
+    rng = random.Random(5)
+    texts = {i: rng.choice(NAMES) + f" {rng.randint(100, 999)}" for i in range(200)}
+    index = NGramIndex(n=3)
+    for key, text in texts.items():
+        index.add(key, text)
+    for key in rng.sample(list(texts), 50):
+        index.remove(key)
+        del texts[key]
+
+    norm = {k: NGramIndex.normalize(t) for k, t in texts.items()}
+    queries = ["", "a", "an", "nguyen", "Nguyễn Văn", "duc anh", "Đ", "bao 1", "12", "xyz", "ANH"]
+    for q in queries:
+        nq = NGramIndex.normalize(q)
+        assert index.search(q) == {k for k, t in norm.items() if nq in t}
+        assert index.prefix(q) == {k for k, t in norm.items() if t.startswith(nq)}
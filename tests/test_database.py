@@ -0,0 +1,164 @@
+import time
+import sqlite3
+import threading
+
+import pytest
+
+from database import ConnectionPool
+
+
+class StubConnection:
+    """Kết nối giả: đếm rollback/close, có thể giả lập mất kết nối"""
+    def __init__(self):
+        self.rollbacks = 0
+        self.closed = False
+        self.alive = True
+
+    def cursor(self):
+        if not self.alive:
+            raise ConnectionError("mất kết nối")
+        return self
+
+    def execute(self, sql, *params):
+        if not self.alive:
+            raise ConnectionError("mất kết nối")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def rollback(self):
+        if not self.alive:
+            raise ConnectionError("mất kết nối")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def stub_pool(**kwargs):
+    created = []
+
+    def connect():
+        created.append(StubConnection())
+        return created[-1]
+    return ConnectionPool(connect, **kwargs), created
+
+
+@pytest.fixture
+def sqlite_pool(tmp_path):
+    path = tmp_path / "pool.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), max_size=2)
+    yield pool
+    pool.close_all()
+
+
+def count_rows(pool):
+    with pool.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+
+def test_commit_is_kept(sqlite_pool):
+    with sqlite_pool.connection() as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.commit()
+    assert count_rows(sqlite_pool) == 1
+
+
+def test_rollback_on_error(sqlite_pool):
+    with pytest.raises(ZeroDivisionError):
+        with sqlite_pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            1 / 0
+    assert count_rows(sqlite_pool) == 0
+
+
+def test_uncommitted_work_is_rolled_back_on_normal_return(sqlite_pool):
+    with sqlite_pool.connection() as conn:
+        conn.execute("INSERT INTO t VALUES (1)")
+        assert conn.in_transaction
+    # Cùng kết nối được mượn lại: không còn giao dịch dở
+    with sqlite_pool.connection() as conn2:
+        assert conn2 is conn
+        assert not conn2.in_transaction
+    assert count_rows(sqlite_pool) == 0
+
+
+def test_acquire_timeout():
+    pool, _ = stub_pool(max_size=1, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    assert pool.metrics()["timeouts"] == 1
+    pool.release(held)
+    assert pool.acquire() is held
+
+
+def test_waiter_gets_released_connection():
+    pool, created = stub_pool(max_size=1, timeout=2)
+    held = pool.acquire()
+    got = []
+    t = threading.Thread(target=lambda: got.append(pool.acquire()))
+    t.start()
+    time.sleep(0.05)        # để luồng kia kịp vào trạng thái chờ
+    pool.release(held)
+    t.join(1)
+    assert got == [held] and len(created) == 1
+    assert pool.metrics()["waits"] == 1
+
+
+def test_broken_connection_is_replaced():
+    pool, created = stub_pool(max_size=1)
+    with pytest.raises(ConnectionError):
+        with pool.connection() as conn:
+            conn.alive = False
+            conn.execute("SELECT 1")
+    assert created[0].closed
+    assert pool.metrics()["size"] == 0
+
+    with pool.connection() as conn:
+        assert conn is created[1]
+    assert pool.metrics()["created"] == 2
+
+
+def test_failed_health_check_on_error_discards_connection():
+    pool, created = stub_pool(max_size=1)
+
+    class Dead(Exception):
+        pass
+
+    def lost(*args):
+        raise ConnectionError("mất kết nối")
+
+    with pytest.raises(Dead):
+        with pool.connection() as conn:
+            # rollback vẫn chạy được nhưng health_query thì lỗi
+            conn.execute = lost
+            raise Dead()
+    assert created[0].closed
+    assert pool.metrics()["health_failures"] == 1
+
+
+def test_idle_connection_checked_after_health_interval():
+    pool, created = stub_pool(max_size=1, health_interval=0)
+    with pool.connection() as conn:
+        pass
+    conn.alive = False
+    with pool.connection() as conn2:
+        assert conn2 is created[1]
+    assert created[0].closed
+
+
+def test_close_all():
+    pool, created = stub_pool(max_size=2)
+    idle, in_use = pool.acquire(), pool.acquire()
+    pool.release(idle)
+    pool.close_all()
+    assert idle.closed and not in_use.closed
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    # Kết nối trả về sau khi pool đóng bị đóng luôn
+    pool.release(in_use)
+    assert in_use.closed
+    assert pool.metrics()["size"] == 0
@@ -0,0 +1,81 @@
+from instrumentation import InstrumentedPool, Metrics, fingerprint, instrument
+from repositories import RoomRepository
+
+
+class LoopRepository:
+    """Repository mẫu: 1 thao tác đọc giá từng phòng trong vòng lặp (N+1), 1 thao tác đọc 1 lần"""
+    def __init__(self, pool):
+        self.pool = pool
+
+    def prices_one_by_one(self, room_ids):
+        prices = {}
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            for room_id in room_ids:
+                cursor.execute("""
+                    SELECT lp.GiaTheoNgay FROM Phong p JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+                    WHERE p.SoPhong = ?
+                """, (room_id,))
+                prices[room_id] = cursor.fetchone()[0]
+        return prices
+
+    def prices_in_one_query(self, room_ids):
+        marks = ", ".join("?" * len(room_ids))
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT p.SoPhong, lp.GiaTheoNgay FROM Phong p JOIN LoaiPhong lp ON p.MaLP = lp.MaLP
+                WHERE p.SoPhong IN ({marks})
+            """, room_ids)
+            return dict(cursor.fetchall())
+
+    def outer(self, room_ids):
+        # Thao tác lồng: số lần chạy câu SQL của thao tác trong được cộng vào thao tác ngoài cùng
+        for i in range(0, len(room_ids), 4):
+            self.prices_one_by_one(room_ids[i:i + 4])
+
+
+def make_repo(db, **kwargs):
+    metrics = Metrics(**kwargs)
+    return instrument(LoopRepository(InstrumentedPool(db, metrics)), metrics), metrics
+
+
+def test_looped_query_is_flagged_as_n_plus_one(seeded_db):
+    repo, metrics = make_repo(seeded_db, n_plus_one=10)
+    rooms = list(range(101, 113))
+    assert repo.prices_one_by_one(rooms) == repo.prices_in_one_query(rooms)
+
+    [entry] = metrics.snapshot()["n_plus_one"]
+    assert entry["operation"] == "LoopRepository.prices_one_by_one"
+    assert entry["executions"] == len(rooms)
+    assert "WHERE p.SoPhong = ?" in entry["sql"]
+
+    snap = metrics.snapshot()
+    assert snap["queries"][entry["qid"]]["calls"] == len(rooms)
+    assert snap["queries"][entry["qid"]]["rows"] == len(rooms)
+    assert snap["operations"]["LoopRepository.prices_in_one_query"]["rows"] == len(rooms)
+    assert 'hotel_n_plus_one_total{operation="LoopRepository.prices_one_by_one"} 1' in metrics.to_prometheus()
+
+
+def test_below_threshold_and_nested_operations(seeded_db):
+    repo, metrics = make_repo(seeded_db, n_plus_one=10)
+    repo.prices_one_by_one(list(range(101, 110)))
+    assert metrics.snapshot()["n_plus_one"] == []
+
+    # Mỗi lần gọi trong chỉ 4 câu, nhưng thao tác ngoài cùng chạy tổng cộng 12 câu
+    repo.outer(list(range(101, 113)))
+    [entry] = metrics.snapshot()["n_plus_one"]
+    assert entry["operation"] == "LoopRepository.outer" and entry["executions"] == 12
+    assert metrics.snapshot()["operations"]["LoopRepository.prices_one_by_one"]["calls"] == 1 + 3  # vẫn đo riêng
+
+
+def test_set_based_repository_is_not_flagged(seeded_db):
+    metrics = Metrics(n_plus_one=2)
+    repo = instrument(RoomRepository(InstrumentedPool(seeded_db, metrics)), metrics)
+    repo.get_by_ids(list(range(101, 101 + RoomRepository.ID_CHUNK)))
+    assert metrics.snapshot()["n_plus_one"] == []
+
+
+def test_fingerprint_groups_in_lists():
+    assert fingerprint("SELECT *  FROM Phong\n WHERE SoPhong IN (?, ?, ?)") == \
+        fingerprint("SELECT * FROM Phong WHERE SoPhong IN (?, ?)")
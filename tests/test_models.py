@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from models import Room, RoomTable
+
+TYPES = [(1, 'Standard', 300000, 2), (2, 'Deluxe', 800000, 2), (3, 'Family', 1200000, 4)]
+STATUSES = ['Trống', 'Đang ở', 'Đang dọn', 'Bảo trì']
+
+
+def random_room(rng, room_id):
+    type_id, type_name, price, capacity = rng.choice(TYPES)
+    return Room(room_id, rng.choice(STATUSES), type_id, type_name, price, capacity, rng.choice(["", "", "VIP"]))
+
+
+def as_tuple(room):
+    return (room.id, room.status, room.type_id, room.type_name, room.price, room.capacity, room.note)
+
+
+def check(table, expected):
+    """Bảng khớp với dict mô hình: cùng tập phòng, mỗi dòng đúng thuộc tính, _pos trỏ đúng vị trí"""
+    assert len(table) == len(expected)
+    assert sorted(table.id) == sorted(expected)
+    assert all(table._pos[rid] == i for i, rid in enumerate(table.id))
+    for row in table:
+        assert as_tuple(row) == as_tuple(expected[row.id])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_swap_remove_matches_model(seed):
+    rng = random.Random(seed)
+    table, expected = RoomTable(), {}
+    for step in range(400):
+        op = rng.random()
+        if op < 0.45 or not expected:
+            room = random_room(rng, rng.randint(100, 160))
+            table.put(room)
+            expected[room.id] = room
+        elif op < 0.8:
+            room_id = rng.choice(list(expected))
+            table.remove(room_id)
+            del expected[room_id]
+            assert room_id not in table and table.get(room_id) is None
+        else:
+            room_id = rng.choice(list(expected))
+            status, note = rng.choice(STATUSES), rng.choice(["", "Hỏng điều hòa"])
+            row = table.get(room_id)
+            row.status, row.note = status, note
+            expected[room_id].status, expected[room_id].note = status, note
+        check(table, expected)
+
+
+def test_remove_last_and_only_row():
+    table = RoomTable([(101, 'Trống', 1, 'Standard', 300000, 2, 'x'), (102, 'Đang ở', 2, 'Deluxe', 800000, 2)])
+    row = table.get(101)
+    table.remove(102)
+    assert list(table.id) == [101] and row.status == 'Trống' and row.note == 'x'
+    table.remove(101)
+    assert len(table) == 0 and table.notes == {} and table._pos == {}
+
+
+def test_take_keeps_order_and_is_independent():
+    rng = random.Random(3)
+    rooms = [random_room(rng, rid) for rid in range(101, 131)]
+    table = RoomTable()
+    for room in rooms:
+        table.put(room)
+    table.remove(105)
+    table.get(110).status = 'Bảo trì'
+
+    wanted = [129, 110, 101, 117]
+    sub = table.take(wanted)
+    assert list(sub.id) == wanted
+    assert [as_tuple(r) for r in sub] == [as_tuple(table.get(rid)) for rid in wanted]
+    assert sub.ids_with_status('Bảo trì') == [rid for rid in wanted if table.get(rid).status == 'Bảo trì']
+
+    # Bảng con có cột / từ điển riêng: sửa bên này không ảnh hưởng bên kia
+    sub.get(101).status = 'Trạng thái mới'
+    sub.get(117).note = 'chỉ ở bảng con'
+    sub.remove(129)
+    assert table.get(101).status == rooms[0].status and 'Trạng thái mới' not in table.statuses
+    assert table.get(117).note == rooms[16].note and 129 in table
+
+    with pytest.raises(KeyError):
+        table.take([105])
+    assert len(table.take([])) == 0
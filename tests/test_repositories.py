@@ -0,0 +1,83 @@
+import pytest
+
+from catalog import RoomCatalog
+from repositories import OperationRepository, RoomRepository
+
+
+def test_get_by_ids_matches_get_all(seeded_db):
+    repo = RoomRepository(seeded_db)
+    everything = {r.id: r for r in repo.get_all()}
+    wanted = [105, 250, 101, 105, 9999] + list(range(120, 120 + RoomRepository.ID_CHUNK))
+    got = repo.get_by_ids(wanted)
+    assert sorted(got.id) == sorted(set(wanted) & set(everything))
+    for room in got:
+        old = everything[room.id]
+        assert (room.status, room.type_name, room.price, room.capacity, room.note) == \
+            (old.status, old.type_name, old.price, old.capacity, old.note)
+
+
+def brute_rooms(repo, type_name=None, status=None, text=None, order_by="id", reverse=False):
+    key = RoomCatalog.ORDERS[order_by]
+    rooms = [r for r in repo.get_all()
+             if (type_name is None or r.type_name == type_name)
+             and (status is None or r.status == status)
+             and (not text or text in str(r.id))]
+    return [r.id for r in sorted(rooms, key=key, reverse=reverse)]
+
+
+@pytest.mark.parametrize("filters", [
+    dict(),
+    dict(order_by="price"),
+    dict(order_by="price", reverse=True),
+    dict(order_by="capacity", status="Trống"),
+    dict(type_name="Deluxe", text="1", reverse=True),
+    dict(status="Không có"),
+])
+@pytest.mark.parametrize("limit", [1, 7, 64, 1000])
+def test_keyset_pages_concatenate_to_sorted_rooms(seeded_db, filters, limit):
+    repo = RoomRepository(seeded_db)
+    got, after = [], None
+    while True:
+        rooms, after = repo.query_rooms(after=after, limit=limit, **filters)
+        assert len(rooms) <= limit
+        got.extend(rooms.id)
+        if after is None:
+            break
+    assert got == brute_rooms(repo, **filters)
+
+
+def test_sql_cursor_continues_in_catalog(seeded_db):
+    """Con trỏ của query_rooms dùng tiếp được cho RoomCatalog.page và ngược lại"""
+    repo = RoomRepository(seeded_db)
+    catalog = RoomCatalog(repo.get_all())
+    filters = dict(order_by="price", reverse=True)
+    first, after = repo.query_rooms(limit=25, **filters)
+    second, _ = catalog.page(25, after=after, **filters)
+    third, _ = repo.query_rooms(after=catalog.ORDERS["price"](second[-1]), limit=25, **filters)
+    assert list(first.id) + [r.id for r in second] + list(third.id) == brute_rooms(repo, **filters)[:75]
+
+
+def test_reconcile_folios_detects_and_repairs(fresh_db):
+    repo = OperationRepository(fresh_db)
+    ok, clean = repo.reconcile_folios()
+    assert ok and clean["checked"] > 0
+    assert clean["missing"] == clean["stale"] == clean["mismatched"] == []
+
+    with fresh_db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MaPD, SoPhong FROM FolioLuuTru ORDER BY MaPD")
+        (bad_pd, bad_room), (gone_pd, gone_room) = cursor.fetchall()[:2]
+        cursor.execute("UPDATE FolioLuuTru SET TongDichVu = TongDichVu + 1000 WHERE MaPD = ?", (bad_pd,))
+        cursor.execute("DELETE FROM FolioLuuTru WHERE MaPD = ?", (gone_pd,))
+        conn.commit()
+
+    ok, found = repo.reconcile_folios(repair=False)
+    assert ok
+    assert found["mismatched"] == [(bad_pd, bad_room)] and found["missing"] == [(gone_pd, gone_room)]
+    assert found["repaired"] == 0
+    assert repo.reconcile_folios()[1]["mismatched"] == [(bad_pd, bad_room)]  # repair=False không sửa gì
+
+    ok, fixed = repo.reconcile_folios(repair=True)
+    assert ok and fixed["repaired"] == 2
+    ok, again = repo.reconcile_folios()
+    assert again["missing"] == again["stale"] == again["mismatched"] == []
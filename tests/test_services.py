@@ -0,0 +1,68 @@
+import itertools
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Service
+from repositories import OperationRepository
+from services import HotelAlgorithms
+
+
+def brute_totals(services, budget, max_qty):
+    """Tổng giá của mọi tổ hợp số lượng (0..max_qty mỗi món) không vượt ngân sách, giảm dần"""
+    totals = []
+    for qtys in itertools.product(*(range(max_qty.get(s.name, 1) + 1) for s in services)):
+        total = sum(q * s.price for q, s in zip(qtys, services))
+        if 0 < total <= budget:
+            totals.append(total)
+    return sorted(totals, reverse=True)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_top_k_combos_match_brute_force(seed):
+    rng = random.Random(seed)
+    services = [Service(i, f"DV{i}", rng.randint(1, 20) * 5000) for i in range(rng.randint(1, 6))]
+    budget = rng.randint(0, 40) * 5000
+    k = rng.randint(1, 8)
+    max_qty = {s.name: rng.randint(1, 3) for s in services}
+
+    got = HotelAlgorithms.suggest_service_combos(services, budget, k=k, max_qty=max_qty)
+
+    assert [c["total"] for c in got] == brute_totals(services, budget, max_qty)[:k]
+    prices = {s.name: s.price for s in services}
+    seen = set()
+    for c in got:
+        names = [name for name, _ in c["items"]]
+        assert len(names) == len(set(names))       # mỗi món xuất hiện 1 lần, kèm số lượng
+        assert all(1 <= q <= max_qty[name] for name, q in c["items"])
+        assert sum(prices[name] * q for name, q in c["items"]) == c["total"]
+        assert sorted(c["combo"]) == sorted(n for n, q in c["items"] for _ in range(q))
+        key = tuple(sorted(c["items"]))
+        assert key not in seen
+        seen.add(key)
+
+
+def test_shared_max_qty_and_free_items():
+    services = [Service(1, "Nước", 10000), Service(2, "Khăn", 0), Service(3, "Bánh", 25000)]
+    got = HotelAlgorithms.suggest_service_combos(services, 30000, k=3, max_qty=2)
+    assert [c["total"] for c in got] == [25000.0, 20000.0, 10000.0]
+    assert got[1]["items"] == [("Nước", 2)]
+    assert HotelAlgorithms.suggest_service_combos(services, 5000) == []
+
+
+@pytest.mark.parametrize("offset", [timedelta(0), timedelta(days=3, seconds=1)])
+def test_calculate_bills_matches_calculate_bill(seeded_db, offset):
+    repo = OperationRepository(seeded_db)
+    audit_time = datetime.now() + offset
+    batch = HotelAlgorithms.calculate_bills(*repo.get_open_folios_raw(), audit_time=audit_time)
+    assert len(batch) > 0 and batch.service_items
+
+    for room_id, bill in zip(batch.room_id, batch.to_bill_details()):
+        raw, _ = repo.get_bill_raw_data(room_id)
+        one = HotelAlgorithms.calculate_bill(raw, audit_time)
+        assert (bill.ma_hd, bill.customer_name, bill.days_used, bill.room_total) == \
+            (one.ma_hd, one.customer_name, one.days_used, one.room_total)
+        assert bill.service_total == pytest.approx(one.service_total)
+        assert bill.grand_total == pytest.approx(one.grand_total)
+        assert sorted(map(repr, bill.service_items)) == sorted(map(repr, one.service_items))
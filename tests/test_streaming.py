@@ -0,0 +1,89 @@
+import contextlib
+import sqlite3
+
+import pytest
+
+from database import ConnectionPool
+from streaming import StreamConfig, StreamStats, iter_batches, iter_rows, stream_query
+
+
+class ListCursor:
+    """Cursor giả đã execute: trả dữ liệu theo fetchmany và ghi lại các cỡ lô được yêu cầu"""
+    def __init__(self, rows):
+        self.rows = rows
+        self.pos = 0
+        self.requested = []
+
+    def fetchmany(self, size):
+        self.requested.append(size)
+        batch = self.rows[self.pos:self.pos + size]
+        self.pos += len(batch)
+        return batch
+
+
+def make_rows(n, width=10):
+    return [(i, "x" * width) for i in range(n)]
+
+
+@pytest.mark.parametrize("n, size", [(0, 10), (1, 10), (10, 10), (25, 10), (1000, 7)])
+def test_fixed_batches_cover_all_rows(n, size):
+    rows = make_rows(n)
+    cursor = ListCursor(rows)
+    stats = StreamStats()
+    batches = list(iter_batches(cursor, arraysize=size, max_batch_bytes=0, name="t", stats=stats))
+
+    assert [r for b in batches for r in b] == rows
+    assert all(len(b) == size for b in batches[:-1])
+    assert all(s == size for s in cursor.requested)
+    # Lô cuối thiếu -> dừng ngay, không gọi fetchmany thêm 1 lần rỗng
+    assert len(cursor.requested) == len(batches) + (1 if n % size == 0 else 0)
+
+    s = stats.snapshot()["t"]
+    assert (s["streams"], s["rows"], s["batches"]) == (1, n, len(batches))
+    assert s["peak_batch_rows"] == (min(n, size) if n else 0)
+
+
+def test_batch_size_adapts_to_byte_budget():
+    rows = make_rows(20000, width=1000)      # ~1 KB / dòng
+    cursor = ListCursor(rows)
+    stats = StreamStats()
+    budget = 200 * 1024
+    got = list(iter_rows(cursor, arraysize=50, max_batch_bytes=budget, name="wide", stats=stats))
+
+    assert got == rows
+    s = stats.snapshot()["wide"]
+    # Sau lô đầu, mỗi lô ~budget byte: nằm trong [MIN_ARRAYSIZE, MAX_ARRAYSIZE] và không vượt quá ngân sách nhiều
+    assert all(StreamConfig.MIN_ARRAYSIZE <= n <= StreamConfig.MAX_ARRAYSIZE for n in cursor.requested[1:])
+    assert cursor.requested[1] > 50
+    assert s["peak_batch_bytes"] <= budget * 1.1
+    assert s["bytes"] >= s["rows"] * 1000
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = tmp_path / "stream.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(1234)])
+    pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), max_size=1)
+    yield pool
+    pool.close_all()
+
+
+def test_stream_query_releases_connection(pool):
+    stats = StreamStats()
+    got = [r[0] for r in stream_query(pool, "SELECT x FROM t WHERE x >= ? ORDER BY x", (34,),
+                                      arraysize=100, name="q", stats=stats)]
+    assert got == list(range(34, 1234))
+    assert stats.snapshot()["q"]["rows"] == 1200
+    assert pool.metrics()["in_use"] == 0
+
+
+def test_stream_query_closed_early_releases_connection(pool):
+    with contextlib.closing(stream_query(pool, "SELECT x FROM t ORDER BY x", arraysize=10)) as rows:
+        assert next(rows) == (0,)
+        assert pool.metrics()["in_use"] == 1
+    assert pool.metrics()["in_use"] == 0
+    # Pool chỉ có 1 kết nối: mượn lại được ngay nghĩa là đã trả
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1234
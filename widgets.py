@@ -0,0 +1,148 @@
+import tkinter as tk
+from tkinter import ttk
+
+STATUS_COLORS = {
+    'Trống': '#4CAF50',
+    'Đang ở': '#F44336',
+    'Bảo trì': '#FF9800',
+    'Đang dọn': '#FFC107'
+}
+
+
+class RoomGrid(ttk.Frame):
+    """
+    Lưới phòng ảo hóa trên 1 tk.Canvas duy nhất.
+    - Chỉ vẽ các hàng nằm trong khung nhìn (+1 hàng đệm), số item trên Canvas không phụ thuộc số phòng.
+    - Các ô (rect + text) được tái sử dụng khi cuộn.
+    - Mỗi ô nhớ (số phòng, trạng thái, loại, ghi chú) đang hiển thị -> chỉ itemconfigure khi dữ liệu thực sự đổi.
+    """
+    CELL_W = 112
+    CELL_H = 76
+    PAD = 5
+
+    def __init__(self, parent, on_click=None, columns=8, empty_text="Không tìm thấy phòng nào phù hợp!"):
+        super().__init__(parent)
+        self.on_click = on_click
+        self.columns = columns
+        self.empty_text = empty_text
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, yscrollincrement=self.CELL_H // 2)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.rooms = []
+        self._cells = []        # [rect_id, text_id, mark_id, shown_key, shown_pos]
+        self._empty_id = None
+
+        self.canvas.bind("<Configure>", lambda e: self._render())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self._scroll_units(-1))
+        self.canvas.bind("<Button-5>", lambda e: self._scroll_units(1))
+
+    @staticmethod
+    def signature(room):
+        """Các thuộc tính quyết định hình thức của 1 ô"""
+        return (room.id, room.status, room.type_name, room.note or "")
+
+    def set_rooms(self, rooms):
+        """Gán danh sách phòng mới (đã lọc/sắp xếp) và vẽ lại phần đang nhìn thấy"""
+        self.rooms = rooms
+        rows = (len(rooms) + self.columns - 1) // self.columns
+        width = self.columns * self.CELL_W
+        self.canvas.configure(scrollregion=(0, 0, width, max(rows * self.CELL_H, 1)))
+        self._render()
+
+    def _visible_range(self):
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        first_row = max(0, int(top // self.CELL_H))
+        last_row = int((top + height) // self.CELL_H) + 1
+        first = first_row * self.columns
+        last = min(len(self.rooms), (last_row + 1) * self.columns)
+        return first, last
+
+    def _new_cell(self):
+        rect = self.canvas.create_rectangle(0, 0, 0, 0, outline="", state="hidden")
+        text = self.canvas.create_text(0, 0, fill="white", font=('Arial', 9, 'bold'),
+                                       justify="center", state="hidden")
+        mark = self.canvas.create_text(0, 0, text="✎", fill="white", font=('Arial', 9),
+                                       anchor="ne", state="hidden")
+        return [rect, text, mark, None, None]
+
+    def _render(self):
+        if not self.rooms:
+            for cell in self._cells:
+                self._hide(cell)
+            if self._empty_id is None:
+                self._empty_id = self.canvas.create_text(
+                    20, 20, text=self.empty_text, anchor="nw", font=("Arial", 12))
+            return
+        if self._empty_id is not None:
+            self.canvas.delete(self._empty_id)
+            self._empty_id = None
+
+        first, last = self._visible_range()
+        needed = last - first
+        while len(self._cells) < needed:
+            self._cells.append(self._new_cell())
+
+        for k in range(needed):
+            idx = first + k
+            self._draw(self._cells[k], idx, self.rooms[idx])
+        for cell in self._cells[needed:]:
+            self._hide(cell)
+
+    def _draw(self, cell, idx, room):
+        rect, text, mark, shown_key, shown_pos = cell
+        c = self.canvas
+
+        pos = divmod(idx, self.columns)
+        if pos != shown_pos:
+            row, col = pos
+            x0 = col * self.CELL_W + self.PAD
+            y0 = row * self.CELL_H + self.PAD
+            x1 = x0 + self.CELL_W - 2 * self.PAD
+            y1 = y0 + self.CELL_H - 2 * self.PAD
+            c.coords(rect, x0, y0, x1, y1)
+            c.coords(text, (x0 + x1) / 2, (y0 + y1) / 2)
+            c.coords(mark, x1 - 3, y0 + 2)
+            cell[4] = pos
+
+        key = self.signature(room)
+        if key != shown_key:
+            c.itemconfigure(rect, fill=STATUS_COLORS.get(room.status, '#9E9E9E'), state="normal")
+            c.itemconfigure(text, text=f"P{room.id}\n{room.type_name}\n({room.status})", state="normal")
+            c.itemconfigure(mark, state="normal" if room.note else "hidden")
+            cell[3] = key
+
+    def _hide(self, cell):
+        if cell[3] is None:
+            return
+        for item in cell[:3]:
+            self.canvas.itemconfigure(item, state="hidden")
+        cell[3] = None
+
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+        self._render()
+
+    def _scroll_units(self, n):
+        self.canvas.yview_scroll(n, "units")
+        self._render()
+
+    def _on_wheel(self, event):
+        self._scroll_units(-1 if event.delta > 0 else 1)
+
+    def _on_click(self, event):
+        x = self.canvas.canvasx(event.x)
+        y = self.canvas.canvasy(event.y)
+        col = int(x // self.CELL_W)
+        if col >= self.columns:
+            return
+        idx = int(y // self.CELL_H) * self.columns + col
+        if 0 <= idx < len(self.rooms) and self.on_click:
+            self.on_click(self.rooms[idx])